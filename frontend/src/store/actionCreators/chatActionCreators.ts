@@ -2,7 +2,7 @@ import { Dispatch } from 'redux';
 import { actions } from '../actions';
 import apiClient from '../apiClient';
 import { Constants } from "../../Config/Constants";
-import { ChatAction } from '../types';
+import { ChatAction, RootState } from '../types';
 import { ResponseType } from '../../types';
 import { ApiChatResponse, ApiChatMessageInput } from './types';
 import { transformRequestToSnakeCase, transformResponseToCamelCase } from '../../utils/apiUtils';
@@ -47,10 +47,17 @@ export const addUserMessage = (
   }
 };
 
-export const getChatThread = (chatThreadId: string) => (dispatch: Dispatch<ChatAction>) => {
+export const getChatThread = (chatThreadId: string) => (
+  dispatch: Dispatch<ChatAction>,
+  getState: () => RootState
+) => {
   dispatch(chatActions.chatAgentPollRequest());
 
-  apiClient.get<ApiResponse<ApiChatResponse>>(`${api_urls.getChatThread}/${chatThreadId}`)
+  // only fetch what is newer than the messages we already have
+  const nextCursor = getState().chat.nextCursor;
+  const query = nextCursor ? `?after=${encodeURIComponent(nextCursor)}` : '';
+
+  apiClient.get<ApiResponse<ApiChatResponse>>(`${api_urls.getChatThread}/${chatThreadId}${query}`)
     .then(response => {
       const data = response.data;
       const transformedData = transformResponseToCamelCase(data);
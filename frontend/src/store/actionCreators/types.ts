@@ -77,6 +77,8 @@ export interface ApiMessage {
 export interface ApiChatResponse {
   chat_thread_id: string;
   messages: ApiMessage[];
+  next_cursor: string | null;
+  prev_cursor: string | null;
 }
 
 export interface ApiChatMessageInput {
@@ -1,12 +1,20 @@
 import * as actionTypes from '../actionTypes';
 import { ChatAction, ChatState } from '../types';
+import { Message } from '../../types';
 
 const initialState: ChatState = {
   error: null,
   isLoading: false,
   currentChatThreadId: null,
   waitingForResponse: false,
-  messages: []
+  messages: [],
+  nextCursor: null
+};
+
+// responses only carry messages we have not seen yet, skip any we already have just in case
+const appendMessages = (messages: Message[], newMessages: Message[]): Message[] => {
+  const known = new Set(messages.map(message => message.messageId));
+  return [...messages, ...newMessages.filter(message => !known.has(message.messageId))];
 };
 
 const chatReducer = (
@@ -23,7 +31,8 @@ const chatReducer = (
         isLoading: false,
         waitingForResponse: true,
         currentChatThreadId: action.chatThreadId || null,
-        messages: action.messages || [],
+        messages: appendMessages(state.messages, action.messages || []),
+        nextCursor: action.nextCursor || state.nextCursor,
         error: null
       };
 
@@ -38,10 +47,11 @@ const chatReducer = (
       return { ...state, error: null };
 
     case actionTypes.CHAT_AGENT_POLL_SUCCESS:
-      if (Array.isArray(action.messages) && action.messages.length > state.messages.length) {
+      if (Array.isArray(action.messages) && action.messages.length > 0) {
         return {
           ...state,
-          messages: action.messages,
+          messages: appendMessages(state.messages, action.messages),
+          nextCursor: action.nextCursor || state.nextCursor,
           currentChatThreadId: action.chatThreadId || null,
           waitingForResponse: false,
           error: null
@@ -62,18 +72,20 @@ const chatReducer = (
           ...state,
           currentChatThreadId: null,
           waitingForResponse: false,
-          messages: []
+          messages: [],
+          nextCursor: null
         };
       }
       return {
         ...state,
         currentChatThreadId: action.chatThreadId,
         waitingForResponse: true,
-        messages: action.resetMessages ? [] : state.messages
+        messages: action.resetMessages ? [] : state.messages,
+        nextCursor: action.resetMessages ? null : state.nextCursor
       };
 
     case actionTypes.LOGOUT_SUCCESS:
-      return { ...state, messages: [] };
+      return { ...state, messages: [], nextCursor: null };
 
     default:
       return state;
@@ -10,6 +10,7 @@ export interface ChatAction extends Action {
   chatThreadId?: string;
   resetMessages?: boolean;
   messages?: Message[];
+  nextCursor?: string | null;
   query?: string;
   queryId?: string;
 }
@@ -32,6 +33,8 @@ export interface UserState {
 
 export interface ChatState {
   messages: Message[];
+  // cursor of the newest message we have, polls only fetch messages after it
+  nextCursor: string | null;
   waitingForResponse: boolean;
   currentChatThreadId: string | null;
   error: string | null;
@@ -5,14 +5,16 @@ from uuid import UUID
 
 from loguru import logger as log
 
+from informed.agents.query_agent.cohorts import CohortAnswers
+from informed.agents.query_agent.query_queue import QueryJobQueue
 from informed.agents.query_agent.query_runner import QueryRunner
 from informed.chat.manager import ChatManager
-from informed.config import WeatherSourcesConfig
+from informed.chat.snapshot import ChatThreadSnapshot
+from informed.config import ChatAgentConfig, WeatherSourcesConfig
 from informed.db_models.chat import (
     AssistantMessage,
     Message,
     MessageResponseType,
-    MessageSource,
     UserMessage,
 )
 from informed.db_models.query import Query, QueryState
@@ -33,10 +35,14 @@ class ChatAgent:
         llm_client: LLMClient,
         weather_sources_config: WeatherSourcesConfig,
         weather_alert_service: WeatherAlertService,
-        chat_termination_callback: Callable[[], Awaitable[None]],
+        chat_termination_callback: Callable[[], Awaitable[None]] | None = None,
         assistant_message_callback: (
             Callable[[UUID, AssistantMessage, QueryState], Awaitable[None]] | None
         ) = None,
+        query_job_queue: QueryJobQueue | None = None,
+        chat_agent_config: ChatAgentConfig | None = None,
+        context: str | None = None,
+        cohort_answers: CohortAnswers | None = None,
     ):
         self.chat_thread_id = chat_thread_id
 
@@ -48,9 +54,9 @@ class ChatAgent:
         self.weather_alert_service = weather_alert_service
         self._chat_termination_callback = chat_termination_callback
         self._assistant_message_callback = assistant_message_callback
+        self._chat_agent_config = chat_agent_config or ChatAgentConfig()
         # only one query agent will be running at a time
         self._query_runner: QueryRunner = QueryRunner(
-            query_monitor_timeout=120.0,
             user_manager=self.user_manager,
             query_manager=self.query_manager,
             llm_client=self.llm_client,
@@ -58,10 +64,15 @@ class ChatAgent:
             agent_done_callback=self._query_done_callback,
             weather_sources_config=self.weather_sources_config,
             weather_alert_service=self.weather_alert_service,
+            query_job_queue=query_job_queue,
+            context=context,
+            cohort_answers=cohort_answers,
         )
 
         self._run_task: asyncio.Task | None = None
         self._termination_event: asyncio.Event = asyncio.Event()
+        # loaded once, then kept up to date with our own writes and refreshed on new message notifications
+        self._chat_thread: ChatThreadSnapshot | None = None
 
     async def start(self, timeout: float = 120.0) -> None:
         if not self._run_task:
@@ -92,6 +103,8 @@ class ChatAgent:
             log.info("chat agent stopped")
 
     async def _run(self, message_interval_timeout_seconds: float = 1200.0) -> None:
+        # subscribe before the first look at pending messages so that none slip in between
+        self.chat_manager.subscribe_to_new_user_messages(self.chat_thread_id)
         try:
             while True:
                 pending_messages = await self._pending_messages()
@@ -100,9 +113,10 @@ class ChatAgent:
                     len(pending_messages),
                 )
                 if pending_messages:
-                    await self._handle_pending_messages(pending_messages)
+                    await self._handle_pending_messages()
                 else:
                     await self._wait_for_new_message(message_interval_timeout_seconds)
+                    await self._refresh_chat_thread()
         except TimeoutError:
             log.info("chat agent run loop timed out waiting for new user message")
         except asyncio.CancelledError:
@@ -110,27 +124,98 @@ class ChatAgent:
         except Exception as e:
             log.exception("chat agent run loop error: {}", str(e))
         finally:
-            await self._chat_termination_callback()
+            self.chat_manager.unsubscribe_from_new_user_messages(self.chat_thread_id)
+            if self._chat_termination_callback:
+                await self._chat_termination_callback()
             await self._log_chat_thread()
 
-    async def _handle_pending_messages(
-        self, pending_messages: list[UserMessage]
-    ) -> None:
-        chat_thread = await self.chat_manager.get_chat_thread(self.chat_thread_id)
-        if not chat_thread:
-            raise ValueError(f"thread {self.chat_thread_id} not found")
+    async def run_once(self) -> QueryState | None:
+        """
+        Answers the messages pending right now and returns, instead of waiting around for new ones.
+        Used when threads are handled by the dispatcher rather than a long-lived agent.
+
+        Returns the terminal state of the query that answered last, None when nothing was pending.
+        A query whose agent raised counts as FAILED, a superseded one is left out.
+        """
+        # new messages may still land while we wait for a burst to end
+        self.chat_manager.subscribe_to_new_user_messages(self.chat_thread_id)
+        try:
+            while await self._pending_messages():
+                await self._handle_pending_messages()
+                await self._query_runner.wait_on_running_queries()
+            return self._query_runner.last_query_state
+        finally:
+            self.chat_manager.unsubscribe_from_new_user_messages(self.chat_thread_id)
+            await self._log_chat_thread()
+
+    async def _get_chat_thread(self) -> ChatThreadSnapshot:
+        if self._chat_thread is None:
+            chat_thread = await self.chat_manager.get_chat_thread(self.chat_thread_id)
+            if not chat_thread:
+                raise ValueError(f"thread {self.chat_thread_id} not found")
+            self._chat_thread = ChatThreadSnapshot(chat_thread)
+        return self._chat_thread
+
+    async def _refresh_chat_thread(self) -> None:
+        # user messages are the only writes to the thread made outside of this agent
+        chat_thread = await self._get_chat_thread()
+        chat_thread.upsert_messages(
+            await self.chat_manager.get_pending_user_messages(self.chat_thread_id)
+        )
+
+    async def _handle_pending_messages(self) -> None:
+        """
+        Answers everything the user said since the last answer with a single query.
+
+        A burst of messages is given a moment to land first, a single message is answered at once.
+        Queries still running for earlier messages are superseded: they are cancelled and their
+        messages folded into the new query, in order.
+        """
+        await self._wait_for_burst_to_end()
+        pending_messages = await self._pending_messages()
+        if not pending_messages:
+            return
+
+        chat_thread = await self._get_chat_thread()
+        superseded_messages: list[UserMessage] = []
+        for query_id in self._query_runner.running_query_ids():
+            log.info("superseding running query", query_id=query_id)
+            # stopped before the new query starts, only one of them may answer
+            if await self._query_runner.cancel_query(query_id):
+                superseded_messages.extend(
+                    chat_thread.find_messages_for_query(query_id)
+                )
 
         await self._acknowledge_pending_messages(pending_messages)
+        await self._create_query_agent_for_messages(
+            sorted(superseded_messages + pending_messages, key=lambda m: m.created_at)
+        )
 
-        if self._query_runner.has_running_queries():
-            log.info(
-                "waiting for query agent to complete before handling pending messages"
-            )
-            await self._query_runner.wait_on_running_queries()
-        else:
-            await self._create_query_agent_for_message(pending_messages[-1])
+    async def _wait_for_burst_to_end(self) -> None:
+        window = self._chat_agent_config.coalesce_window_seconds
+        if window <= 0:
+            return
+        # a lone message is answered right away, the thread is only given time to go quiet once a
+        # second one lands, with the first still pending or being answered
+        if (
+            len(await self._pending_messages()) <= 1
+            and not self._query_runner.running_query_ids()
+        ):
+            return
+        deadline = (
+            asyncio.get_running_loop().time()
+            + self._chat_agent_config.coalesce_max_wait_seconds
+        )
+        while (remaining := deadline - asyncio.get_running_loop().time()) > 0:
+            try:
+                await self._wait_for_new_message(min(window, remaining))
+            except TimeoutError:
+                return
+            await self._refresh_chat_thread()
 
     async def _query_done_callback(self, task: asyncio.Task, query: Query) -> None:
+        if task.cancelled():
+            return
         if (exc := task.exception()) is not None:
             log.opt(exception=exc).exception(
                 "Query task exited with error: {}", str(exc)
@@ -140,25 +225,30 @@ class ChatAgent:
             if not pending_messages:
                 self._termination_event.set()
 
-    async def _create_query_agent_for_message(
+    async def _create_query_agent_for_messages(
         self,
-        message: UserMessage,
+        messages: list[UserMessage],
     ) -> None:
-        log.info("creating new query agent to handle pending messages")
-
-        chat_thread = await self.chat_manager.get_chat_thread(self.chat_thread_id)
-        if not chat_thread:
-            raise ValueError(f"thread {self.chat_thread_id} not found")
+        log.info(
+            "creating new query agent to handle {} pending messages", len(messages)
+        )
 
+        chat_thread = await self._get_chat_thread()
+        # the latest message decides how the answer is delivered
         query_id = await self._query_runner.launch(
-            query_text=message.content,
-            chat_thread=chat_thread,
-            instructions=self._generate_instructions_based_on_response_type(message),
+            query_text="\n".join(message.content for message in messages),
+            user_id=chat_thread.user_id,
+            chat_thread_id=chat_thread.chat_thread_id,
+            instructions=self._generate_instructions_based_on_response_type(
+                messages[-1]
+            ),
         )
-        chat_message = Message.model_validate(message, from_attributes=True)
-        chat_message.query_id = query_id
+        for message in messages:
+            chat_message = Message.model_validate(message, from_attributes=True)
+            chat_message.query_id = query_id
 
-        await self.chat_manager.update_message(chat_message)
+            await self.chat_manager.update_message(chat_message)
+            chat_thread.upsert_message(chat_message)
 
     async def _wait_for_new_message(self, timeout: float) -> None:
         await asyncio.wait_for(
@@ -174,9 +264,7 @@ class ChatAgent:
         if not query.state.is_terminated():
             return
 
-        chat_thread = await self.chat_manager.get_chat_thread(self.chat_thread_id)
-        if not chat_thread:
-            raise ValueError(f"thread {self.chat_thread_id} not found")
+        chat_thread = await self._get_chat_thread()
 
         if not query.answer:
             log.debug("Query task exited with no answer")
@@ -184,7 +272,7 @@ class ChatAgent:
 
         response_type, language = (
             self._get_response_type_and_language_for_assistant_message(
-                query, chat_thread.messages
+                query, chat_thread
             )
         )
 
@@ -202,31 +290,27 @@ class ChatAgent:
             self._termination_event.set()
 
     async def _pending_messages(self) -> list[UserMessage]:
-        chat_thread = await self.chat_manager.get_chat_thread(self.chat_thread_id)
-        if not chat_thread:
-            raise ValueError(f"thread {self.chat_thread_id} not found")
+        chat_thread = await self._get_chat_thread()
         return chat_thread.pending_messages
 
     async def _acknowledge_pending_messages(self, messages: list[UserMessage]) -> None:
-        chat_thread = await self.chat_manager.get_chat_thread(self.chat_thread_id)
-        if not chat_thread:
-            raise ValueError(f"thread {self.chat_thread_id} not found")
-
         for msg in messages:
             await self._mark_message_acknowledged(msg)
         # self._acknowledge_event.set()
 
     async def _mark_message_acknowledged(self, msg: UserMessage) -> None:
         msg.acknowledged = True
-        await self.chat_manager.update_message(Message.model_validate(msg))
+        message = Message.model_validate(msg)
+        await self.chat_manager.update_message(message)
+        (await self._get_chat_thread()).upsert_message(message)
 
     async def _add_assistant_response(
         self, msg: AssistantMessage, query_state: QueryState
     ) -> None:
         # Always add the message to the chat thread, independent of whether we send a message in Slack
-        await self.chat_manager.add_assistant_message(
-            self.chat_thread_id, Message.model_validate(msg, from_attributes=True)
-        )
+        chat_message = Message.model_validate(msg, from_attributes=True)
+        await self.chat_manager.add_assistant_message(self.chat_thread_id, chat_message)
+        (await self._get_chat_thread()).upsert_message(chat_message)
         if self._assistant_message_callback:
             message = msg
             chat_thread_id = self.chat_thread_id
@@ -245,24 +329,18 @@ class ChatAgent:
             return "Restrict the response to 80 words or less."
 
     def _get_response_type_and_language_for_assistant_message(
-        self, query: Query, messages: list[Message]
+        self, query: Query, chat_thread: ChatThreadSnapshot
     ) -> tuple[MessageResponseType, Language]:
         # Find the user message that triggered this query
-        for message in messages:
-            if (
-                message.source == MessageSource.WEBAPP
-                and query.query_id == message.query_id
-            ):
-                response_type = (
-                    message.requested_response_type or MessageResponseType.TEXT
-                )
-                language = message.language or Language.ENGLISH
-                return response_type, language
+        message = chat_thread.find_message_for_query(query.query_id)
+        if message:
+            response_type = message.requested_response_type or MessageResponseType.TEXT
+            language = message.language or Language.ENGLISH
+            return response_type, language
 
         return MessageResponseType.TEXT, Language.ENGLISH
 
     async def _log_chat_thread(self) -> None:
-        chat_thread = await self.chat_manager.get_chat_thread(self.chat_thread_id)
-        if not chat_thread:
-            raise ValueError(f"chat thread {self.chat_thread_id} does not exist")
-        log.info("chat thread completed: {}", chat_thread)
+        if self._chat_thread is None:
+            return
+        log.info("chat thread completed: {}", self._chat_thread)
@@ -0,0 +1,100 @@
+import asyncio
+import contextlib
+from collections.abc import Awaitable, Callable
+from uuid import UUID
+
+from loguru import logger as log
+
+from informed.agents.chat_agent.chat_agent import ChatAgent
+from informed.db_models.chat import AssistantMessage
+from informed.db_models.query import QueryState
+
+AssistantMessageCallback = Callable[
+    [UUID, AssistantMessage, QueryState], Awaitable[None]
+]
+
+
+class ChatDispatcher:
+    """
+    Handles chat threads with pending messages on a fixed pool of workers.
+
+    Nothing is kept around for idle threads: a thread is queued when a message arrives, a worker
+    builds a one-shot ChatAgent for it, answers everything pending and drops it. A thread is never
+    handled by two workers at once, messages arriving while it is in flight re-queue it afterwards.
+    """
+
+    def __init__(
+        self,
+        num_workers: int,
+        chat_agent_factory: Callable[
+            [UUID, AssistantMessageCallback | None], ChatAgent
+        ],
+    ):
+        self._num_workers = num_workers
+        self._chat_agent_factory = chat_agent_factory
+        self._queue: asyncio.Queue[UUID] = asyncio.Queue()
+        # callbacks of queued and in flight threads, these are the only per-thread state
+        self._queued: dict[UUID, AssistantMessageCallback | None] = {}
+        self._in_flight: dict[UUID, AssistantMessageCallback | None] = {}
+        self._resubmit: set[UUID] = set()
+        self._workers: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._work()) for _ in range(self._num_workers)
+            ]
+            log.info("chat dispatcher started with {} workers", self._num_workers)
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            with contextlib.suppress(asyncio.CancelledError):
+                await worker
+        self._workers = []
+        log.info("chat dispatcher stopped")
+
+    def submit(
+        self,
+        chat_thread_id: UUID,
+        assistant_message_callback: AssistantMessageCallback | None = None,
+    ) -> None:
+        if chat_thread_id in self._in_flight:
+            if assistant_message_callback:
+                self._in_flight[chat_thread_id] = assistant_message_callback
+            self._resubmit.add(chat_thread_id)
+            return
+        if chat_thread_id in self._queued:
+            if assistant_message_callback:
+                self._queued[chat_thread_id] = assistant_message_callback
+            return
+        self._queued[chat_thread_id] = assistant_message_callback
+        self._queue.put_nowait(chat_thread_id)
+
+    def queue_size(self) -> int:
+        return self._queue.qsize()
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def _work(self) -> None:
+        while True:
+            chat_thread_id = await self._queue.get()
+            callback = self._queued.pop(chat_thread_id, None)
+            self._in_flight[chat_thread_id] = callback
+            try:
+                chat_agent = self._chat_agent_factory(chat_thread_id, callback)
+                await chat_agent.run_once()
+            except Exception as e:
+                log.exception(
+                    "chat dispatcher failed to handle thread {}: {}",
+                    chat_thread_id,
+                    str(e),
+                )
+            finally:
+                callback = self._in_flight.pop(chat_thread_id, None)
+                self._queue.task_done()
+                if chat_thread_id in self._resubmit:
+                    self._resubmit.discard(chat_thread_id)
+                    self.submit(chat_thread_id, callback)
@@ -0,0 +1,128 @@
+import asyncio
+import contextlib
+import time
+from collections.abc import Awaitable, Callable
+from uuid import UUID, uuid4
+
+from loguru import logger as log
+from redis.asyncio import Redis
+
+from informed.config import ChatAgentConfig
+
+# extends the lease only if it is still ours
+_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class ChatThreadLeases:
+    """
+    Makes sure a chat thread is answered by one agent at a time across replicas, through a lease
+    per thread kept in Redis.
+
+    The leases we hold are renewed in the background until released. The leases of a replica that
+    died run out, so another one can take its threads over. A lease we could not renew is reported
+    to its holder, which has to stop answering the thread.
+    """
+
+    def __init__(self, redis_client: Redis, config: ChatAgentConfig):
+        self._redis_client = redis_client
+        self._key_prefix = config.lease_key_prefix
+        self._lease_ms = int(config.lease_seconds * 1000)
+        self._instance_id = str(uuid4())
+        # the leases we hold, with what to do when one is lost
+        self._held: dict[UUID, Callable[[], Awaitable[None]] | None] = {}
+        # monotonic time each lease expires at, as far as we know
+        self._expires_at: dict[UUID, float] = {}
+        self._task: asyncio.Task | None = None
+
+    def _key(self, chat_thread_id: UUID) -> str:
+        return f"{self._key_prefix}{chat_thread_id}"
+
+    async def start(self) -> None:
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        for chat_thread_id in list(self._held):
+            await self.release(chat_thread_id)
+
+    async def acquire(
+        self,
+        chat_thread_id: UUID,
+        on_lost: Callable[[], Awaitable[None]] | None = None,
+    ) -> bool:
+        """Takes the lease of the thread, returns False when someone else holds it."""
+        if chat_thread_id in self._held:
+            return False
+        # taken before the call, the lease can only expire later than this on the Redis side
+        expires_at = time.monotonic() + self._lease_ms / 1000
+        acquired = await self._redis_client.set(
+            self._key(chat_thread_id), self._instance_id, nx=True, px=self._lease_ms
+        )
+        if acquired:
+            self._held[chat_thread_id] = on_lost
+            self._expires_at[chat_thread_id] = expires_at
+        return bool(acquired)
+
+    async def release(self, chat_thread_id: UUID) -> None:
+        self._held.pop(chat_thread_id, None)
+        self._expires_at.pop(chat_thread_id, None)
+        try:
+            await self._redis_client.eval(  # type: ignore
+                _RELEASE, 1, self._key(chat_thread_id), self._instance_id
+            )
+        except Exception as e:
+            log.error(
+                "failed to release the lease of chat thread {}: {}", chat_thread_id, e
+            )
+
+    async def _run(self) -> None:
+        # renewed well before it runs out, a couple of failed attempts are not enough to lose it
+        while True:
+            await asyncio.sleep(self._lease_ms / 3000)
+            for chat_thread_id in list(self._held):
+                await self._renew(chat_thread_id)
+
+    async def _renew(self, chat_thread_id: UUID) -> None:
+        expires_at = time.monotonic() + self._lease_ms / 1000
+        try:
+            renewed = await self._redis_client.eval(  # type: ignore
+                _RENEW,
+                1,
+                self._key(chat_thread_id),
+                self._instance_id,
+                str(self._lease_ms),
+            )
+        except Exception as e:
+            log.error(
+                "failed to renew the lease of chat thread {}: {}", chat_thread_id, e
+            )
+            # it may still be ours until it runs out
+            renewed = time.monotonic() < self._expires_at.get(chat_thread_id, 0.0)
+            expires_at = self._expires_at.get(chat_thread_id, 0.0)
+        if chat_thread_id not in self._held:
+            # released while we were renewing it
+            return
+        if renewed:
+            self._expires_at[chat_thread_id] = expires_at
+            return
+        log.warning("lost the lease of chat thread {}", chat_thread_id)
+        on_lost = self._held.pop(chat_thread_id)
+        self._expires_at.pop(chat_thread_id, None)
+        if on_lost:
+            await on_lost()
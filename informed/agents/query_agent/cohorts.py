@@ -0,0 +1,69 @@
+import asyncio
+import hashlib
+from collections.abc import Awaitable, Callable
+from functools import partial
+
+from informed.metrics import get_meter
+
+_meter = get_meter(__name__)
+_cohort_answers = _meter.create_counter(
+    "query.cohort_answers",
+    description="Answers of cohort queries, generated or reused from an identical prompt",
+)
+
+
+def prompt_signature(*parts: str | None) -> str:
+    """Identifies a prompt by everything that goes into it."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode())
+        # keeps ("ab", "c") and ("a", "bc") apart
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CohortAnswers:
+    """
+    Answers shared by the queries of a batch, like a daily update run, by prompt signature.
+
+    Users with the same zip, prompt and profile end up with the exact same prompt, only the first of
+    them is sent to the LLM and the others wait for and reuse its answer. A failed or cancelled
+    generation is forgotten, the next user of the cohort generates it again.
+    """
+
+    def __init__(self) -> None:
+        self._answers: dict[str, asyncio.Task[str]] = {}
+
+    async def get_or_generate(
+        self, signature: str, generate: Callable[[], Awaitable[str]]
+    ) -> str:
+        while (task := self._answers.get(signature)) is not None:
+            try:
+                answer = await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+                self._forget_failed(signature, task)
+                continue
+            except Exception:
+                self._forget_failed(signature, task)
+                continue
+            _cohort_answers.add(1, {"outcome": "reused"})
+            return answer
+
+        async def run() -> str:
+            return await generate()
+
+        task = asyncio.create_task(run())
+        self._answers[signature] = task
+        task.add_done_callback(partial(self._forget_failed, signature))
+        # shielded, the generation carries on for the rest of the cohort if this query is cancelled
+        answer = await asyncio.shield(task)
+        _cohort_answers.add(1, {"outcome": "generated"})
+        return answer
+
+    def _forget_failed(self, signature: str, task: asyncio.Task[str]) -> None:
+        if not task.done() or self._answers.get(signature) is not task:
+            return
+        if task.cancelled() or task.exception() is not None:
+            del self._answers[signature]
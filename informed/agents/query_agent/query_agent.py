@@ -1,11 +1,14 @@
 import asyncio
 import json
+from functools import partial
 from textwrap import dedent
 from uuid import UUID
 
 from loguru import logger as log
+from openai.types.chat import ChatCompletionToolParam
 from pydantic import BaseModel
 
+from informed.agents.query_agent.cohorts import CohortAnswers, prompt_signature
 from informed.config import WeatherSourcesConfig
 from informed.db_models.query import Query, QuerySource, QueryState
 from informed.db_models.users import User
@@ -19,6 +22,7 @@ from informed.llm.llm import ChatState
 from informed.llm.schema import build_function_schema
 from informed.query.manager import QueryManager
 from informed.services.weather_alert_service import WeatherAlertService
+from informed.users.loaders import UserLoadProfile
 from informed.users.manager import UserManager
 
 
@@ -36,6 +40,8 @@ class QueryAgent:
         weather_sources_config: WeatherSourcesConfig,
         weather_alert_service: WeatherAlertService,
         instructions: str | None = None,
+        context: str | None = None,
+        cohort_answers: CohortAnswers | None = None,
     ):
         self.query_id = query_id
         self.query_manager = query_manager
@@ -44,17 +50,24 @@ class QueryAgent:
         self.weather_sources_config = weather_sources_config
         self.weather_alert_service = weather_alert_service
         self.instructions = instructions
+        # weather context built ahead for the user's zip, when not given it is built for this query
+        self.context = context
+        self.cohort_answers = cohort_answers
+        # latest state of the query, kept so that callers can see how the agent ended even if it raised
+        self.query: Query | None = None
 
-    async def run(self) -> None:
+    async def run(self) -> Query:
         query = await self.query_manager.get_query(self.query_id)
         if query is None:
             raise ValueError(f"Query {self.query_id} not found")
+        self.query = query
         query.state = QueryState.PENDING
         await self.query_manager.persist_query(query)
         await self._run(query)
+        return query
 
     async def _run(self, query: Query) -> None:
-        user = await self.user_manager.get_user(query.user_id)
+        user = await self.user_manager.get_user(query.user_id, UserLoadProfile.PROMPT)
         if not user:
             raise ValueError("User not found")
         await self._process_query(query, user)
@@ -63,7 +76,7 @@ class QueryAgent:
         try:
             system_prompt = build_system_prompt()
             user_info = extract_user_info(user)
-            context = await build_weather_query_context(
+            context = self.context or await build_weather_query_context(
                 user,
                 weather_sources_config=self.weather_sources_config,
                 weather_alert_service=self.weather_alert_service,
@@ -73,9 +86,6 @@ class QueryAgent:
                 <context>
                 {context}
                 </context>
-                <user>
-                {user_info}
-                </user>
                 <user_message>
                 {query.query}
                 </user_message>
@@ -83,6 +93,15 @@ class QueryAgent:
             )
             if self.instructions:
                 user_prompt += f"\n<instructions>{self.instructions}</instructions>"
+            # the short personal section goes last, users of a zip asking the same thing share the
+            # whole prompt up to here and with it the provider's prompt cache
+            user_prompt += dedent(
+                f"""
+                <user>
+                {user_info}
+                </user>
+                """
+            )
             chat_state = ChatState(system_prompt=system_prompt, user_prompt=user_prompt)
             output_schema = build_function_schema(
                 QueryResponse,
@@ -96,11 +115,16 @@ class QueryAgent:
             )
             try:
 
-                function = await self.llm_client.chat_completion(
-                    chat_state, tools=[output_schema]
+                generate_answer = partial(
+                    self._generate_answer, chat_state, output_schema
                 )
-                data = json.loads(function.arguments)
-                weather_response = QueryResponse.model_validate(data)
+                if self.cohort_answers:
+                    answer = await self.cohort_answers.get_or_generate(
+                        prompt_signature(system_prompt, user_prompt), generate_answer
+                    )
+                else:
+                    answer = await generate_answer()
+                weather_response = QueryResponse(answer=answer)
 
                 if isinstance(weather_response, QueryResponse):
                     log.info(f"GPT Response: {weather_response.model_dump_json()}")
@@ -133,3 +157,12 @@ class QueryAgent:
             await self.query_manager.persist_query(query)
             log.error(f"Error processing documents: {e!s}")
             raise
+
+    async def _generate_answer(
+        self, chat_state: ChatState, output_schema: ChatCompletionToolParam
+    ) -> str:
+        function = await self.llm_client.chat_completion(
+            chat_state, tools=[output_schema]
+        )
+        data = json.loads(function.arguments)
+        return QueryResponse.model_validate(data).answer
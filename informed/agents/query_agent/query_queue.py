@@ -0,0 +1,220 @@
+import asyncio
+from typing import Any
+from uuid import UUID
+
+from loguru import logger as log
+from pydantic import BaseModel
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from informed.config import QueryWorkerConfig
+from informed.db_models.query import Query, QueryState
+from informed.query.manager import QueryManager
+
+
+class QueryJob(BaseModel):
+    query_id: UUID
+    instructions: str | None = None
+    context: str | None = None
+
+
+class QueryJobEntry(BaseModel):
+    entry_id: str
+    job: QueryJob
+    deliveries: int = 1
+
+
+def _decode(value: Any) -> Any:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class QueryJobQueue:
+    """
+    Query jobs kept on a Redis Stream and consumed through a consumer group.
+
+    A job stays pending in the group until the worker that read it acks it. Workers touch the jobs they
+    are running, so a job left idle for longer than claim_idle_ms belongs to a dead worker and is claimed
+    by the next worker that reads from the queue. Jobs that keep failing end up on a dead letter stream.
+    """
+
+    def __init__(self, redis_client: Redis, config: QueryWorkerConfig):
+        self._redis_client = redis_client
+        self._stream = config.stream
+        self._dead_letter_stream = config.dead_letter_stream
+        self._consumer_group = config.consumer_group
+        self._max_stream_length = config.max_stream_length
+        self._block_ms = config.block_ms
+        self._claim_idle_ms = config.claim_idle_ms
+        # how long the enqueuing side waits on a worker to move a query on before giving up on it
+        self.result_timeout_seconds = config.result_timeout_seconds
+
+    async def ensure_consumer_group(self) -> None:
+        try:
+            await self._redis_client.xgroup_create(
+                self._stream, self._consumer_group, id="0", mkstream=True
+            )
+            log.info(
+                "created consumer group {} on {}", self._consumer_group, self._stream
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def enqueue(self, job: QueryJob) -> str:
+        entry_id = await self._redis_client.xadd(
+            self._stream,
+            {"job": job.model_dump_json()},
+            maxlen=self._max_stream_length,
+            approximate=True,
+        )
+        return str(_decode(entry_id))
+
+    async def read(self, consumer: str, count: int) -> list[QueryJobEntry]:
+        """
+        Returns up to count jobs for the consumer, jobs abandoned by dead workers first.
+        Blocks for up to block_ms when there is nothing to do.
+        """
+        entries = await self._claim_abandoned(consumer, count)
+        if entries:
+            return entries
+
+        response = await self._redis_client.xreadgroup(
+            self._consumer_group,
+            consumer,
+            streams={self._stream: ">"},
+            count=count,
+            block=self._block_ms,
+        )
+        for _, stream_entries in response or []:
+            entries.extend(self._parse_entries(stream_entries))
+        return entries
+
+    async def touch(self, consumer: str, entry_ids: list[str]) -> None:
+        """Resets the idle time of jobs still being worked on so they are not claimed by others."""
+        if entry_ids:
+            await self._redis_client.xclaim(
+                self._stream,
+                self._consumer_group,
+                consumer,
+                min_idle_time=0,
+                message_ids=[*entry_ids],
+                justid=True,
+            )
+
+    async def ack(self, entry_id: str) -> None:
+        await self._redis_client.xack(self._stream, self._consumer_group, entry_id)
+
+    async def dead_letter(self, entry: QueryJobEntry) -> None:
+        """Acks a job that kept failing, keeping it on the dead letter stream for inspection."""
+        async with self._redis_client.pipeline(transaction=True) as pipe:
+            pipe.xadd(
+                self._dead_letter_stream,
+                {
+                    "job": entry.job.model_dump_json(),
+                    "entry_id": entry.entry_id,
+                    "deliveries": entry.deliveries,
+                },
+                maxlen=self._max_stream_length,
+                approximate=True,
+            )
+            pipe.xack(self._stream, self._consumer_group, entry.entry_id)
+            await pipe.execute()
+
+    async def _claim_abandoned(self, consumer: str, count: int) -> list[QueryJobEntry]:
+        response = await self._redis_client.xautoclaim(
+            self._stream,
+            self._consumer_group,
+            consumer,
+            min_idle_time=self._claim_idle_ms,
+            count=count,
+        )
+        entries = self._parse_entries(response[1])
+        for entry in entries:
+            pending = await self._redis_client.xpending_range(
+                self._stream,
+                self._consumer_group,
+                min=entry.entry_id,
+                max=entry.entry_id,
+                count=1,
+            )
+            if pending:
+                entry.deliveries = pending[0]["times_delivered"]
+            log.warning(
+                "claimed abandoned query job {} (delivery {})",
+                entry.entry_id,
+                entry.deliveries,
+                query_id=entry.job.query_id,
+            )
+        return entries
+
+    def _parse_entries(self, stream_entries: list) -> list[QueryJobEntry]:
+        entries = []
+        for entry_id, fields in stream_entries:
+            # entries trimmed from the stream while pending come back without fields
+            if not fields:
+                continue
+            fields = {_decode(key): _decode(value) for key, value in fields.items()}
+            entries.append(
+                QueryJobEntry(
+                    entry_id=_decode(entry_id),
+                    job=QueryJob.model_validate_json(fields["job"]),
+                )
+            )
+        return entries
+
+
+class RemoteQueryAgent:
+    """
+    Stands in for a QueryAgent when query agents run in query workers.
+
+    Enqueues a job for the query and follows the states pushed by the worker running it until the query
+    terminates. If the worker goes quiet for longer than the result timeout the query is failed, a worker
+    still running it will find its next write stale and drop it.
+    """
+
+    def __init__(
+        self,
+        query_id: UUID,
+        query_manager: QueryManager,
+        job_queue: QueryJobQueue,
+        instructions: str | None = None,
+        context: str | None = None,
+    ):
+        self.query_id = query_id
+        self.query_manager = query_manager
+        self.job_queue = job_queue
+        self.instructions = instructions
+        self.context = context
+        self.query: Query | None = None
+
+    async def run(self) -> Query:
+        # subscribe before enqueuing so that no state pushed by the worker is missed
+        self.query_manager.subscribe_to_query_updates(self.query_id)
+        try:
+            await self.job_queue.enqueue(
+                QueryJob(
+                    query_id=self.query_id,
+                    instructions=self.instructions,
+                    context=self.context,
+                )
+            )
+            while self.query is None or not self.query.state.is_terminated():
+                try:
+                    self.query = await self.query_manager.wait_for_query_update(
+                        self.query_id, self.job_queue.result_timeout_seconds
+                    )
+                except TimeoutError:
+                    log.error(
+                        "timed out waiting for query worker", query_id=self.query_id
+                    )
+                    await self._terminate(QueryState.FAILED)
+        except asyncio.CancelledError:
+            # nobody is waiting for the answer anymore, let the worker drop it
+            await self._terminate(QueryState.CANCELLED)
+            raise
+        finally:
+            self.query_manager.unsubscribe_from_query_updates(self.query_id)
+        return self.query
+
+    async def _terminate(self, state: QueryState) -> None:
+        self.query = await self.query_manager.terminate_query(self.query_id, state)
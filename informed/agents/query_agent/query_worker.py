@@ -0,0 +1,180 @@
+import asyncio
+import contextlib
+import os
+import socket
+from functools import partial
+from uuid import UUID
+
+from loguru import logger as log
+
+from informed.agents.query_agent.query_agent import QueryAgent
+from informed.agents.query_agent.query_queue import QueryJobEntry, QueryJobQueue
+from informed.config import QueryWorkerConfig, WeatherSourcesConfig
+from informed.db_models.query import QueryState
+from informed.llm.client import LLMClient
+from informed.query.manager import QueryManager, StaleQueryError
+from informed.services.weather_alert_service import WeatherAlertService
+from informed.users.manager import UserManager
+
+
+class QueryWorker:
+    """
+    Runs query agents for jobs read from the query job queue, outside of the API process.
+
+    The API only creates the query and enqueues a job for it. Every state transition the agent persists is
+    pushed back to the API through the notifier. A job is acked once its query reached a terminal state.
+    A job that failed with its query still running is left pending so another worker retries it, up to
+    max_deliveries, then its query is failed and the job moved to the dead letter stream.
+    """
+
+    def __init__(
+        self,
+        job_queue: QueryJobQueue,
+        query_manager: QueryManager,
+        user_manager: UserManager,
+        llm_client: LLMClient,
+        weather_sources_config: WeatherSourcesConfig,
+        weather_alert_service: WeatherAlertService,
+        config: QueryWorkerConfig,
+    ):
+        self._job_queue = job_queue
+        self._query_manager = query_manager
+        self._user_manager = user_manager
+        self._llm_client = llm_client
+        self._weather_sources_config = weather_sources_config
+        self._weather_alert_service = weather_alert_service
+        self._concurrency = config.concurrency
+        self._max_deliveries = config.max_deliveries
+        self._touch_interval_seconds = config.claim_idle_ms / 3000
+        self._consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._running_jobs: dict[str, asyncio.Task] = {}
+        self._stop_event = asyncio.Event()
+
+    async def run(self) -> None:
+        await self._job_queue.ensure_consumer_group()
+        touch_task = asyncio.create_task(self._touch_running_jobs())
+        log.info(
+            "query worker {} started with concurrency {}",
+            self._consumer,
+            self._concurrency,
+        )
+        try:
+            while not self._stop_event.is_set():
+                free_slots = self._concurrency - len(self._running_jobs)
+                if free_slots <= 0:
+                    await asyncio.wait(
+                        self._running_jobs.values(),
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    continue
+
+                try:
+                    entries = await self._job_queue.read(self._consumer, free_slots)
+                except Exception as e:
+                    log.error("query worker failed to read jobs: {}", e)
+                    await asyncio.sleep(1.0)
+                    continue
+
+                for entry in entries:
+                    task = asyncio.create_task(self._run_job(entry))
+                    task.add_done_callback(partial(self._forget_job, entry.entry_id))
+                    self._running_jobs[entry.entry_id] = task
+        finally:
+            # let the jobs already started finish, anything not acked is picked up by another worker
+            if self._running_jobs:
+                await asyncio.gather(
+                    *self._running_jobs.values(), return_exceptions=True
+                )
+            touch_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await touch_task
+            log.info("query worker {} stopped", self._consumer)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def _forget_job(self, entry_id: str, _: asyncio.Task) -> None:
+        self._running_jobs.pop(entry_id, None)
+
+    async def _run_job(self, entry: QueryJobEntry) -> None:
+        query_id = entry.job.query_id
+        if entry.deliveries > self._max_deliveries:
+            await self._dead_letter(entry)
+            return
+        try:
+            await self._run_query_agent(entry)
+        except StaleQueryError:
+            # someone else moved the query on, e.g. it was cancelled, nothing left to do
+            log.info("query changed while the job was running", query_id=query_id)
+        except Exception as e:
+            if not await self._is_query_terminated(query_id):
+                # e.g. the database or the llm could not be reached, another delivery may get through
+                log.exception("query job failed, leaving it for a retry: {}", str(e))
+                return
+            log.exception("query job failed after its query ended: {}", str(e))
+        await self._job_queue.ack(entry.entry_id)
+
+    async def _run_query_agent(self, entry: QueryJobEntry) -> None:
+        query = await self._query_manager.get_query(entry.job.query_id)
+        # the job may be re-delivered after its query finished, or the query cancelled before we got to it
+        if query.state.is_terminated():
+            log.info(
+                "skipping job of terminated query, state: {}",
+                query.state,
+                query_id=query.query_id,
+            )
+            return
+
+        query_agent = QueryAgent(
+            query_id=query.query_id,
+            llm_client=self._llm_client,
+            query_manager=self._query_manager,
+            user_manager=self._user_manager,
+            weather_sources_config=self._weather_sources_config,
+            weather_alert_service=self._weather_alert_service,
+            instructions=entry.job.instructions,
+            context=entry.job.context,
+        )
+        query = await query_agent.run()
+        log.info(
+            "query agent finished, query state: {}",
+            query.state,
+            query_id=query.query_id,
+        )
+
+    async def _is_query_terminated(self, query_id: UUID) -> bool:
+        try:
+            query = await self._query_manager.get_query(query_id)
+        except Exception as e:
+            log.error(
+                "failed to read the query of a failed job: {}", e, query_id=query_id
+            )
+            return False
+        return query.state.is_terminated()
+
+    async def _dead_letter(self, entry: QueryJobEntry) -> None:
+        query_id = entry.job.query_id
+        log.error(
+            "giving up on query job after {} deliveries",
+            entry.deliveries,
+            query_id=query_id,
+        )
+        try:
+            await self._query_manager.terminate_query(query_id, QueryState.FAILED)
+        except Exception as e:
+            # the job is given up on all the same, the query may not even exist anymore
+            log.error(
+                "failed to fail the query of a dead job: {}", e, query_id=query_id
+            )
+        try:
+            await self._job_queue.dead_letter(entry)
+        except Exception as e:
+            log.error("failed to dead letter query job {}: {}", entry.entry_id, e)
+
+    async def _touch_running_jobs(self) -> None:
+        while True:
+            await asyncio.sleep(self._touch_interval_seconds)
+            try:
+                await self._job_queue.touch(self._consumer, list(self._running_jobs))
+            except Exception as e:
+                log.error("query worker failed to touch running jobs: {}", e)
@@ -1,15 +1,19 @@
+from collections.abc import AsyncIterator
 from datetime import datetime
-from typing import cast
+from typing import Any, cast
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy import ColumnElement, select
 
 from informed.db import session_maker
+from informed.db_models.chat import ChatThread
 from informed.db_models.users import AccountType, User
 from informed.db_models.weather_alert import WeatherAlert
 from informed.helper.utils import get_current_user
+from informed.informed import InformedManager
 
 router = APIRouter()
 
@@ -120,7 +124,7 @@ async def list_weather_alerts(
             detail="Only admin users can list weather alerts",
         )
 
-    async with session_maker() as session:
+    async with session_maker(readonly=True) as session:
         query = select(WeatherAlert)
 
         # Apply filters if provided
@@ -137,3 +141,48 @@ async def list_weather_alerts(
         weather_alerts = result.scalars().all()
 
         return [WeatherAlertResponse.from_db(n) for n in weather_alerts]
+
+
+class ChatThreadExport(BaseModel):
+    chat_thread_id: UUID
+    user_id: UUID
+    created_at: float
+    messages: list[dict[str, Any]]
+
+    @classmethod
+    def from_db(cls, chat_thread: ChatThread) -> "ChatThreadExport":
+        return cls(
+            chat_thread_id=chat_thread.chat_thread_id,
+            user_id=chat_thread.user_id,
+            created_at=chat_thread.created_at,
+            messages=[m.model_dump(mode="json") for m in chat_thread.messages],
+        )
+
+
+@router.get("/chat-threads/export")
+async def export_chat_threads(
+    request: Request,
+    chunk_size: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+) -> StreamingResponse:
+    """Every chat thread with its messages as newline delimited JSON, one thread per line."""
+    if current_user.account_type not in [AccountType.ADMIN, AccountType.SUPERADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin users can export chat threads",
+        )
+
+    app_manager = cast(InformedManager, request.app.state.app_manager)
+
+    async def lines() -> AsyncIterator[str]:
+        # written a chunk at a time, threads are never all held in memory
+        async for chunk in app_manager.stream_chat_threads(chunk_size):
+            yield "".join(
+                ChatThreadExport.from_db(t).model_dump_json() + "\n" for t in chunk
+            )
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=chat_threads.ndjson"},
+    )
@@ -22,8 +22,10 @@ from informed.db import init_db
 from informed.helper.utils import get_concise_exception_traceback
 from informed.informed import InformedManager
 from informed.llm.client import LLMClient
+from informed.metrics import setup_metrics
 from informed.redis import init_redis_client
 from informed.scheduler import JobScheduler
+from informed.services.partitions import PartitionMaintenance
 
 
 @asynccontextmanager
@@ -31,15 +33,17 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[Any, Any]:
     try:
         # Startup logic
         log.info("Initializing resources...")
+        # Add any initialization code here
+        await app.state.app_manager.start()
+        # after the manager, jobs run at startup need the leader elected and the notifier running
         job_scheduler: JobScheduler = app.state.job_scheduler
         job_scheduler.start()
-        # Add any initialization code here
 
         yield
 
         # Shutdown logic
         job_scheduler.stop()
-        await app.state.app_manager.cancel_all_tasks()
+        await app.state.app_manager.stop()
         if hasattr(app.state, "executor"):
             app.state.executor.shutdown(wait=True)
         log.info("Executor has been shut down")
@@ -50,6 +54,7 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[Any, Any]:
 
 def create_app(config: Config) -> FastAPI:
     log.info("Creating app...")
+    setup_metrics(config)
     # Initialize the database
     init_db(config.database_config)
     redis_client = init_redis_client(config.redis_config)
@@ -68,31 +73,27 @@ def create_app(config: Config) -> FastAPI:
 
     app_manager = InformedManager(config, llm_client, redis_client)
     app.state.app_manager = app_manager
+    app.state.user_cache = app_manager.user_cache
+    app.state.session_store = app_manager.session_store
 
     # Initialize the job scheduler
-    job_scheduler = JobScheduler()
+    job_scheduler = JobScheduler(
+        config.scheduler_config, redis_client, app_manager.leader_election
+    )
     app.state.job_scheduler = job_scheduler
 
-    # Schedule daily updates with unique IDs
-    job_scheduler.add_cron_job(
+    # Daily updates are generated ahead of each user's own delivery time, spread over a window
+    job_scheduler.add_job(
         app_manager.send_daily_updates,
-        hour=18,
-        minute=4,
-        timezone="America/Los_Angeles",
+        interval_seconds=config.daily_updates_config.schedule_interval_seconds,
+    )
+
+    # Keep the partitions of the growing tables within the retention period
+    partition_maintenance = PartitionMaintenance(config.retention_config)
+    job_scheduler.add_job(
+        partition_maintenance.maintain_partitions,
+        interval_seconds=config.retention_config.maintenance_interval_seconds,
     )
-    # TODO: Same name will throw error in job scheduler
-    # job_scheduler.add_cron_job(
-    #     app_manager.send_daily_updates,
-    #     hour=7,
-    #     minute=0,
-    #     timezone="America/Los_Angeles",
-    # )
-    # job_scheduler.add_cron_job(
-    #     app_manager.send_daily_updates,
-    #     hour=16,
-    #     minute=30,
-    #     timezone="America/Los_Angeles",
-    # )
 
     # Add CORS middleware
     app.add_middleware(
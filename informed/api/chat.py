@@ -2,16 +2,27 @@ import os
 from typing import Any, cast
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from google.api_core import client_options
 from google.cloud import texttospeech_v1beta1 as texttospeech
 from loguru import logger
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
-from informed.api.schema import AddUserMessageRequest, ChatRequest, ChatResponse
+from informed.api.schema import (
+    AddUserMessageRequest,
+    ChatRequest,
+    ChatResponse,
+    MessageChangeCursor,
+    MessageCursor,
+)
 from informed.db_models.users import Language
-from informed.helper.utils import UserDep
+from informed.helper.utils import (
+    ReadOnlySessionDep,
+    SessionDep,
+    UserDep,
+    UserProfileDep,
+)
 from informed.informed import InformedManager
 
 router = APIRouter()
@@ -23,15 +34,19 @@ limiter = Limiter(key_func=get_remote_address)
 
 @router.post("", response_model=ChatResponse)
 async def create_chat(
-    chat_request: ChatRequest, request: Request, user: UserDep
+    chat_request: ChatRequest, request: Request, user: UserDep, session: SessionDep
 ) -> ChatResponse:
     app_manager = cast(InformedManager, request.app.state.app_manager)
     try:
+        # taken before the thread is created, every change to it comes after
+        next_cursor = await app_manager.get_changes_cursor(session)
         chat_thread = await app_manager.start_new_chat_thread(
-            chat_request, user.user_id
+            chat_request, user.user_id, session=session
+        )
+        # the new thread only holds the message just sent
+        chat_response = ChatResponse.from_chat_thread(
+            chat_thread, next_cursor=next_cursor
         )
-        chat_thread = await app_manager.get_chat(chat_thread.chat_thread_id)
-        chat_response = ChatResponse.from_chat_thread(chat_thread)
         return chat_response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {e!s}") from e
@@ -42,17 +57,18 @@ async def add_user_message(
     add_user_message_request: AddUserMessageRequest,
     user: UserDep,
     request: Request,
+    session: SessionDep,
 ) -> ChatResponse:
     app_manager = cast(InformedManager, request.app.state.app_manager)
     try:
-        await app_manager.add_user_message(add_user_message_request, user.user_id)
-        chat_thread_id = add_user_message_request.chat_thread_id
-        chat_thread = await app_manager.get_chat(chat_thread_id)
-        if chat_thread is None:
-            raise HTTPException(
-                status_code=404, detail=f"chat thread {chat_thread_id} not found"
-            )
-        chat_response = ChatResponse.from_chat_thread(chat_thread)
+        message = await app_manager.add_user_message(
+            add_user_message_request, user.user_id, session=session
+        )
+        # only the new message, without a cursor: clients go on polling with the one they have,
+        # a cursor taken now would skip what was written since their last poll
+        chat_response = ChatResponse.from_messages(
+            add_user_message_request.chat_thread_id, [message]
+        )
         return chat_response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"unexpected error: {e}") from e
@@ -63,19 +79,46 @@ async def get_chat(
     chat_thread_id: UUID,
     _: UserDep,
     request: Request,
+    session: ReadOnlySessionDep,
+    after: str | None = Query(
+        None, description="Only return messages added or changed since this cursor"
+    ),
+    before: str | None = Query(
+        None, description="Page back through messages older than this cursor"
+    ),
+    limit: int = Query(50, ge=1, le=200),
 ) -> ChatResponse:
+    if after and before:
+        raise HTTPException(
+            status_code=400, detail="after and before can not be used together"
+        )
+    try:
+        after_cursor = MessageChangeCursor.decode(after) if after else None
+        before_cursor = MessageCursor.decode(before) if before else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"invalid cursor: {e}") from e
+
     app_manager = cast(InformedManager, request.app.state.app_manager)
     try:
-        chat_thread = await app_manager.get_chat(chat_thread_id)
-        chat_response = ChatResponse.from_chat_thread(chat_thread)
-        return chat_response
+        return await app_manager.get_chat_messages(
+            chat_thread_id,
+            limit,
+            after=after_cursor,
+            before=before_cursor,
+            session=session,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"unexpected error: {e!s}") from e
 
 
 @router.get("/tts/{message_id}")
 async def get_query_tts(
-    message_id: UUID, request: Request, current_user: UserDep
+    message_id: UUID,
+    request: Request,
+    current_user: UserProfileDep,
+    session: SessionDep,
 ) -> Any:
     # Validate API key exists
     api_key = os.getenv("GOOGLE_API_KEY")
@@ -89,7 +132,7 @@ async def get_query_tts(
     app_manager = request.app.state.app_manager
     try:
         # Get message
-        message = await app_manager.get_message(message_id)
+        message = await app_manager.get_message(message_id, session)
         if not message:
             raise HTTPException(status_code=404, detail="Message not found")
 
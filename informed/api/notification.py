@@ -1,12 +1,13 @@
 from typing import cast
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, HTTPException, Query, Request
 
 from informed.api.schema import (
     BulkUpdateNotificationStatusRequest,
+    NotificationCursor,
     NotificationListResponse,
 )
-from informed.helper.utils import UserDep
+from informed.helper.utils import ReadOnlySessionDep, SessionDep, UserDep
 from informed.informed import InformedManager
 
 router = APIRouter()
@@ -14,11 +15,23 @@ router = APIRouter()
 
 @router.get("/")
 async def get_notifications(
-    request: Request, user: UserDep
+    request: Request,
+    user: UserDep,
+    session: ReadOnlySessionDep,
+    before: str | None = Query(
+        None, description="Page back through notifications older than this cursor"
+    ),
+    limit: int = Query(10, ge=1, le=100),
 ) -> NotificationListResponse:
+    try:
+        before_cursor = NotificationCursor.decode(before) if before else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"invalid cursor: {e}") from e
+
     app_manager = cast(InformedManager, request.app.state.app_manager)
-    notifications = await app_manager.get_notifications_for_user(user.user_id)
-    return NotificationListResponse.from_user_notifications(notifications)
+    return await app_manager.get_notifications_for_user(
+        user.user_id, limit, before_cursor, session=session
+    )
 
 
 @router.put("/")
@@ -26,10 +39,22 @@ async def mark_notifications_as_read(
     notification_request: BulkUpdateNotificationStatusRequest,
     request: Request,
     user: UserDep,
+    session: SessionDep,
 ) -> NotificationListResponse:
     app_manager = cast(InformedManager, request.app.state.app_manager)
     await app_manager.bulk_update_notification_status(
-        notification_request.notification_ids, notification_request.status
+        user.user_id,
+        notification_request.notification_ids,
+        notification_request.status,
+        session,
     )
-    notifications = await app_manager.get_notifications_for_user(user.user_id)
-    return NotificationListResponse.from_user_notifications(notifications)
+    return await app_manager.get_notifications_for_user(user.user_id, session=session)
+
+
+@router.put("/read")
+async def mark_all_notifications_as_read(
+    request: Request, user: UserDep, session: SessionDep
+) -> NotificationListResponse:
+    app_manager = cast(InformedManager, request.app.state.app_manager)
+    await app_manager.mark_notifications_as_read(user.user_id, session)
+    return await app_manager.get_notifications_for_user(user.user_id, session=session)
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, time
 from uuid import UUID
 
 from pydantic import BaseModel
@@ -27,6 +27,8 @@ from informed.db_models.users import (
 class SettingsRequest(BaseModel):
     daily_updates: bool
     daily_update_prompt: str
+    daily_update_time: time = time(18, 0)
+    daily_update_timezone: str = "America/Los_Angeles"
 
     def to_user_configurations(self) -> UserConfigurations:
         try:
@@ -39,12 +41,37 @@ class SettingsRequest(BaseModel):
 class SettingsResponse(BaseModel):
     daily_updates: bool
     daily_update_prompt: str
+    daily_update_time: time
+    daily_update_timezone: str
 
     @classmethod
     def from_user_settings(cls, settings: Settings) -> "SettingsResponse":
         return cls.model_validate(settings.configurations, from_attributes=True)
 
 
+class NotificationCursor(BaseModel):
+    """Position of a notification in the inbox, newest first by (created_at, notification_id)."""
+
+    created_at: float
+    notification_id: UUID
+
+    @classmethod
+    def from_notification(cls, notification: Notification) -> "NotificationCursor":
+        return cls(
+            created_at=notification.created_at,
+            notification_id=notification.notification_id,
+        )
+
+    @classmethod
+    def decode(cls, cursor: str) -> "NotificationCursor":
+        """Raises ValueError if the cursor is malformed."""
+        created_at, _, notification_id = cursor.rpartition("_")
+        return cls(created_at=float(created_at), notification_id=UUID(notification_id))
+
+    def encode(self) -> str:
+        return f"{self.created_at!r}_{self.notification_id}"
+
+
 class NotificationResponse(BaseModel):
     notification_id: UUID
     user_id: UUID
@@ -62,17 +89,24 @@ class NotificationResponse(BaseModel):
 
 class NotificationListResponse(BaseModel):
     notifications: list[NotificationResponse]
+    # pass as `before` to get the next, older page, unset once the end of the inbox is reached
+    next_cursor: str | None = None
 
     @classmethod
     def from_user_notifications(
-        cls, notifications: list[Notification]
+        cls, notifications: list[Notification], has_older: bool = False
     ) -> "NotificationListResponse":
         return cls.model_validate(
             {
                 "notifications": [
                     NotificationResponse.from_db_notification(notification)
                     for notification in notifications
-                ]
+                ],
+                "next_cursor": (
+                    NotificationCursor.from_notification(notifications[-1]).encode()
+                    if has_older and notifications
+                    else None
+                ),
             },
             from_attributes=True,
         )
@@ -331,15 +365,91 @@ class ChatMessageResponse(BaseModel):
         return cls.model_validate(data)
 
 
+class MessageCursor(BaseModel):
+    """Position of a message in the history of its thread, ordered by (created_at, message_id)."""
+
+    created_at: float
+    message_id: UUID
+
+    @classmethod
+    def from_message(cls, message: Message) -> "MessageCursor":
+        return cls(created_at=message.created_at, message_id=message.message_id)
+
+    @classmethod
+    def decode(cls, cursor: str) -> "MessageCursor":
+        """Raises ValueError if the cursor is malformed."""
+        created_at, _, message_id = cursor.rpartition("_")
+        return cls(created_at=float(created_at), message_id=UUID(message_id))
+
+    def encode(self) -> str:
+        # repr round-trips the float exactly, so the cursor matches the stored value
+        return f"{self.created_at!r}_{self.message_id}"
+
+
+class MessageChangeCursor(BaseModel):
+    """
+    Position in the changes to the messages of a thread, ordered by the transaction that last wrote
+    each message, (change_xid, message_id). Without a message_id it is the position before every
+    message of the transaction.
+    """
+
+    change_xid: int
+    message_id: UUID | None = None
+
+    @classmethod
+    def from_message(cls, message: Message) -> "MessageChangeCursor":
+        if message.change_xid is None:
+            raise ValueError(f"message {message.message_id} has not been written yet")
+        return cls(change_xid=message.change_xid, message_id=message.message_id)
+
+    @classmethod
+    def decode(cls, cursor: str) -> "MessageChangeCursor":
+        """Raises ValueError if the cursor is malformed."""
+        change_xid, _, message_id = cursor.partition("_")
+        return cls(
+            change_xid=int(change_xid),
+            message_id=UUID(message_id) if message_id else None,
+        )
+
+    def encode(self) -> str:
+        return f"{self.change_xid}_{self.message_id or ''}"
+
+
 class ChatResponse(BaseModel):
     chat_thread_id: UUID
     messages: list[ChatMessageResponse]
+    # pass as `after` to get the messages added or changed since, a changed message comes again
+    next_cursor: str | None = None
+    # pass as `before` to page back through older messages, unset once the start of the thread is reached
+    prev_cursor: str | None = None
 
     @classmethod
-    def from_chat_thread(cls, chat_thread: ChatThread) -> "ChatResponse":
-        data = chat_thread.model_dump()
-        data["messages"] = [
-            ChatMessageResponse.from_chat_message(message)
-            for message in chat_thread.messages
-        ]
-        return cls.model_validate(data)
+    def from_chat_thread(
+        cls,
+        chat_thread: ChatThread,
+        next_cursor: MessageChangeCursor | None = None,
+    ) -> "ChatResponse":
+        return cls.from_messages(
+            chat_thread.chat_thread_id, chat_thread.messages, next_cursor=next_cursor
+        )
+
+    @classmethod
+    def from_messages(
+        cls,
+        chat_thread_id: UUID,
+        messages: list[Message],
+        next_cursor: MessageChangeCursor | None = None,
+        has_older: bool = False,
+    ) -> "ChatResponse":
+        return cls(
+            chat_thread_id=chat_thread_id,
+            messages=[
+                ChatMessageResponse.from_chat_message(message) for message in messages
+            ],
+            next_cursor=next_cursor.encode() if next_cursor else None,
+            prev_cursor=(
+                MessageCursor.from_message(messages[0]).encode()
+                if messages and has_older
+                else None
+            ),
+        )
@@ -1,11 +1,11 @@
-import json
-import secrets
 import traceback
 from typing import cast
 
 from fastapi import APIRouter, HTTPException, Request, Response, status
-from sqlalchemy import ColumnElement, select
+from sqlalchemy import ColumnElement, select, update
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
 from informed.api.schema import (
     AuthenticatedUserResponse,
@@ -30,17 +30,21 @@ from informed.db_models.users import (
     UserMedications,
     WeatherSensitivities,
 )
-from informed.helper.utils import UserDep
+from informed.helper.utils import (
+    SessionDep,
+    UserProfileDep,
+    get_session_store,
+    get_user_cache,
+)
+from informed.users.loaders import UserLoadProfile, user_load_options
 
 router = APIRouter()
 
 
 async def set_session_cookie(request: Request, response: Response, user: User) -> None:
-    redis_client = request.app.state.redis_client
-    session_token = secrets.token_urlsafe()
-    session_object = {"email": user.email, "role": "admin"}
-    serialized_session = json.dumps(session_object)
-    await redis_client.set(session_token, serialized_session, ex=3600)
+    session_token = await get_session_store(request).create(
+        user.user_id, user.profile_version
+    )
     response.set_cookie(
         key="session_token",
         value=session_token,
@@ -50,6 +54,36 @@ async def set_session_cookie(request: Request, response: Response, user: User) -
     )
 
 
+async def bump_profile_version(session: AsyncSession, user: User) -> None:
+    """
+    Increments the user's profile version in the database, in the transaction of the change. The
+    user's copy may be stale, e.g. cached, and concurrent changes each get a version of their own.
+    """
+    profile_version = cast(ColumnElement[int], User.profile_version)
+    result = await session.execute(
+        update(User)
+        .where(cast(ColumnElement[bool], User.user_id == user.user_id))
+        .values(profile_version=profile_version + 1)
+        .returning(profile_version)
+        .execution_options(synchronize_session=False)
+    )
+    # already written, not to be flushed again
+    set_committed_value(user, "profile_version", result.scalar_one())
+
+
+async def profile_changed(request: Request, user: User) -> None:
+    """Called once a change to the user's profile is committed."""
+    user_cache = get_user_cache(request)
+    if user_cache:
+        await user_cache.invalidate(user)
+    # the session now expects at least this version, so a stale cached copy is never served to it
+    session_token = request.cookies.get("session_token")
+    if session_token:
+        await get_session_store(request).set_profile_version(
+            session_token, user.profile_version
+        )
+
+
 @router.post(
     "/register",
     response_model=AuthenticatedUserResponse,
@@ -109,9 +143,9 @@ async def login(
     try:
         async with session_maker() as session:
             result = await session.execute(
-                select(User).filter(
-                    cast(ColumnElement[bool], User.email == login_request.email)
-                )
+                select(User)
+                .filter(cast(ColumnElement[bool], User.email == login_request.email))
+                .options(*user_load_options(UserLoadProfile.FULL))
             )
             db_user = result.unique().scalar_one_or_none()
             if db_user:
@@ -129,16 +163,15 @@ async def login(
 @router.get("/logout")
 async def logout(request: Request, response: Response) -> dict:
     session_token = request.cookies.get("session_token")
-    redis_client = request.app.state.redis_client
     if session_token:
-        await redis_client.delete(session_token)
+        await get_session_store(request).delete(session_token)
         return {"message": "Logged out"}
     raise HTTPException(status_code=400, detail="No active session found")
 
 
 @router.get("/me")
 async def check_session_alive(
-    current_user: UserDep,
+    current_user: UserProfileDep,
 ) -> AuthenticatedUserResponse:
     try:
         return AuthenticatedUserResponse.from_user(user=current_user)
@@ -149,50 +182,53 @@ async def check_session_alive(
 @router.post("/details", response_model=UserDetailsResponse)
 async def set_user_details(
     details: UserDetailsRequest,
-    current_user: UserDep,
+    request: Request,
+    current_user: UserProfileDep,
+    session: SessionDep,
 ) -> UserDetailsResponse:
-    async with session_maker() as session:
-        user = current_user
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        if not user.details:
-            user.details = UserDetails(
-                user_id=user.user_id,
-                first_name=details.first_name,
-                last_name=details.last_name,
-            )
+    user = current_user
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
 
-        user.details.first_name = details.first_name
-        user.details.last_name = details.last_name
-        user.details.age = details.age
-        user.details.address_line1 = details.address_line1
-        user.details.address_line2 = details.address_line2
-        user.details.city = details.city
-        user.details.state = details.state
-        user.details.zip_code = details.zip_code
-        user.details.country = details.country
-        user.details.phone_number = details.phone_number
-        user.details.ethnicity = details.ethnicity
-        user.details.language = details.language
-        session.add(user.details)
-
-        try:
-            await session.commit()
-            await session.flush()
-        except IntegrityError as e:
-            await session.rollback()
-            print(f"IntegrityError: {e!s}")
-            raise HTTPException(
-                status_code=500, detail="An error occurred while updating user details"
-            )
+    if not user.details:
+        user.details = UserDetails(
+            user_id=user.user_id,
+            first_name=details.first_name,
+            last_name=details.last_name,
+        )
+
+    user.details.first_name = details.first_name
+    user.details.last_name = details.last_name
+    user.details.age = details.age
+    user.details.address_line1 = details.address_line1
+    user.details.address_line2 = details.address_line2
+    user.details.city = details.city
+    user.details.state = details.state
+    user.details.zip_code = details.zip_code
+    user.details.country = details.country
+    user.details.phone_number = details.phone_number
+    user.details.ethnicity = details.ethnicity
+    user.details.language = details.language
+    session.add(user.details)
+    await bump_profile_version(session, user)
+
+    try:
+        await session.commit()
+        await session.flush()
+    except IntegrityError as e:
+        await session.rollback()
+        print(f"IntegrityError: {e!s}")
+        raise HTTPException(
+            status_code=500, detail="An error occurred while updating user details"
+        )
+    await profile_changed(request, user)
 
     return UserDetailsResponse.from_user_details(user.details)
 
 
 @router.get("/details", response_model=UserDetailsResponse)
 async def get_user_details(
-    current_user: UserDep,
+    current_user: UserProfileDep,
 ) -> UserDetailsResponse:
 
     user = current_user
@@ -207,7 +243,7 @@ async def get_user_details(
 
 @router.get("/medical-details", response_model=UserMedicalDetailsResponse)
 async def get_medical_details(
-    current_user: UserDep,
+    current_user: UserProfileDep,
 ) -> UserMedicalDetailsResponse:
 
     user = current_user
@@ -220,56 +256,59 @@ async def get_medical_details(
 @router.post("/medical-details", response_model=UserMedicalDetailsResponse)
 async def set_medical_details(
     details: UserMedicalDetailsRequest,
-    current_user: UserDep,
+    request: Request,
+    current_user: UserProfileDep,
+    session: SessionDep,
 ) -> UserMedicalDetailsResponse:
     user = current_user
     try:
-        async with session_maker() as session:
-            if user.medical_details:
-                medical_details = user.medical_details
-            else:
-                medical_details = UserMedicalDetails(user_id=user.user_id)
-
-            medical_details.blood_type = details.blood_type
-            medical_details.height = details.height
-            medical_details.weight = details.weight
-
-            # Handle health conditions
-            medical_details.health_conditions = []
-            for condition in details.health_conditions:
-                health_condition = UserHealthConditions(
-                    user_medical_id=medical_details.id,
-                    condition=condition.condition,
-                    severity=condition.severity,
-                    description=condition.description,
-                )
-                medical_details.health_conditions.append(health_condition)
-
-            # Handle medications
-            medical_details.medications = []
-            for med in details.medications:
-                medication = UserMedications(
-                    user_medical_id=medical_details.id,
-                    name=med.name,
-                    dosage=med.dosage,
-                    frequency=med.frequency,
-                )
-                medical_details.medications.append(medication)
-
-            # Handle weather sensitivities
-            medical_details.weather_sensitivities = []
-            for sensitivity in details.weather_sensitivities:
-                weather_sensitivity = WeatherSensitivities(
-                    user_medical_id=medical_details.id,
-                    type=sensitivity.type,
-                    description=sensitivity.description,
-                )
-                medical_details.weather_sensitivities.append(weather_sensitivity)
-
-            user.medical_details = medical_details
-            session.add(user)
-            await session.commit()
-            return UserMedicalDetailsResponse.from_user_medical_details(medical_details)
+        if user.medical_details:
+            medical_details = user.medical_details
+        else:
+            medical_details = UserMedicalDetails(user_id=user.user_id)
+
+        medical_details.blood_type = details.blood_type
+        medical_details.height = details.height
+        medical_details.weight = details.weight
+
+        # Handle health conditions
+        medical_details.health_conditions = []
+        for condition in details.health_conditions:
+            health_condition = UserHealthConditions(
+                user_medical_id=medical_details.id,
+                condition=condition.condition,
+                severity=condition.severity,
+                description=condition.description,
+            )
+            medical_details.health_conditions.append(health_condition)
+
+        # Handle medications
+        medical_details.medications = []
+        for med in details.medications:
+            medication = UserMedications(
+                user_medical_id=medical_details.id,
+                name=med.name,
+                dosage=med.dosage,
+                frequency=med.frequency,
+            )
+            medical_details.medications.append(medication)
+
+        # Handle weather sensitivities
+        medical_details.weather_sensitivities = []
+        for sensitivity in details.weather_sensitivities:
+            weather_sensitivity = WeatherSensitivities(
+                user_medical_id=medical_details.id,
+                type=sensitivity.type,
+                description=sensitivity.description,
+            )
+            medical_details.weather_sensitivities.append(weather_sensitivity)
+
+        user.medical_details = medical_details
+        session.add(user)
+        await bump_profile_version(session, user)
+        await session.commit()
+        await profile_changed(request, user)
+        return UserMedicalDetailsResponse.from_user_medical_details(medical_details)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"An unexpected error occurred: {e!s}"
@@ -277,18 +316,24 @@ async def set_medical_details(
 
 
 @router.get("/settings")
-async def get_settings(user: UserDep) -> SettingsResponse:
+async def get_settings(user: UserProfileDep) -> SettingsResponse:
     return SettingsResponse.from_user_settings(user.settings)
 
 
 @router.post("/settings")
-async def set_settings(settings: SettingsRequest, user: UserDep) -> SettingsResponse:
+async def set_settings(
+    settings: SettingsRequest,
+    request: Request,
+    user: UserProfileDep,
+    session: SessionDep,
+) -> SettingsResponse:
     try:
-        async with session_maker() as session:
-            user.settings.configurations = settings.to_user_configurations()
-            session.add(user)
-            await session.commit()
-            return SettingsResponse.from_user_settings(user.settings)
+        user.settings.configurations = settings.to_user_configurations()
+        session.add(user)
+        await bump_profile_version(session, user)
+        await session.commit()
+        await profile_changed(request, user)
+        return SettingsResponse.from_user_settings(user.settings)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"An unexpected error occurred: {e!s}"
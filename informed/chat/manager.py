@@ -1,26 +1,46 @@
-import asyncio
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
 from typing import cast
 from uuid import UUID
 
-from sqlalchemy import ColumnElement, select
+from sqlalchemy import ColumnElement, Select, literal, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from informed.api.schema import AddUserMessageRequest, ChatRequest
-from informed.db import session_maker
-from informed.db_models.chat import ChatThread, Message
+from informed.api.schema import (
+    AddUserMessageRequest,
+    ChatRequest,
+    MessageChangeCursor,
+    MessageCursor,
+)
+from informed.db import after_commit, session_maker, transaction
+from informed.db_models.chat import ChatThread, Message, MessageSource
+from informed.db_models.shared_types import EnumAsString
+from informed.notifier import Notifier
+
+# every transaction with a smaller id has ended, what they wrote can all be seen
+_OLDEST_RUNNING_XID = text(
+    "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+)
 
 
 class ChatManager(ABC):
     @abstractmethod
     async def create_chat_thread(
-        self, chat_request: ChatRequest, user_id: UUID
+        self,
+        chat_request: ChatRequest,
+        user_id: UUID,
+        session: AsyncSession | None = None,
     ) -> ChatThread:
         pass
 
     @abstractmethod
     async def add_user_message(
-        self, add_user_message_request: AddUserMessageRequest, user_id: UUID
-    ) -> UUID:
+        self,
+        add_user_message_request: AddUserMessageRequest,
+        user_id: UUID,
+        session: AsyncSession | None = None,
+    ) -> Message:
         pass
 
     @abstractmethod
@@ -30,11 +50,35 @@ class ChatManager(ABC):
         pass
 
     @abstractmethod
-    async def get_chat_thread(self, chat_thread_id: UUID) -> ChatThread | None:
+    async def get_chat_thread(
+        self,
+        chat_thread_id: UUID,
+        session: AsyncSession | None = None,
+        readonly: bool = False,
+    ) -> ChatThread | None:
+        pass
+
+    @abstractmethod
+    async def get_messages(
+        self,
+        chat_thread_id: UUID,
+        limit: int,
+        after: MessageChangeCursor | None = None,
+        before: MessageCursor | None = None,
+        session: AsyncSession | None = None,
+    ) -> list[Message]:
+        pass
+
+    @abstractmethod
+    async def get_changes_cursor(
+        self, session: AsyncSession | None = None
+    ) -> MessageChangeCursor:
         pass
 
     @abstractmethod
-    async def get_all_chat_threads(self) -> list[ChatThread]:
+    def stream_chat_threads(
+        self, chunk_size: int = 100
+    ) -> AsyncIterator[list[ChatThread]]:
         pass
 
     @abstractmethod
@@ -46,7 +90,19 @@ class ChatManager(ABC):
         pass
 
     @abstractmethod
-    def add_user_message_event(self, chat_thread_id: UUID) -> None:
+    async def add_user_message_event(self, chat_thread_id: UUID) -> None:
+        pass
+
+    @abstractmethod
+    def subscribe_to_new_user_messages(self, chat_thread_id: UUID) -> None:
+        pass
+
+    @abstractmethod
+    def unsubscribe_from_new_user_messages(self, chat_thread_id: UUID) -> None:
+        pass
+
+    @abstractmethod
+    async def get_pending_user_messages(self, chat_thread_id: UUID) -> list[Message]:
         pass
 
     @abstractmethod
@@ -54,76 +110,95 @@ class ChatManager(ABC):
         pass
 
     @abstractmethod
-    async def get_message(self, message_id: UUID) -> Message | None:
+    async def get_message(
+        self, message_id: UUID, session: AsyncSession | None = None
+    ) -> Message | None:
         pass
 
 
 class DBChatManager(ChatManager):
-    def __init__(self) -> None:
-        self._new_message_events: dict[UUID, asyncio.Event] = {}
+    def __init__(self, notifier: Notifier) -> None:
+        self._notifier = notifier
+
+    @staticmethod
+    def _new_message_channel(chat_thread_id: UUID) -> str:
+        return f"chat_thread:{chat_thread_id}:user_message"
 
     async def wait_for_new_user_message(self, chat_thread_id: UUID) -> None:
-        if chat_thread_id not in self._new_message_events:
-            self._new_message_events[chat_thread_id] = asyncio.Event()
-        await self._new_message_events[chat_thread_id].wait()
-        self._new_message_events[chat_thread_id].clear()
+        await self._notifier.wait(self._new_message_channel(chat_thread_id))
+
+    async def add_user_message_event(self, chat_thread_id: UUID) -> None:
+        await self._notifier.publish(self._new_message_channel(chat_thread_id))
+
+    def subscribe_to_new_user_messages(self, chat_thread_id: UUID) -> None:
+        self._notifier.subscribe(self._new_message_channel(chat_thread_id))
 
-    def add_user_message_event(self, chat_thread_id: UUID) -> None:
-        if chat_thread_id not in self._new_message_events:
-            self._new_message_events[chat_thread_id] = asyncio.Event()
-        self._new_message_events[chat_thread_id].set()
+    def unsubscribe_from_new_user_messages(self, chat_thread_id: UUID) -> None:
+        self._notifier.unsubscribe(self._new_message_channel(chat_thread_id))
 
     async def create_chat_thread(
-        self, chat_request: ChatRequest, user_id: UUID
+        self,
+        chat_request: ChatRequest,
+        user_id: UUID,
+        session: AsyncSession | None = None,
     ) -> ChatThread:
         chat_thread = ChatThread(user_id=user_id)
         message = chat_request.user_message(
             user_id, chat_thread_id=chat_thread.chat_thread_id
         )
         chat_thread.messages = [message]
-        async with session_maker() as session:
+        async with transaction(session) as session:
             session.add(chat_thread)
             session.add(message)
-            await session.commit()
 
         return chat_thread
 
     async def add_user_message(
-        self, add_user_message_request: AddUserMessageRequest, user_id: UUID
-    ) -> UUID:
-        message = add_user_message_request.user_message(
-            user_id, add_user_message_request.chat_thread_id
-        )
-        chat_thread = await self.get_chat_thread(
-            add_user_message_request.chat_thread_id
-        )
-        if not chat_thread:
-            raise Exception(
-                f"chat thread {add_user_message_request.chat_thread_id} does not exist"
+        self,
+        add_user_message_request: AddUserMessageRequest,
+        user_id: UUID,
+        session: AsyncSession | None = None,
+    ) -> Message:
+        chat_thread_id = add_user_message_request.chat_thread_id
+        message = add_user_message_request.user_message(user_id, chat_thread_id)
+
+        async with transaction(session) as session:
+            # only check that the thread exists, loading it would pull in every message
+            result = await session.execute(
+                select(ChatThread.chat_thread_id).filter(  # type: ignore
+                    cast(
+                        ColumnElement[bool], ChatThread.chat_thread_id == chat_thread_id
+                    )
+                )
             )
+            if result.scalar_one_or_none() is None:
+                raise Exception(f"chat thread {chat_thread_id} does not exist")
+            session.add(message)
 
-        async with session_maker() as session:
-            chat_thread.messages.append(message)
-            session.add(chat_thread)
-            await session.commit()
+            async def publish() -> None:
+                await self.add_user_message_event(chat_thread_id)
 
-        self.add_user_message_event(chat_thread.chat_thread_id)
+            # woken before the commit, the agent would not find the message yet
+            await after_commit(session, publish)
 
-        return message.message_id
+        return message
 
     async def add_assistant_message(
         self, chat_thread_id: UUID, message: Message
     ) -> None:
-        chat_thread = await self.get_chat_thread(chat_thread_id)
-        if not chat_thread:
-            raise Exception(f"chat thread {chat_thread_id} does not exist")
-        chat_thread.messages.append(message)
+        message.chat_thread_id = chat_thread_id
         async with session_maker() as session:
-            session.add(chat_thread)
+            session.add(message)
             await session.commit()
 
-    async def get_chat_thread(self, chat_thread_id: UUID) -> ChatThread | None:
-        async with session_maker() as session:
+    async def get_chat_thread(
+        self,
+        chat_thread_id: UUID,
+        session: AsyncSession | None = None,
+        readonly: bool = False,
+    ) -> ChatThread | None:
+        # chat agents are woken by messages just written elsewhere, they can not read from a replica
+        async with session_maker(session, readonly) as session:
             result = await session.execute(
                 select(ChatThread).filter(
                     cast(
@@ -133,15 +208,120 @@ class DBChatManager(ChatManager):
             )
             return result.unique().scalars().first()
 
-    async def get_message(self, message_id: UUID) -> Message | None:
+    async def get_messages(
+        self,
+        chat_thread_id: UUID,
+        limit: int,
+        after: MessageChangeCursor | None = None,
+        before: MessageCursor | None = None,
+        session: AsyncSession | None = None,
+    ) -> list[Message]:
+        """
+        With after, returns up to limit messages of the thread added or changed since the cursor, in
+        the order they were written. Otherwise the newest messages seeking on (created_at,
+        message_id), older than before if given, in order.
+        """
+        stmt = select(Message).filter(
+            cast(ColumnElement[bool], Message.chat_thread_id == chat_thread_id)
+        )
+        async with session_maker(session, readonly=True) as session:
+            if after:
+                stmt = await self._changed_since(session, stmt, after)
+            else:
+                position = tuple_(Message.created_at, Message.message_id)  # type: ignore
+                if before:
+                    stmt = stmt.filter(
+                        cast(
+                            ColumnElement[bool],
+                            position < (before.created_at, before.message_id),
+                        )
+                    )
+                stmt = stmt.order_by(
+                    Message.created_at.desc(), Message.message_id.desc()  # type: ignore
+                )
+            result = await session.execute(stmt.limit(limit))
+            messages = list(result.scalars().all())
+        return messages if after else messages[::-1]
+
+    async def _changed_since(
+        self, session: AsyncSession, stmt: Select, after: MessageChangeCursor
+    ) -> Select:
+        # Transactions do not commit in the order their ids were handed out, only what the ones
+        # that have all ended wrote is returned. What a transaction still running writes is
+        # returned once it ended, after the cursor of the messages returned now.
+        until = (await session.execute(_OLDEST_RUNNING_XID)).scalar_one()
+        change_xid = cast(ColumnElement[int], Message.change_xid)
+        if after.message_id:
+            position = tuple_(change_xid, Message.message_id)  # type: ignore
+            since = position > (after.change_xid, after.message_id)
+        else:
+            since = change_xid >= after.change_xid
+        return stmt.filter(since, change_xid < until).order_by(
+            change_xid, Message.message_id  # type: ignore
+        )
+
+    async def get_changes_cursor(
+        self, session: AsyncSession | None = None
+    ) -> MessageChangeCursor:
+        """
+        Cursor of the changes made from now on. Changes made by the transactions still running are
+        included, whether they commit before or after.
+        """
+        async with session_maker(session, readonly=True) as session:
+            oldest_running_xid = (
+                await session.execute(_OLDEST_RUNNING_XID)
+            ).scalar_one()
+        return MessageChangeCursor(change_xid=oldest_running_xid)
+
+    async def get_pending_user_messages(self, chat_thread_id: UUID) -> list[Message]:
         async with session_maker() as session:
+            result = await session.execute(
+                select(Message)
+                .filter(
+                    cast(ColumnElement[bool], Message.chat_thread_id == chat_thread_id),
+                    # inlined so the planner can match the partial ix_message_pending index
+                    cast(
+                        ColumnElement[bool],
+                        Message.source
+                        == literal(
+                            MessageSource.WEBAPP,
+                            EnumAsString(MessageSource),
+                            literal_execute=True,
+                        ),
+                    ),
+                    cast(ColumnElement[bool], ~Message.acknowledged),  # type: ignore
+                )
+                .order_by(Message.created_at)  # type: ignore
+            )
+            return list(result.scalars().all())
+
+    async def get_message(
+        self, message_id: UUID, session: AsyncSession | None = None
+    ) -> Message | None:
+        async with session_maker(session) as session:
             result = await session.get(Message, message_id)
             return result
 
-    async def get_all_chat_threads(self) -> list[ChatThread]:
-        async with session_maker() as session:
-            result = await session.execute(select(ChatThread))
-            return list(result.unique().scalars().all())
+    async def stream_chat_threads(
+        self, chunk_size: int = 100
+    ) -> AsyncIterator[list[ChatThread]]:
+        """
+        Every thread with its messages, chunk_size threads at a time read through a server side
+        cursor. A chunk is detached from the session before the next one is read, so only one chunk
+        is held in memory at a time.
+        """
+        stmt = (
+            select(ChatThread)
+            # joined messages can not be streamed, they are loaded per chunk instead
+            .options(selectinload(ChatThread.messages))
+            .order_by(ChatThread.chat_thread_id)  # type: ignore
+            .execution_options(yield_per=chunk_size)
+        )
+        async with session_maker(readonly=True) as session:
+            result = await session.stream_scalars(stmt)
+            async for chunk in result.partitions():
+                yield list(chunk)
+                session.expunge_all()
 
     async def delete_chat_thread(self, chat_thread_id: UUID) -> None:
         async with session_maker() as session:
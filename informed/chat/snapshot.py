@@ -0,0 +1,79 @@
+from collections.abc import Iterable
+from uuid import UUID
+
+from informed.db_models.chat import ChatThread, Message, MessageSource, UserMessage
+
+
+class ChatThreadSnapshot:
+    """
+    In-memory copy of a chat thread owned by a single agent.
+
+    The owner applies its own writes as it makes them and merges in messages written elsewhere,
+    so reading the thread never goes back to the database.
+    """
+
+    def __init__(self, chat_thread: ChatThread):
+        self.chat_thread_id = chat_thread.chat_thread_id
+        self.user_id = chat_thread.user_id
+        self._messages: list[Message] = []
+        self._message_index: dict[UUID, int] = {}
+        self._pending_message_ids: set[UUID] = set()
+        self.upsert_messages(chat_thread.messages)
+
+    @property
+    def messages(self) -> list[Message]:
+        return list(self._messages)
+
+    @property
+    def pending_messages(self) -> list[UserMessage]:
+        return [
+            UserMessage.model_validate(
+                self._messages[self._message_index[message_id]], from_attributes=True
+            )
+            for message_id in sorted(
+                self._pending_message_ids, key=lambda m: self._message_index[m]
+            )
+        ]
+
+    def upsert_message(self, message: Message) -> None:
+        if (index := self._message_index.get(message.message_id)) is not None:
+            self._messages[index] = message
+        elif not self._messages or self._messages[-1].created_at <= message.created_at:
+            self._message_index[message.message_id] = len(self._messages)
+            self._messages.append(message)
+        else:
+            # out of order messages are rare, re-sort and re-index
+            self._messages.append(message)
+            self._messages.sort(key=lambda m: m.created_at)
+            self._message_index = {
+                m.message_id: i for i, m in enumerate(self._messages)
+            }
+
+        if message.source == MessageSource.WEBAPP and not message.acknowledged:
+            self._pending_message_ids.add(message.message_id)
+        else:
+            self._pending_message_ids.discard(message.message_id)
+
+    def upsert_messages(self, messages: Iterable[Message]) -> None:
+        for message in messages:
+            self.upsert_message(message)
+
+    def find_message_for_query(self, query_id: UUID) -> Message | None:
+        # the message of the query being answered is almost always among the latest ones
+        for message in reversed(self._messages):
+            if message.source == MessageSource.WEBAPP and message.query_id == query_id:
+                return message
+        return None
+
+    def find_messages_for_query(self, query_id: UUID) -> list[UserMessage]:
+        return [
+            UserMessage.model_validate(message, from_attributes=True)
+            for message in self._messages
+            if message.source == MessageSource.WEBAPP and message.query_id == query_id
+        ]
+
+    def __repr__(self) -> str:
+        return (
+            f"ChatThreadSnapshot(chat_thread_id={self.chat_thread_id}, "
+            f"user_id={self.user_id}, messages={self._messages!r})"
+        )
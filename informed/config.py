@@ -66,6 +66,7 @@ class TelemetryConfig(SafeDumpableModel):
     opentelemetry_config: OpenTelemetryTracingConfig = OpenTelemetryTracingConfig(
         enabled=True
     )
+    metrics_export_interval_ms: int = Field(default=60000, exclude=False)
 
 
 class UIConfig(SafeDumpableModel):
@@ -81,10 +82,22 @@ class LoggingConfig(SafeDumpableModel):
 class ConnectionPoolConfig(SafeDumpableModel):
     max_pool_size: int = Field(default=10, exclude=False)
     max_overflow: int = Field(default=20, exclude=False)
+    # seconds to wait for a free connection before giving up
+    pool_timeout: float = Field(default=30.0, exclude=False)
+    # connections older than this are replaced on checkout, keep it below any server/proxy idle timeout
+    pool_recycle: int = Field(default=1800, exclude=False)
+    pool_pre_ping: bool = Field(default=True, exclude=False)
+    # psycopg prepares a statement after it ran this many times, None disables it (needed behind pgbouncer)
+    prepare_threshold: int | None = Field(default=5, exclude=False)
+    prepared_max: int = Field(default=100, exclude=False)
 
 
 class DatabaseConfig(SafeDumpableModel):
     db_url: str = Field(default="", exclude=True)
+    # read only sessions go to this replica when set, it gets a pool of its own with the same settings
+    replica_db_url: str | None = Field(default=None, exclude=True)
+    # after committing a write, reads from the same request or task stay on the primary this long
+    read_your_writes_seconds: float = Field(default=5.0, exclude=False)
     connection_pool_config: ConnectionPoolConfig = ConnectionPoolConfig()
 
     @model_validator(mode="after")
@@ -101,6 +114,125 @@ class RedisConfig(SafeDumpableModel):
     decode_responses: bool = Field(default=True, exclude=False)
 
 
+class NotifierBackend(str, Enum):
+    IN_MEMORY = "in_memory"
+    REDIS = "redis"
+
+
+class NotifierConfig(SafeDumpableModel):
+    # in_memory only wakes waiters inside this process, use redis when running more than one replica
+    backend: NotifierBackend = Field(default=NotifierBackend.IN_MEMORY, exclude=False)
+    channel_prefix: str = Field(default="informed:notify:", exclude=False)
+    reconnect_delay_seconds: float = Field(default=1.0, exclude=False)
+
+
+class UserCacheConfig(SafeDumpableModel):
+    enabled: bool = Field(default=True, exclude=False)
+    key_prefix: str = Field(default="informed:user:", exclude=False)
+    invalidation_channel: str = Field(
+        default="informed:user_invalidations", exclude=False
+    )
+    ttl_seconds: int = Field(default=300, exclude=False)
+    # the in-process tier also expires entries, bounding staleness if an invalidation is missed
+    local_max_size: int = Field(default=1024, exclude=False)
+    local_ttl_seconds: float = Field(default=30.0, exclude=False)
+    reconnect_delay_seconds: float = Field(default=1.0, exclude=False)
+
+
+class SessionConfig(SafeDumpableModel):
+    key_prefix: str = Field(default="informed:session:", exclude=False)
+    # sessions expire after this long without a request
+    ttl_seconds: int = Field(default=3600, exclude=False)
+    # expiry of the sessions used in the meantime is pushed back in one batch this often
+    refresh_interval_seconds: float = Field(default=30.0, exclude=False)
+
+
+class RetentionConfig(SafeDumpableModel):
+    # message, queries and notification are partitioned by month of creation
+    # partitions older than this are detached and dropped, unless archive_schema is set. Off by
+    # default, nothing is ever deleted until it is configured
+    retention_days: int | None = Field(default=None, exclude=False)
+    # detached partitions are moved to this schema instead of being dropped
+    archive_schema: str | None = Field(default=None, exclude=False)
+    # partitions are created this many months ahead so rows never land in the default partition
+    premake_months: int = Field(default=2, exclude=False)
+    maintenance_interval_seconds: int = Field(default=6 * 3600, exclude=False)
+    # detaching locks the parent table, give up rather than queue writers behind us
+    lock_timeout_seconds: float = Field(default=5.0, exclude=False)
+
+
+class ChatAgentMode(str, Enum):
+    # one long-lived agent per active thread, waiting for new messages
+    AGENT = "agent"
+    # a fixed pool of workers handling threads only while they have pending messages
+    DISPATCHER = "dispatcher"
+
+
+class ChatAgentConfig(SafeDumpableModel):
+    mode: ChatAgentMode = Field(default=ChatAgentMode.AGENT, exclude=False)
+    dispatcher_workers: int = Field(default=8, exclude=False)
+    # messages sent in a quick burst are answered together once the thread is quiet for this long.
+    # A single message is answered at once, the window only delays the answer to a second one sent
+    # while the first is pending or being answered, by up to coalesce_max_wait_seconds
+    coalesce_window_seconds: float = Field(default=0.75, exclude=False)
+    coalesce_max_wait_seconds: float = Field(default=3.0, exclude=False)
+    # a thread is answered by the one agent holding its lease, across replicas
+    lease_key_prefix: str = Field(default="informed:chat_agent:", exclude=False)
+    # the lease of a replica that died runs out after at most this long
+    lease_seconds: float = Field(default=30.0, exclude=False)
+
+
+class DailyUpdatesConfig(SafeDumpableModel):
+    # updates being answered at once, each worker takes one user from thread creation to answer
+    workers: int = Field(default=8, exclude=False)
+    # seconds between progress reports while updates are being sent
+    progress_interval_seconds: float = Field(default=30.0, exclude=False)
+    # how often we look for updates due to be generated
+    schedule_interval_seconds: int = Field(default=60, exclude=False)
+    # updates are generated at a random point of this window before the user's delivery time,
+    # ending early enough to be done in time
+    generation_window_seconds: int = Field(default=1800, exclude=False)
+    generation_lead_seconds: int = Field(default=300, exclude=False)
+    # failed deliveries are retried by the following runs until they had this many attempts
+    max_attempts: int = Field(default=3, exclude=False)
+    # a run that has not reported progress for this long was interrupted and is taken over
+    stale_run_seconds: int = Field(default=300, exclude=False)
+
+
+class LeaderElectionConfig(SafeDumpableModel):
+    # when disabled every replica runs the scheduled jobs
+    enabled: bool = Field(default=True, exclude=False)
+    key: str = Field(default="informed:scheduler:leader", exclude=False)
+    # a leader that stops renewing is replaced after at most this long
+    lease_seconds: float = Field(default=15.0, exclude=False)
+    renew_interval_seconds: float = Field(default=5.0, exclude=False)
+
+
+class SchedulerConfig(SafeDumpableModel):
+    # a run that could not start on time is still made this late, once even if several were missed
+    misfire_grace_seconds: int = Field(default=3600, exclude=False)
+    # how often the leader looks for cron runs missed across restarts or leadership changes
+    catch_up_interval_seconds: int = Field(default=60, exclude=False)
+    # Redis hash of the time every cron job last started
+    runs_key: str = Field(default="informed:scheduler:last_runs", exclude=False)
+
+
+class QueryWorkerConfig(SafeDumpableModel):
+    # when enabled the API only enqueues query jobs, `python worker.py` processes run the query agents
+    enabled: bool = Field(default=False, exclude=False)
+    stream: str = Field(default="informed:query_jobs", exclude=False)
+    consumer_group: str = Field(default="query_workers", exclude=False)
+    max_stream_length: int = Field(default=10000, exclude=False)
+    concurrency: int = Field(default=4, exclude=False)
+    block_ms: int = Field(default=5000, exclude=False)
+    # jobs of a worker that has not touched them for this long are claimed by another worker
+    claim_idle_ms: int = Field(default=60000, exclude=False)
+    # a job delivered more often than this is moved to the dead letter stream and its query failed
+    max_deliveries: int = Field(default=3, exclude=False)
+    dead_letter_stream: str = Field(default="informed:query_jobs:dead", exclude=False)
+    result_timeout_seconds: float = Field(default=300.0, exclude=False)
+
+
 class LLMProvider(str, Enum):
     OPENAI = "openai"
 
@@ -130,6 +262,15 @@ class Config(SafeDumpableModel, BaseSettings):
     service_name: str = "informed-core"
     database_config: DatabaseConfig
     redis_config: RedisConfig = RedisConfig()
+    notifier_config: NotifierConfig = NotifierConfig()
+    user_cache_config: UserCacheConfig = UserCacheConfig()
+    session_config: SessionConfig = SessionConfig()
+    retention_config: RetentionConfig = RetentionConfig()
+    chat_agent_config: ChatAgentConfig = ChatAgentConfig()
+    daily_updates_config: DailyUpdatesConfig = DailyUpdatesConfig()
+    leader_election_config: LeaderElectionConfig = LeaderElectionConfig()
+    scheduler_config: SchedulerConfig = SchedulerConfig()
+    query_worker_config: QueryWorkerConfig = QueryWorkerConfig()
     telemetry_config: TelemetryConfig = TelemetryConfig()
 
     weather_sources_config: WeatherSourcesConfig = WeatherSourcesConfig()
@@ -138,6 +279,15 @@ class Config(SafeDumpableModel, BaseSettings):
     cache_timestamps: bool = Field(default=False, exclude=False)
     logging_config: LoggingConfig = LoggingConfig()
 
+    @model_validator(mode="after")
+    def verify_query_workers_can_report_back(self) -> Self:
+        if (
+            self.query_worker_config.enabled
+            and self.notifier_config.backend != NotifierBackend.REDIS
+        ):
+            raise ValueError("query workers require the redis notifier backend")
+        return self
+
     @classmethod
     def from_env(cls) -> "Config":
         return cls.model_validate({})
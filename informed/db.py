@@ -1,21 +1,28 @@
-from collections.abc import AsyncGenerator
+import time
+import weakref
+from collections.abc import AsyncGenerator, Awaitable, Callable, Iterable
 from contextlib import asynccontextmanager
 from contextvars import ContextVar
+from typing import Any
 
 from alembic import command, config
 from loguru import logger as log
-from sqlalchemy import Connection, Engine, create_engine
+from opentelemetry.metrics import CallbackOptions, Observation
+from sqlalchemy import Connection, Engine, create_engine, event
 from sqlalchemy.engine.url import URL, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import ORMExecuteState, sessionmaker
 from sqlalchemy.orm.session import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
 
-from informed.config import DatabaseConfig
+from informed.config import ConnectionPoolConfig, DatabaseConfig
+from informed.metrics import get_meter
 
 
 def upgrade_db(conn: Connection, revision: str = "head") -> None:
@@ -30,35 +37,134 @@ def downgrade_db(conn: Connection, revision: str = "base") -> None:
     command.downgrade(conf, revision)
 
 
+_meter = get_meter(__name__)
+_checkout_wait_time = _meter.create_histogram(
+    "db.client.connection.wait_time",
+    unit="s",
+    description="Time spent getting a connection from the pool, including the pre-ping",
+)
+_checkout_timeouts = _meter.create_counter(
+    "db.client.connection.timeouts",
+    description="Checkouts that gave up waiting for a free connection",
+)
+_overflow_connections = _meter.create_counter(
+    "db.client.connection.overflows",
+    description="Connections opened beyond the pool size",
+)
+_pools: weakref.WeakSet["InstrumentedAsyncAdaptedQueuePool"] = weakref.WeakSet()
+
+
+def _observe_connections(_: CallbackOptions) -> Iterable[Observation]:
+    for pool in _pools:
+        yield Observation(pool.checkedout(), {"state": "used"})
+        yield Observation(pool.checkedin(), {"state": "idle"})
+
+
+def _observe_max_connections(_: CallbackOptions) -> Iterable[Observation]:
+    for pool in _pools:
+        yield Observation(pool.size() + pool._max_overflow)
+
+
+_meter.create_observable_gauge(
+    "db.client.connection.count",
+    callbacks=[_observe_connections],
+    description="Connections in the pool, by state",
+)
+_meter.create_observable_gauge(
+    "db.client.connection.max",
+    callbacks=[_observe_max_connections],
+    description="Most connections the pool will open, overflow included",
+)
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """The default async pool, recording checkout waits, timeouts and overflow connections."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        # pools are recreated on dispose, the gauges follow whichever are alive
+        _pools.add(self)
+
+    def connect(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            _checkout_timeouts.add(1)
+            raise
+        finally:
+            _checkout_wait_time.record(time.perf_counter() - start)
+
+    def _create_connection(self) -> ConnectionPoolEntry:
+        if self.overflow() > 0:
+            _overflow_connections.add(1)
+        return super()._create_connection()
+
+
 class DatabaseEngine:
     use_contextvars: bool = False
     _instance: AsyncEngine | None = None
     _instance_var: ContextVar[AsyncEngine | None] = ContextVar("db_engine")
+    # built once per engine, creating a sessionmaker is not free
+    _session_factory: async_sessionmaker[AsyncSession] | None = None
+    _session_factory_var: ContextVar[async_sessionmaker[AsyncSession] | None] = (
+        ContextVar("db_session_factory")
+    )
+    # optional read replica, read only sessions use it when there is one
+    _replica: AsyncEngine | None = None
+    _replica_var: ContextVar[AsyncEngine | None] = ContextVar("db_replica_engine")
+    _replica_session_factory: async_sessionmaker[AsyncSession] | None = None
+    _replica_session_factory_var: ContextVar[
+        async_sessionmaker[AsyncSession] | None
+    ] = ContextVar("db_replica_session_factory")
+    read_your_writes_seconds: float = 5.0
 
     @classmethod
     def _get_instance(cls) -> AsyncEngine | None:
         return cls._instance_var.get(None) if cls.use_contextvars else cls._instance
 
+    @classmethod
+    def _get_replica(cls) -> AsyncEngine | None:
+        return cls._replica_var.get(None) if cls.use_contextvars else cls._replica
+
     @classmethod
     def _set_instance(cls, engine: AsyncEngine | None) -> None:
+        session_factory = _create_session_factory(engine)
         if cls.use_contextvars:
             cls._instance_var.set(engine)
+            cls._session_factory_var.set(session_factory)
         else:
             cls._instance = engine
+            cls._session_factory = session_factory
+
+    @classmethod
+    def _set_replica(cls, engine: AsyncEngine | None) -> None:
+        session_factory = _create_session_factory(engine)
+        if cls.use_contextvars:
+            cls._replica_var.set(engine)
+            cls._replica_session_factory_var.set(session_factory)
+        else:
+            cls._replica = engine
+            cls._replica_session_factory = session_factory
 
     @classmethod
     def init(
         cls,
         url: URL | str,
-        max_pool_size: int = 5,
-        max_overflow: int = 10,
+        connection_pool_config: ConnectionPoolConfig | None = None,
         use_contextvars: bool = False,
+        replica_url: URL | str | None = None,
+        read_your_writes_seconds: float = 5.0,
     ) -> AsyncEngine:
         cls.use_contextvars = use_contextvars
+        cls.read_your_writes_seconds = read_your_writes_seconds
+        pool_config = connection_pool_config or ConnectionPoolConfig()
         engine = cls._get_instance()
         if engine is None:
-            engine = create_async_engine(url, echo=False)
+            engine = _create_engine(url, pool_config)
             cls._set_instance(engine)
+        if replica_url is not None and cls._get_replica() is None:
+            cls._set_replica(_create_engine(replica_url, pool_config))
         return engine
 
     @classmethod
@@ -68,6 +174,28 @@ class DatabaseEngine:
             raise ValueError("DatabaseEngine not initialized")
         return engine
 
+    @classmethod
+    def get_session_factory(
+        cls, readonly: bool = False
+    ) -> async_sessionmaker[AsyncSession]:
+        """Without a replica read only sessions are opened on the primary like any other."""
+        if readonly:
+            replica_session_factory = (
+                cls._replica_session_factory_var.get(None)
+                if cls.use_contextvars
+                else cls._replica_session_factory
+            )
+            if replica_session_factory is not None:
+                return replica_session_factory
+        session_factory = (
+            cls._session_factory_var.get(None)
+            if cls.use_contextvars
+            else cls._session_factory
+        )
+        if session_factory is None:
+            raise ValueError("DatabaseEngine not initialized")
+        return session_factory
+
     @classmethod
     def get_sync_engine(cls) -> Engine:
         engine = cls._get_instance()
@@ -78,18 +206,160 @@ class DatabaseEngine:
 
     @classmethod
     async def delete(cls) -> None:
+        replica = cls._get_replica()
+        if replica is not None:
+            await replica.dispose()
+            cls._set_replica(None)
         engine = cls._get_instance()
         if engine is not None:
             await engine.dispose()
             cls._set_instance(None)
 
 
+def _create_engine(url: URL | str, pool_config: ConnectionPoolConfig) -> AsyncEngine:
+    engine = create_async_engine(
+        url,
+        echo=False,
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_size=pool_config.max_pool_size,
+        max_overflow=pool_config.max_overflow,
+        pool_timeout=pool_config.pool_timeout,
+        pool_recycle=pool_config.pool_recycle,
+        pool_pre_ping=pool_config.pool_pre_ping,
+    )
+    _configure_prepared_statements(engine, pool_config)
+    return engine
+
+
+def _create_session_factory(
+    engine: AsyncEngine | None,
+) -> async_sessionmaker[AsyncSession] | None:
+    if engine is None:
+        return None
+    return async_sessionmaker(expire_on_commit=False, bind=engine, class_=AsyncSession)
+
+
+def _configure_prepared_statements(
+    engine: AsyncEngine, pool_config: ConnectionPoolConfig
+) -> None:
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_prepare_options(dbapi_connection: Any, _: ConnectionPoolEntry) -> None:
+        driver_connection = dbapi_connection.driver_connection
+        driver_connection.prepare_threshold = pool_config.prepare_threshold
+        driver_connection.prepared_max = pool_config.prepared_max
+
+
+# reads of a request or task stay on the primary until then, so they see what it committed last
+_primary_pinned_until: ContextVar[float] = ContextVar(
+    "db_primary_pinned_until", default=0.0
+)
+_WROTE = "informed_wrote"
+_AFTER_COMMIT = "informed_after_commit"
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flush(session: Session, _: Any) -> None:
+    session.info[_WROTE] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_dml(orm_execute_state: ORMExecuteState) -> None:
+    if (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        orm_execute_state.session.info[_WROTE] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _pin_primary_after_write(session: Session) -> None:
+    # async sessions run this in a greenlet sharing the caller's context, so the caller sees it
+    if session.info.pop(_WROTE, False):
+        _primary_pinned_until.set(
+            time.monotonic() + DatabaseEngine.read_your_writes_seconds
+        )
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_write(session: Session) -> None:
+    session.info.pop(_WROTE, None)
+    session.info.pop(_AFTER_COMMIT, None)
+
+
+async def after_commit(
+    session: AsyncSession | None, callback: Callable[[], Awaitable[None]]
+) -> None:
+    """
+    Runs callback once session is committed by transaction or get_db_session, it is dropped if the
+    session rolls back. Without a session it runs right away, what was written is committed.
+    """
+    if session is None:
+        await callback()
+        return
+    session.info.setdefault(_AFTER_COMMIT, []).append(callback)
+
+
+async def _commit(session: AsyncSession) -> None:
+    await session.commit()
+    for callback in session.info.pop(_AFTER_COMMIT, []):
+        await callback()
+
+
 @asynccontextmanager
-async def session_maker() -> AsyncGenerator[AsyncSession, None]:
-    engine = DatabaseEngine.get()
-    async with async_sessionmaker(
-        expire_on_commit=False, bind=engine, class_=AsyncSession
-    )() as session:
+async def session_maker(
+    session: AsyncSession | None = None,
+    readonly: bool = False,
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Opens a new session, or hands back the given one so that callers can share their session.
+    A shared session stays open, closing it is up to whoever opened it.
+
+    Read only sessions are opened on the replica if there is one, unless the current request or
+    task committed a write within the last read_your_writes_seconds.
+    """
+    if session is not None:
+        yield session
+        return
+    readonly = readonly and time.monotonic() >= _primary_pinned_until.get()
+    async with DatabaseEngine.get_session_factory(readonly)() as new_session:
+        yield new_session
+
+
+@asynccontextmanager
+async def transaction(
+    session: AsyncSession | None = None,
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session to write in. A shared session is only flushed, it is committed by whoever opened it
+    along with the rest of their work. Otherwise a new session is opened and committed.
+    """
+    if session is not None:
+        yield session
+        await session.flush()
+        return
+    async with session_maker() as new_session:
+        yield new_session
+        await _commit(new_session)
+
+
+async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for the whole of a request, so it uses a single connection checkout. Whatever is left
+    uncommitted when the request ends is committed, or rolled back if the request failed.
+    """
+    async with session_maker() as session:
+        try:
+            yield session
+            await _commit(session)
+        except Exception:
+            await session.rollback()
+            raise
+
+
+async def get_db_readonly_session() -> AsyncGenerator[AsyncSession, None]:
+    """Session for requests that only read, on the replica if there is one."""
+    async with session_maker(readonly=True) as session:
         yield session
 
 
@@ -102,18 +372,31 @@ def sync_session_maker() -> Session:
 def init_db(database_config: DatabaseConfig) -> None:
     log.info("Initializing db...")
     url = make_url(database_config.db_url)
+    pool_config = database_config.connection_pool_config
+    replica_url = (
+        make_url(database_config.replica_db_url)
+        if database_config.replica_db_url
+        else None
+    )
     DatabaseEngine.init(
         url,
-        database_config.connection_pool_config.max_pool_size,
-        database_config.connection_pool_config.max_overflow,
+        pool_config,
+        replica_url=replica_url,
+        read_your_writes_seconds=database_config.read_your_writes_seconds,
     )
     log.info(
-        "Setting up db, drivername: {}, username: {}, host: {}, port: {}, database: {}, max_pool_size: {}, max_overflow: {}",
+        "Setting up db, drivername: {}, username: {}, host: {}, port: {}, database: {}, pool: {}",
         url.drivername,
         url.username,
         url.host,
         url.port,
         url.database,
-        database_config.connection_pool_config.max_pool_size,
-        database_config.connection_pool_config.max_overflow,
+        pool_config.safe_model_dump(),
     )
+    if replica_url is not None:
+        log.info(
+            "Routing read only sessions to replica, host: {}, port: {}, database: {}",
+            replica_url.host,
+            replica_url.port,
+            replica_url.database,
+        )
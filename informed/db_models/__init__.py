@@ -8,6 +8,12 @@ from .chat import (
     MessageSource,
     UserMessage,
 )
+from .daily_update import (
+    DailyUpdateDelivery,
+    DailyUpdateDeliveryStatus,
+    DailyUpdateRun,
+    DailyUpdateRunStatus,
+)
 from .notification import Notification, NotificationStatus
 from .query import Query, QuerySource, QueryState
 from .shared_types import EnumAsString, JSONBFromPydantic
@@ -58,4 +64,9 @@ __all__ = [
     # Notification related models
     "Notification",
     "NotificationStatus",
+    # Daily update runs
+    "DailyUpdateRun",
+    "DailyUpdateRunStatus",
+    "DailyUpdateDelivery",
+    "DailyUpdateDeliveryStatus",
 ]
@@ -1,8 +1,9 @@
 import time
 from enum import Enum
+from typing import Any, ClassVar
 from uuid import UUID, uuid4
 
-from sqlalchemy import Column
+from sqlalchemy import BigInteger, Column, Index, text
 from sqlalchemy.orm import Mapped, relationship
 from sqlalchemy.types import Uuid as SQLAlchemyUuid
 from sqlmodel import Column, Field, ForeignKey, Relationship, SQLModel
@@ -60,6 +61,38 @@ class AssistantMessage(BaseMessage):
 
 
 class Message(BaseMessage, table=True):
+    # thread history is paged by seeking on (created_at, message_id) within a thread
+    __table_args__ = (
+        Index(
+            "ix_message_chat_thread_id_created_at_message_id",
+            "chat_thread_id",
+            "created_at",
+            "message_id",
+        ),
+        # clients poll a thread for what changed since by seeking on (change_xid, message_id)
+        Index(
+            "ix_message_chat_thread_id_change_xid_message_id",
+            "chat_thread_id",
+            "change_xid",
+            "message_id",
+        ),
+        # user messages the chat agent still has to answer, a small fraction of all messages
+        Index(
+            "ix_message_pending",
+            "chat_thread_id",
+            "created_at",
+            postgresql_where=text("source = 'webapp' AND NOT acknowledged"),
+        ),
+        # monthly partitions, see informed.services.partitions
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    # the partition key has to be part of the primary key, rows are still identified by id alone
+    __mapper_args__: ClassVar[dict[str, Any]] = {"primary_key": ["message_id"]}
+
+    created_at: float = Field(default_factory=time.time, primary_key=True)
+    # id of the transaction that last wrote the row, set by a trigger on every insert and update
+    change_xid: int | None = Field(default=None, sa_column=Column(BigInteger))
+
     user_id: UUID | None = Field(default=None)
     query_id: UUID | None = Field(default=None)
     acknowledged: bool = Field(default=False)
@@ -77,8 +110,8 @@ class ChatThread(SQLModel, table=True):
     messages: Mapped[list[Message]] = Relationship(
         sa_relationship=relationship(
             back_populates="chat_thread",
+            # an outer join, a thread whose messages all expired with their partitions still loads
             lazy="joined",
-            innerjoin=True,
             passive_deletes="all",
             order_by="Message.created_at",
         )
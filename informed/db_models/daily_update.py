@@ -0,0 +1,77 @@
+import time
+from datetime import date
+from enum import Enum
+from uuid import UUID, uuid4
+
+from sqlalchemy import Column, Index, text
+from sqlalchemy.types import Uuid as SQLAlchemyUuid
+from sqlmodel import Field, ForeignKey, SQLModel
+
+from informed.db_models.shared_types import EnumAsString
+
+
+class DailyUpdateRunStatus(Enum):
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    # stopped sending without finishing, its deliveries were taken over by a later run
+    INTERRUPTED = "INTERRUPTED"
+
+
+class DailyUpdateRun(SQLModel, table=True):
+    __tablename__ = "daily_update_run"  #  type: ignore
+
+    run_id: UUID = Field(default_factory=uuid4, primary_key=True)
+    # of the scheduler lease the run was started under, runs of an older lease are refused
+    fencing_token: int | None = Field(default=None, index=True)
+    status: DailyUpdateRunStatus = Field(
+        sa_column=Column(EnumAsString(DailyUpdateRunStatus), nullable=False),
+        default=DailyUpdateRunStatus.RUNNING,
+    )
+    started_at: float = Field(default_factory=time.time)
+    # bumped while the run is sending, a running run that stops bumping it was interrupted
+    heartbeat_at: float = Field(default_factory=time.time)
+    finished_at: float | None = Field(default=None)
+    total: int = Field(default=0)
+    sent: int = Field(default=0)
+    failed: int = Field(default=0)
+
+
+class DailyUpdateDeliveryStatus(Enum):
+    PENDING = "PENDING"
+    SENT = "SENT"
+    FAILED = "FAILED"
+
+
+class DailyUpdateDelivery(SQLModel, table=True):
+    __tablename__ = "daily_update_delivery"  #  type: ignore
+    __table_args__ = (
+        # the deliveries a run can still take over, sent ones are done for good
+        Index(
+            "ix_daily_update_delivery_unsent",
+            "run_id",
+            postgresql_where=text("status != 'SENT'"),
+        ),
+    )
+
+    # the idempotency key, a user gets one update per local delivery date
+    user_id: UUID = Field(foreign_key="users.user_id", primary_key=True)
+    delivery_date: date = Field(primary_key=True)
+    # the run currently responsible for the delivery
+    run_id: UUID = Field(foreign_key="daily_update_run.run_id")
+    status: DailyUpdateDeliveryStatus = Field(
+        sa_column=Column(EnumAsString(DailyUpdateDeliveryStatus), nullable=False),
+        default=DailyUpdateDeliveryStatus.PENDING,
+    )
+    # checkpoint, set once the thread and its notification exist so a retry does not create them again
+    chat_thread_id: UUID | None = Field(
+        sa_column=Column(
+            SQLAlchemyUuid(as_uuid=True),
+            ForeignKey("chat_thread.chat_thread_id", ondelete="SET NULL"),
+            nullable=True,
+        ),
+        default=None,
+    )
+    attempts: int = Field(default=0)
+    error: str | None = Field(default=None)
+    created_at: float = Field(default_factory=time.time)
+    updated_at: float = Field(default_factory=time.time)
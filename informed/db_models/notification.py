@@ -1,8 +1,9 @@
 import time
 from enum import Enum
+from typing import Any, ClassVar
 from uuid import UUID, uuid4
 
-from sqlalchemy import Column
+from sqlalchemy import Column, Index, text
 from sqlalchemy.types import Uuid as SQLAlchemyUuid
 from sqlmodel import Column, Field, ForeignKey, SQLModel
 
@@ -19,10 +20,24 @@ class NotificationStatus(Enum):
 
 class Notification(SQLModel, table=True):
     __tablename__ = "notification"  #  type: ignore
+    # the inbox, the notifications shown to a user paged newest first by (created_at, notification_id)
+    __table_args__ = (
+        Index(
+            "ix_notification_inbox",
+            "user_id",
+            "created_at",
+            "notification_id",
+            postgresql_where=text("status NOT IN ('FAILED', 'PROCESSING')"),
+        ),
+        # monthly partitions, see informed.services.partitions
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    # the partition key has to be part of the primary key, rows are still identified by id alone
+    __mapper_args__: ClassVar[dict[str, Any]] = {"primary_key": ["notification_id"]}
 
     notification_id: UUID = Field(default_factory=uuid4, primary_key=True)
     user_id: UUID = Field(foreign_key="users.user_id")
-    created_at: float = Field(default_factory=time.time)
+    created_at: float = Field(default_factory=time.time, primary_key=True)
     updated_at: float = Field(default_factory=time.time)
     status: NotificationStatus = Field(
         sa_column=Column(EnumAsString(NotificationStatus)),
@@ -1,9 +1,10 @@
-from datetime import datetime
+from datetime import UTC, datetime
 from enum import Enum
+from typing import Any, ClassVar
 from uuid import UUID, uuid4
 
 from pydantic import BaseModel
-from sqlalchemy import Column
+from sqlalchemy import Column, DateTime, Index
 from sqlmodel import Field, SQLModel
 
 from informed.db_models.shared_types import EnumAsString, JSONBFromPydantic
@@ -30,12 +31,27 @@ class QuerySource(BaseModel):
 
 class Query(SQLModel, table=True):
     __tablename__ = "queries"  #  type: ignore
+    __table_args__ = (
+        # the latest queries of a user
+        Index("ix_queries_user_id_created_at", "user_id", "created_at"),
+        # monthly partitions, see informed.services.partitions
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    # the partition key has to be part of the primary key, rows are still identified by id alone
+    __mapper_args__: ClassVar[dict[str, Any]] = {"primary_key": ["query_id"]}
 
     query: str = Field(nullable=False)
     query_id: UUID = Field(default_factory=uuid4, primary_key=True)
     user_id: UUID = Field(foreign_key="users.user_id")
-    created_at: datetime = Field(default_factory=datetime.now)
-    updated_at: datetime = Field(default_factory=datetime.now)
+    # in UTC, as the bounds of the partitions are
+    created_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), primary_key=True, nullable=False),
+        default_factory=lambda: datetime.now(UTC),
+    )
+    updated_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), nullable=False),
+        default_factory=lambda: datetime.now(UTC),
+    )
     sources: list[QuerySource] = Field(
         sa_column=Column(JSONBFromPydantic(QuerySource)), default_factory=list
     )
@@ -44,3 +60,5 @@ class Query(SQLModel, table=True):
         sa_column=Column(EnumAsString(QueryState), nullable=False),
     )
     answer: str | None = Field(default=None)
+    # bumped on every state transition, writers compare-and-swap on it instead of locking the row
+    version: int = Field(default=0, nullable=False)
@@ -12,13 +12,13 @@ PydanticData = BaseModel | list[BaseModel]
 class EnumAsString(TypeDecorator):
     impl = VARCHAR
 
-    # added this to avoid warnings from SQLAlchemy
-    # set to False since we are using this type in state machines
-    cache_ok = False
+    # the cache key is built from the constructor arguments kept under the same public name,
+    # here the enum class, so statements using this type get their compiled SQL cached
+    cache_ok = True
 
     def __init__(self, enumtype: type[Enum], *args: Any, **kwargs: Any):
         super().__init__(*args, **kwargs)
-        self._enumtype = enumtype
+        self.enumtype = enumtype
 
     def process_bind_param(self, value: Enum | str | None, dialect: Dialect) -> Any:
         if value is None:
@@ -26,20 +26,19 @@ class EnumAsString(TypeDecorator):
         if isinstance(value, Enum):
             return value.value
         elif isinstance(value, str):
-            return self._enumtype(value).value
+            return self.enumtype(value).value
 
     def process_result_value(self, value: str | None, dialect: Dialect) -> Enum | None:
         if value is None:
             return None
-        return self._enumtype(value)
+        return self.enumtype(value)
 
 
 class JSONBFromPydantic(TypeDecorator):
     impl = JSONB
 
-    # added this to avoid warnings from SQLAlchemy
-    # set to False since this might invlove state machines
-    cache_ok = False
+    # keyed on the pydantic model class, see EnumAsString
+    cache_ok = True
 
     def __init__(self, pydantic_type: type[BaseModel], *args: Any, **kwargs: Any):
         super().__init__(*args, **kwargs)
@@ -1,15 +1,18 @@
-from datetime import datetime
+from datetime import datetime, time
 from enum import Enum
 from typing import Any, Optional
 from uuid import UUID, uuid4
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from sqlalchemy import (
     Boolean,
     Column,
     ForeignKey,
+    Index,
     String,
     Text,
+    text,
 )
 from sqlalchemy import (
     Enum as SQLAlchemyEnum,
@@ -27,6 +30,8 @@ class AccountType(str, Enum):
     SUPERADMIN = "superadmin"
 
 
+# relationships of the user models are never loaded implicitly,
+# queries pick what to load with the profiles in informed.users.loaders
 class User(SQLModel, table=True):
     __tablename__ = "users"  #  type: ignore
 
@@ -36,12 +41,14 @@ class User(SQLModel, table=True):
     account_type: AccountType = Field(
         default=AccountType.USER, sa_column=Column(SQLAlchemyEnum(AccountType))
     )
+    # bumped on every profile change, sessions remember the version they last saw
+    profile_version: int = Field(default=0, nullable=False)
 
     details: Optional["UserDetails"] = Relationship(
         sa_relationship=relationship(
             "UserDetails",
             back_populates="user",
-            lazy="joined",  # Set lazy loading here
+            lazy="raise",  # Set lazy loading here
             passive_deletes="all",
         )
     )
@@ -49,15 +56,14 @@ class User(SQLModel, table=True):
         sa_relationship=relationship(
             "UserMedicalDetails",
             back_populates="user",
-            lazy="joined",  # Set lazy loading here
+            lazy="raise",  # Set lazy loading here
             passive_deletes="all",
         )
     )
     settings: Mapped["Settings"] = Relationship(
         sa_relationship=relationship(
             back_populates="user",
-            lazy="joined",
-            innerjoin=True,
+            lazy="raise",
             passive_deletes="all",
         )
     )
@@ -103,7 +109,7 @@ class UserDetails(SQLModel, table=True):
         sa_relationship=relationship(
             "User",
             back_populates="details",
-            lazy="joined",  # Set lazy loading here
+            lazy="raise",  # Set lazy loading here
         )
     )
 
@@ -126,14 +132,14 @@ class UserMedicalDetails(SQLModel, table=True):
         sa_relationship=relationship(
             "User",
             back_populates="medical_details",
-            lazy="joined",  # Set lazy loading here
+            lazy="raise",  # Set lazy loading here
         )
     )
     health_conditions: list["UserHealthConditions"] = Relationship(
         sa_relationship=relationship(
             "UserHealthConditions",
             back_populates="user_medical_details",
-            lazy="joined",  # Set lazy loading here
+            lazy="raise",  # Set lazy loading here
             passive_deletes="all",
         )
     )
@@ -141,7 +147,7 @@ class UserMedicalDetails(SQLModel, table=True):
         sa_relationship=relationship(
             "UserMedications",
             back_populates="user_medical_details",
-            lazy="joined",  # Set lazy loading here
+            lazy="raise",  # Set lazy loading here
             passive_deletes="all",
         )
     )
@@ -149,7 +155,7 @@ class UserMedicalDetails(SQLModel, table=True):
         sa_relationship=relationship(
             "UserAllergies",
             back_populates="user_medical_details",
-            lazy="joined",  # Set lazy loading here
+            lazy="raise",  # Set lazy loading here
             passive_deletes="all",
         )
     )
@@ -157,7 +163,7 @@ class UserMedicalDetails(SQLModel, table=True):
         sa_relationship=relationship(
             "WeatherSensitivities",
             back_populates="user_medical_details",
-            lazy="joined",  # Set lazy loading here
+            lazy="raise",  # Set lazy loading here
             passive_deletes="all",
         )
     )
@@ -188,7 +194,7 @@ class UserHealthConditions(SQLModel, table=True):
         sa_relationship=relationship(
             "UserMedicalDetails",
             back_populates="health_conditions",
-            lazy="joined",  # Set lazy loading here
+            lazy="raise",  # Set lazy loading here
         )
     )
 
@@ -209,7 +215,7 @@ class UserMedications(SQLModel, table=True):
         sa_relationship=relationship(
             "UserMedicalDetails",
             back_populates="medications",
-            lazy="joined",  # Set lazy loading here
+            lazy="raise",  # Set lazy loading here
         )
     )
 
@@ -229,7 +235,7 @@ class UserAllergies(SQLModel, table=True):
         sa_relationship=relationship(
             "UserMedicalDetails",
             back_populates="allergies",
-            lazy="joined",  # Set lazy loading here
+            lazy="raise",  # Set lazy loading here
         )
     )
 
@@ -251,7 +257,7 @@ class WeatherSensitivities(SQLModel, table=True):
         sa_relationship=relationship(
             "UserMedicalDetails",
             back_populates="weather_sensitivities",
-            lazy="joined",  # Set lazy loading here
+            lazy="raise",  # Set lazy loading here
         )
     )
 
@@ -267,10 +273,32 @@ TODO: Introduce a property/method to extract/store only current valid configurat
 class UserConfigurations(BaseModel):
     daily_updates: bool = False
     daily_update_prompt: str = ""
+    # local time the daily update should be in by, generation starts a little ahead of it
+    daily_update_time: time = time(18, 0)
+    daily_update_timezone: str = "America/Los_Angeles"
+
+    @field_validator("daily_update_timezone")
+    @classmethod
+    def validate_timezone(cls, value: str) -> str:
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown timezone: {value}") from None
+        return value
 
 
 class Settings(SQLModel, table=True):
     __tablename__ = "settings"  #  type: ignore
+    # the few users that opted in to daily updates
+    __table_args__ = (
+        Index(
+            "ix_settings_daily_updates",
+            "user_id",
+            postgresql_where=text(
+                "CAST(configurations ->> 'daily_updates' AS BOOLEAN)"
+            ),
+        ),
+    )
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     user_id: UUID = Field(foreign_key="users.user_id")
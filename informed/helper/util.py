@@ -328,16 +328,22 @@ async def build_weather_query_context(
 ) -> str:
     if not user.details or not user.details.zip_code:
         raise ValueError("User details or zip code not found")
+    return await build_zip_weather_context(
+        user.details.zip_code, weather_sources_config, weather_alert_service
+    )
+
 
+async def build_zip_weather_context(
+    zip_code: str,
+    weather_sources_config: WeatherSourcesConfig,
+    weather_alert_service: WeatherAlertService,
+) -> str:
+    """The weather context only depends on the zip code, users in the same zip can share it."""
     # Get weather data
-    weather_data = await get_weather_data(
-        weather_sources_config, zip_code=user.details.zip_code
-    )
+    weather_data = await get_weather_data(weather_sources_config, zip_code=zip_code)
 
     # Get active weather alerts from Redis
-    weather_alerts = await weather_alert_service.get_active_weather_alerts(
-        user.details.zip_code
-    )
+    weather_alerts = await weather_alert_service.get_active_weather_alerts(zip_code)
 
     # Extract coordinates from weather data
     latitude = float(weather_data["location"]["lat"])
@@ -348,7 +354,7 @@ async def build_weather_query_context(
         weather_sources_config,
         latitude=latitude,
         longitude=longitude,
-        zip_code=user.details.zip_code,
+        zip_code=zip_code,
     )
 
     context = ""
@@ -1,55 +1,92 @@
-import json
 import traceback
-from typing import Annotated
+from typing import Annotated, cast
 
 from fastapi import Cookie, Depends, HTTPException, Request, status
+from sqlalchemy import ColumnElement
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from informed.db import session_maker
+from informed.db import get_db_readonly_session, get_db_session
 from informed.db_models.users import User
+from informed.users.cache import UserCache
+from informed.users.loaders import UserLoadProfile, user_load_options
+from informed.users.sessions import SessionStore
 
+SessionDep = Annotated[AsyncSession, Depends(get_db_session)]
+ReadOnlySessionDep = Annotated[AsyncSession, Depends(get_db_readonly_session)]
 
-async def get_current_user(request: Request, session_token: str = Cookie(None)) -> User:
-    redis_client = request.app.state.redis_client
 
-    serialized_session = await redis_client.get(session_token)
-    if not serialized_session:
+def get_user_cache(request: Request) -> UserCache | None:
+    return cast(UserCache | None, request.app.state.user_cache)
+
+
+def get_session_store(request: Request) -> SessionStore:
+    return cast(SessionStore, request.app.state.session_store)
+
+
+async def _get_current_user(
+    request: Request,
+    session: AsyncSession,
+    session_token: str | None,
+    profile: UserLoadProfile,
+) -> User:
+    user_session = (
+        await get_session_store(request).get(session_token) if session_token else None
+    )
+    if not user_session:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid session or expired session",
         )
 
-    try:
-        # Convert the Redis response to a string before parsing
-        session_object = json.loads(str(serialized_session))
-    except (json.JSONDecodeError, TypeError):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid session data format",
-        )
-
-    if not session_object or not session_object.get("email"):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session data"
-        )
+    # cached users are detached from the session, handlers writing to the user ask for the full profile
+    user_cache = get_user_cache(request) if profile == UserLoadProfile.AUTH else None
+    if user_cache:
+        cached_user = await user_cache.get_by_id(user_session.user_id)
+        # the session saw a newer profile than the cached one when an invalidation got lost
+        if cached_user and cached_user.profile_version >= user_session.profile_version:
+            return cached_user
+        # the cache serves every profile, so fill it with everything
+        profile = UserLoadProfile.FULL
 
     try:
-        async with session_maker() as session:
-            result = await session.execute(
-                select(User).filter(User.email == session_object["email"])
-            )
-            user = result.unique().scalar_one_or_none()
+        # the user stays attached to the request session, handlers can modify it in place
+        result = await session.execute(
+            select(User)
+            .filter(cast(ColumnElement[bool], User.user_id == user_session.user_id))
+            .options(*user_load_options(profile))
+        )
+        user = result.unique().scalar_one_or_none()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
             )
+        if user_cache:
+            await user_cache.set(user)
 
         return user
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {e!s}")
 
 
+async def get_current_user(
+    request: Request, session: SessionDep, session_token: str = Cookie(None)
+) -> User:
+    return await _get_current_user(
+        request, session, session_token, UserLoadProfile.AUTH
+    )
+
+
+async def get_current_user_profile(
+    request: Request, session: SessionDep, session_token: str = Cookie(None)
+) -> User:
+    return await _get_current_user(
+        request, session, session_token, UserLoadProfile.FULL
+    )
+
+
 UserDep = Annotated[User, Depends(get_current_user)]
+UserProfileDep = Annotated[User, Depends(get_current_user_profile)]
 
 
 def get_concise_exception_traceback(exc: Exception, num_lines: int = 2) -> str:
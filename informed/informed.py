@@ -1,44 +1,103 @@
 import asyncio
-from collections.abc import Awaitable, Callable
+import itertools
+from collections.abc import AsyncIterator, Awaitable, Callable
 from contextvars import ContextVar
-from typing import cast
+from datetime import UTC, datetime, timedelta
+from functools import partial
 from uuid import UUID
 
-from fastapi import HTTPException, status
 from loguru import logger as log
 from redis.asyncio import Redis
-from sqlalchemy.sql import ColumnElement, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from informed.agents.chat_agent.chat_agent import ChatAgent
-from informed.api.schema import AddUserMessageRequest, ChatRequest
+from informed.agents.chat_agent.chat_dispatcher import ChatDispatcher
+from informed.agents.chat_agent.thread_leases import ChatThreadLeases
+from informed.agents.query_agent.cohorts import CohortAnswers
+from informed.agents.query_agent.query_queue import QueryJobQueue
+from informed.api.schema import (
+    AddUserMessageRequest,
+    ChatRequest,
+    ChatResponse,
+    MessageChangeCursor,
+    MessageCursor,
+    NotificationCursor,
+    NotificationListResponse,
+)
 from informed.chat.manager import DBChatManager
-from informed.config import Config
-from informed.db import session_maker
-from informed.db_models.chat import AssistantMessage, ChatThread, Message
+from informed.config import ChatAgentMode, Config
+from informed.db import after_commit, session_maker
+from informed.db_models.chat import (
+    AssistantMessage,
+    ChatThread,
+    Message,
+    MessageSource,
+)
 from informed.db_models.notification import Notification, NotificationStatus
 from informed.db_models.query import QueryState
 from informed.db_models.users import User
+from informed.helper.util import build_zip_weather_context
+from informed.leader import LeaderElection
 from informed.llm.client import LLMClient
+from informed.notifier import init_notifier
 from informed.query.manager import QueryManager
-from informed.services.notifications.manager import NotificationsManager
+from informed.services.notifications.daily_updates import (
+    DailyUpdateFanOut,
+    DailyUpdateSchedule,
+)
+from informed.services.notifications.manager import (
+    DailyUpdateRecipient,
+    NotificationsManager,
+)
+from informed.services.notifications.runs import DailyUpdateRunManager
 from informed.services.weather_alert_service import WeatherAlertService
+from informed.users.cache import UserCache
+from informed.users.loaders import UserLoadProfile
 from informed.users.manager import UserManager
+from informed.users.sessions import SessionStore
 
 
 class InformedManager:
     def __init__(self, config: Config, llm_client: LLMClient, redis_client: Redis):
         self.config = config
-        self.user_manager = UserManager(config)
+        self.user_cache: UserCache | None = None
+        if config.user_cache_config.enabled:
+            self.user_cache = UserCache(redis_client, config.user_cache_config)
+        self.user_manager = UserManager(config, self.user_cache)
+        self.session_store = SessionStore(redis_client, config.session_config)
         self.llm_client = llm_client
         self.weather_alert_service = WeatherAlertService(config, redis_client)
-        self.query_manager = QueryManager()
-        self.chat_manager = DBChatManager()
+        self.notifier = init_notifier(config.notifier_config, redis_client)
+        self.query_manager = QueryManager(self.notifier)
+        self.chat_manager = DBChatManager(self.notifier)
         self.notifications_manager = NotificationsManager()
+        self.leader_election: LeaderElection | None = None
+        if config.leader_election_config.enabled:
+            self.leader_election = LeaderElection(
+                redis_client, config.leader_election_config
+            )
+        self.query_job_queue: QueryJobQueue | None = None
+        if config.query_worker_config.enabled:
+            self.query_job_queue = QueryJobQueue(
+                redis_client, config.query_worker_config
+            )
         self._lock_var: ContextVar[asyncio.Lock] = ContextVar("lock_var")
         self._query_tasks: dict[UUID, asyncio.Task] = {}
         self._user_tasks: dict[UUID, asyncio.Task] = {}
 
         self._chat_agents: dict[UUID, ChatAgent] = {}
+        self.chat_thread_leases = ChatThreadLeases(
+            redis_client, config.chat_agent_config
+        )
+        self._daily_update_schedule = DailyUpdateSchedule(config.daily_updates_config)
+        self._daily_updates_sent_until: datetime | None = None
+        self.daily_update_runs = DailyUpdateRunManager(config.daily_updates_config)
+        self._chat_dispatcher: ChatDispatcher | None = None
+        if config.chat_agent_config.mode == ChatAgentMode.DISPATCHER:
+            self._chat_dispatcher = ChatDispatcher(
+                num_workers=config.chat_agent_config.dispatcher_workers,
+                chat_agent_factory=self._create_chat_agent,
+            )
 
     def _get_lock(self) -> asyncio.Lock:
         lock = self._lock_var.get(None)
@@ -47,17 +106,38 @@ class InformedManager:
             self._lock_var.set(lock)
         return lock
 
-    async def get_user(self, user_id: UUID) -> User:
-        async with session_maker() as session:
-            result = await session.execute(
-                select(User).filter(cast(ColumnElement[bool], User.user_id == user_id))
-            )
-            user = result.unique().scalar_one_or_none()
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-            )
-        return user
+    async def get_user(
+        self,
+        user_id: UUID,
+        profile: UserLoadProfile = UserLoadProfile.AUTH,
+        session: AsyncSession | None = None,
+    ) -> User:
+        return await self.user_manager.get_user(user_id, profile, session)
+
+    async def start(self) -> None:
+        await self.notifier.start()
+        if self.user_cache:
+            await self.user_cache.start()
+        await self.session_store.start()
+        await self.chat_thread_leases.start()
+        if self.leader_election:
+            await self.leader_election.start()
+        if self.query_job_queue:
+            await self.query_job_queue.ensure_consumer_group()
+        if self._chat_dispatcher:
+            self._chat_dispatcher.start()
+
+    async def stop(self) -> None:
+        await self.cancel_all_tasks()
+        if self._chat_dispatcher:
+            await self._chat_dispatcher.stop()
+        await self.chat_thread_leases.stop()
+        if self.user_cache:
+            await self.user_cache.stop()
+        await self.session_store.stop()
+        if self.leader_election:
+            await self.leader_election.stop()
+        await self.notifier.stop()
 
     async def cancel_all_tasks(self) -> None:
         async with self._get_lock():
@@ -73,23 +153,42 @@ class InformedManager:
         assistant_message_callback: (
             Callable[[UUID, AssistantMessage, QueryState], Awaitable[None]] | None
         ) = None,
+        session: AsyncSession | None = None,
     ) -> ChatThread:
-        chat_thread = await self.chat_manager.create_chat_thread(chat_request, user_id)
-        await self.start_chat_agent(
-            chat_thread.chat_thread_id, assistant_message_callback
+        chat_thread = await self.chat_manager.create_chat_thread(
+            chat_request, user_id, session
         )
+
+        async def start() -> None:
+            await self.start_chat_agent(
+                chat_thread.chat_thread_id, assistant_message_callback
+            )
+
+        # the agent reads the thread in a session of its own, it has to be committed first
+        await after_commit(session, start)
         return chat_thread
 
     async def add_user_message(
         self,
         add_user_message_request: AddUserMessageRequest,
         user_id: UUID,
-    ) -> UUID:
-        message_id = await self.chat_manager.add_user_message(
-            add_user_message_request, user_id
+        session: AsyncSession | None = None,
+    ) -> Message:
+        message = await self.chat_manager.add_user_message(
+            add_user_message_request, user_id, session
         )
+        chat_thread_id = add_user_message_request.chat_thread_id
+
+        async def answer() -> None:
+            if self._chat_dispatcher:
+                self._chat_dispatcher.submit(chat_thread_id)
+            else:
+                # threads answered one-shot, like daily updates, have no agent left running,
+                # unless one holds the thread's lease the message starts one
+                await self._ensure_running_chat_agent(chat_thread_id)
 
-        return message_id
+        await after_commit(session, answer)
+        return message
 
     async def start_chat_agent(
         self,
@@ -101,10 +200,39 @@ class InformedManager:
         chat_thread = await self.chat_manager.get_chat_thread(chat_thread_id)
         if chat_thread is None:
             raise Exception(f"Chat thread {chat_thread_id} not found")
+        if self._chat_dispatcher:
+            self._chat_dispatcher.submit(chat_thread_id, assistant_message_callback)
+            return
         await self._ensure_running_chat_agent(
             chat_thread_id, assistant_message_callback
         )
 
+    def _create_chat_agent(
+        self,
+        chat_thread_id: UUID,
+        assistant_message_callback: (
+            Callable[[UUID, AssistantMessage, QueryState], Awaitable[None]] | None
+        ) = None,
+        chat_termination_callback: Callable[[], Awaitable[None]] | None = None,
+        context: str | None = None,
+        cohort_answers: CohortAnswers | None = None,
+    ) -> ChatAgent:
+        return ChatAgent(
+            chat_thread_id=chat_thread_id,
+            query_manager=self.query_manager,
+            user_manager=self.user_manager,
+            chat_manager=self.chat_manager,
+            llm_client=self.llm_client,
+            weather_sources_config=self.config.weather_sources_config,
+            weather_alert_service=self.weather_alert_service,
+            chat_termination_callback=chat_termination_callback,
+            assistant_message_callback=assistant_message_callback,
+            query_job_queue=self.query_job_queue,
+            chat_agent_config=self.config.chat_agent_config,
+            context=context,
+            cohort_answers=cohort_answers,
+        )
+
     async def _ensure_running_chat_agent(
         self,
         chat_thread_id: UUID,
@@ -119,21 +247,20 @@ class InformedManager:
         async def termination_callback() -> None:
             if chat_thread_id in self._chat_agents:
                 del self._chat_agents[chat_thread_id]
+            await self.chat_thread_leases.release(chat_thread_id)
 
-        chat_agent = ChatAgent(
-            chat_thread_id=chat_thread_id,
-            query_manager=self.query_manager,
-            user_manager=self.user_manager,
-            chat_manager=self.chat_manager,
-            llm_client=self.llm_client,
-            weather_sources_config=self.config.weather_sources_config,
-            weather_alert_service=self.weather_alert_service,
-            chat_termination_callback=termination_callback,
-            assistant_message_callback=assistant_message_callback,
+        new_chat_agent = self._create_chat_agent(
+            chat_thread_id, assistant_message_callback, termination_callback
         )
-        self._chat_agents[chat_thread_id] = chat_agent
+        # the agent of another replica, or a daily update, may be answering the thread already
+        if not await self.chat_thread_leases.acquire(
+            chat_thread_id, on_lost=new_chat_agent.stop
+        ):
+            log.info("chat thread {} is answered by another agent", chat_thread_id)
+            return
+        self._chat_agents[chat_thread_id] = new_chat_agent
 
-        await chat_agent.start()
+        await new_chat_agent.start()
 
     async def wait_for_chat_agent_to_terminate(
         self, chat_thread_id: UUID, timeout: float
@@ -143,44 +270,113 @@ class InformedManager:
         chat_agent = self._chat_agents[chat_thread_id]
         await asyncio.wait_for(chat_agent.wait_for_termination_event(), timeout)
 
-    async def get_chat(self, chat_thread_id: UUID) -> ChatThread:
-        chat_thread = await self.chat_manager.get_chat_thread(chat_thread_id)
+    async def get_chat(
+        self, chat_thread_id: UUID, session: AsyncSession | None = None
+    ) -> ChatThread:
+        chat_thread = await self.chat_manager.get_chat_thread(
+            chat_thread_id, session, readonly=True
+        )
         if chat_thread is None:
             raise ValueError(f"Chat thread {chat_thread_id} not found")
         return chat_thread
 
-    async def get_chat_messages(self, chat_thread_id: UUID) -> list[Message]:
-        chat_thread = await self.chat_manager.get_chat_thread(chat_thread_id)
-        if chat_thread is None:
+    async def get_chat_messages(
+        self,
+        chat_thread_id: UUID,
+        limit: int,
+        after: MessageChangeCursor | None = None,
+        before: MessageCursor | None = None,
+        session: AsyncSession | None = None,
+    ) -> ChatResponse:
+        if after:
+            messages = await self.chat_manager.get_messages(
+                chat_thread_id, limit, after=after, session=session
+            )
+            next_cursor = (
+                MessageChangeCursor.from_message(messages[-1]) if messages else after
+            )
+            return ChatResponse.from_messages(
+                chat_thread_id, messages, next_cursor=next_cursor
+            )
+
+        async with session_maker(session, readonly=True) as session:
+            # taken before the read, whatever it misses is changed after the cursor
+            next_cursor = await self.chat_manager.get_changes_cursor(session)
+            # one extra message tells whether there is anything older left to page through
+            messages = await self.chat_manager.get_messages(
+                chat_thread_id, limit + 1, before=before, session=session
+            )
+        if not messages and before is None:
             raise ValueError(f"Chat thread {chat_thread_id} not found")
-        return [m for m in chat_thread.messages]
+        return ChatResponse.from_messages(
+            chat_thread_id,
+            messages[-limit:],
+            next_cursor=next_cursor,
+            has_older=len(messages) > limit,
+        )
+
+    async def get_changes_cursor(
+        self, session: AsyncSession | None = None
+    ) -> MessageChangeCursor:
+        return await self.chat_manager.get_changes_cursor(session)
 
-    async def get_all_chats(self, review_stage: str | None = None) -> list[ChatThread]:
-        chat_threads = await self.chat_manager.get_all_chat_threads()
-        return chat_threads
+    def stream_chat_threads(
+        self, chunk_size: int = 100
+    ) -> AsyncIterator[list[ChatThread]]:
+        return self.chat_manager.stream_chat_threads(chunk_size)
 
-    async def get_message(self, message_id: UUID) -> Message:
-        message = await self.chat_manager.get_message(message_id)
+    async def get_message(
+        self, message_id: UUID, session: AsyncSession | None = None
+    ) -> Message:
+        message = await self.chat_manager.get_message(message_id, session)
         if message is None:
             raise ValueError(f"Message {message_id} not found")
         return message
 
     async def get_notifications_for_user(
-        self, user_id: UUID, limit: int = 10
-    ) -> list[Notification]:
-        return await self.notifications_manager.get_notifications_for_user(
-            user_id, limit
+        self,
+        user_id: UUID,
+        limit: int = 10,
+        before: NotificationCursor | None = None,
+        session: AsyncSession | None = None,
+    ) -> NotificationListResponse:
+        # one extra notification tells whether there is an older page
+        notifications = await self.notifications_manager.get_notifications_for_user(
+            user_id, limit + 1, before, session
+        )
+        return NotificationListResponse.from_user_notifications(
+            notifications[:limit], has_older=len(notifications) > limit
         )
 
     async def bulk_update_notification_status(
-        self, notification_ids: list[UUID], status: NotificationStatus
-    ) -> None:
+        self,
+        user_id: UUID,
+        notification_ids: list[UUID],
+        status: NotificationStatus,
+        session: AsyncSession | None = None,
+    ) -> list[Notification]:
         return await self.notifications_manager.bulk_update_notification_status(
-            notification_ids, status
+            user_id, notification_ids, status, session
+        )
+
+    async def mark_notifications_as_read(
+        self, user_id: UUID, session: AsyncSession | None = None
+    ) -> list[UUID]:
+        return await self.notifications_manager.mark_notifications_as_read(
+            user_id, session
         )
 
     async def send_daily_updates(self) -> None:
-        """Send daily updates to all opted-in users."""
+        """Send the daily updates due to be generated since the last run, run periodically."""
+        now = datetime.now(UTC)
+        # after a restart, or taking over as leader, the whole window is looked at again and what
+        # was claimed before is skipped
+        window_start = now - timedelta(
+            seconds=self.config.daily_updates_config.generation_window_seconds
+        )
+        since = max(self._daily_updates_sent_until or window_start, window_start)
+        # moved up front, a run skipped because this one took long is picked up by the next
+        self._daily_updates_sent_until = now
 
         async def notification_callback(
             chat_thread_id: UUID, message: AssistantMessage, query_state: QueryState
@@ -189,30 +385,147 @@ class InformedManager:
                 chat_thread_id, message, query_state
             )
 
-        try:
-            users = await self.notifications_manager.get_users_with_daily_updates()
-            log.info(f"Sending daily updates to {len(users)} users")
-
-            for user_id, prompt in users:
-                try:
-                    chat_request = ChatRequest(message=prompt)
-                    chat_thread = await self.start_new_chat_thread(
-                        chat_request=chat_request,
-                        user_id=user_id,
-                        assistant_message_callback=notification_callback,
-                    )
-
-                    await self.notifications_manager.create_notification(
-                        user_id=user_id,
-                        chat_thread_id=chat_thread.chat_thread_id,
-                        title="Daily Update",
-                        content="Processing your daily update...",
-                    )
-
-                    log.info(f"Created daily update chat thread for user {user_id}")
-                except Exception as e:
-                    log.error(f"Failed to send daily update to user {user_id}: {e!s}")
-                    continue
+        async def build_context(zip_code: str) -> str:
+            return await build_zip_weather_context(
+                zip_code,
+                self.config.weather_sources_config,
+                self.weather_alert_service,
+            )
 
+        # users whose prompts come out identical get the answer generated for the first of them
+        cohort_answers = CohortAnswers()
+
+        async def send_update(
+            recipient: DailyUpdateRecipient, context: str | None
+        ) -> None:
+            await self._send_daily_update(
+                recipient, context, notification_callback, cohort_answers
+            )
+
+        try:
+            opted_in = await self.notifications_manager.get_users_with_daily_updates()
+            started = await self.daily_update_runs.start_run(
+                opted_in,
+                self._daily_update_schedule.due(opted_in, since, now),
+                self.leader_election.fencing_token if self.leader_election else None,
+            )
+            if started is None:
+                return
+            run_id, recipients = started
+            log.info(f"Sending daily updates to {len(recipients)} users")
+            fan_out = DailyUpdateFanOut(
+                self.config.daily_updates_config,
+                build_context,
+                send_update,
+                on_progress=partial(self.daily_update_runs.heartbeat, run_id),
+            )
+            progress = await fan_out.run(recipients)
+            await self.daily_update_runs.finish_run(run_id, progress)
         except Exception as e:
             log.error(f"Failed to process daily updates: {e!s}")
+
+    async def _send_daily_update(
+        self,
+        recipient: DailyUpdateRecipient,
+        context: str | None,
+        notification_callback: Callable[
+            [UUID, AssistantMessage, QueryState], Awaitable[None]
+        ],
+        cohort_answers: CohortAnswers,
+    ) -> None:
+        """Sends one daily update and records how its delivery went."""
+        try:
+            chat_thread_id = recipient.chat_thread_id
+            if chat_thread_id is None:
+                chat_thread = await self.chat_manager.create_chat_thread(
+                    ChatRequest(message=recipient.prompt), recipient.user_id
+                )
+                chat_thread_id = chat_thread.chat_thread_id
+                await self.notifications_manager.create_notification(
+                    user_id=recipient.user_id,
+                    chat_thread_id=chat_thread_id,
+                    title="Daily Update",
+                    content="Processing your daily update...",
+                )
+                await self.daily_update_runs.checkpoint(recipient, chat_thread_id)
+            # a reply to an update resumed here may have started an agent on the thread
+            if not await self.chat_thread_leases.acquire(chat_thread_id):
+                raise ValueError(
+                    f"chat thread {chat_thread_id} is answered by another agent"
+                )
+            try:
+                if recipient.chat_thread_id and await self._resume_daily_update(
+                    chat_thread_id, notification_callback
+                ):
+                    await self.daily_update_runs.finish_delivery(recipient)
+                    return
+                # answered right here so the worker stays busy until the update is done
+                chat_agent = self._create_chat_agent(
+                    chat_thread_id,
+                    notification_callback,
+                    context=context,
+                    cohort_answers=cohort_answers,
+                )
+                query_state = await chat_agent.run_once()
+            finally:
+                await self.chat_thread_leases.release(chat_thread_id)
+            if query_state != QueryState.COMPLETED:
+                # left for a later run to retry
+                raise ValueError(
+                    f"daily update query ended {query_state.value if query_state else 'without one'}"
+                )
+        except Exception as e:
+            await self.daily_update_runs.finish_delivery(recipient, str(e))
+            raise
+        await self.daily_update_runs.finish_delivery(recipient)
+        if (
+            not self._chat_dispatcher
+            and await self.chat_manager.get_pending_user_messages(chat_thread_id)
+        ):
+            # a reply that landed as the update finished found the lease still taken
+            await self._ensure_running_chat_agent(chat_thread_id)
+
+    async def _resume_daily_update(
+        self,
+        chat_thread_id: UUID,
+        assistant_message_callback: Callable[
+            [UUID, AssistantMessage, QueryState], Awaitable[None]
+        ],
+    ) -> bool:
+        """
+        Picks up a daily update that was started before. Returns whether its prompt had been answered
+        already, otherwise, failed answers included, the prompt alone is made pending again to be
+        answered in the same thread.
+        """
+        chat_thread = await self.chat_manager.get_chat_thread(chat_thread_id)
+        if chat_thread is None:
+            raise ValueError(f"Chat thread {chat_thread_id} not found")
+        # the thread was started with the prompt, what the user wrote after is answered on its own
+        prompt, *rest = chat_thread.messages
+        answers = list(
+            itertools.takewhile(
+                lambda message: message.source == MessageSource.ASSISTANT, rest
+            )
+        )
+        for answer in reversed(answers):
+            # the apology left by a failed query does not count, the question is asked again
+            if answer.query_id is None or await self._is_completed(answer.query_id):
+                # the notification may not have been updated with it yet
+                await assistant_message_callback(
+                    chat_thread_id,
+                    AssistantMessage.model_validate(answer, from_attributes=True),
+                    QueryState.COMPLETED,
+                )
+                return True
+        if prompt.acknowledged:
+            prompt.acknowledged = False
+            await self.chat_manager.update_message(prompt)
+        return False
+
+    async def _is_completed(self, query_id: UUID) -> bool:
+        try:
+            query = await self.query_manager.get_query(query_id)
+        except ValueError:
+            # a query that can not be found did not answer anything
+            return False
+        return query is not None and query.state == QueryState.COMPLETED
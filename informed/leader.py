@@ -0,0 +1,155 @@
+import asyncio
+import contextlib
+import time
+import weakref
+from collections.abc import Iterable
+from uuid import uuid4
+
+from loguru import logger as log
+from opentelemetry.metrics import CallbackOptions, Observation
+from redis.asyncio import Redis
+
+from informed.config import LeaderElectionConfig
+from informed.metrics import get_meter
+
+# takes the lease if it is free, with a fencing token higher than any handed out before
+_ACQUIRE = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], token .. ':' .. ARGV[1], 'PX', ARGV[2])
+return token
+"""
+# extends the lease only if it is still ours
+_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_elections: weakref.WeakSet["LeaderElection"] = weakref.WeakSet()
+
+
+def _observe_leadership(_: CallbackOptions) -> Iterable[Observation]:
+    for election in _elections:
+        yield Observation(1 if election.is_leader else 0)
+
+
+_meter = get_meter(__name__)
+_meter.create_observable_gauge(
+    "scheduler.leader",
+    callbacks=[_observe_leadership],
+    description="Whether this replica holds the scheduler lease",
+)
+
+
+class LeaderElection:
+    """
+    Elects the one replica that runs the scheduled jobs, through a lease kept in Redis.
+
+    The leader renews its lease well before it expires, if it dies the lease runs out and another
+    replica takes over. Every new lease comes with a fencing token higher than the previous ones:
+    a leader that stalled past its lease may still believe it leads for a moment, stores reject its
+    writes by its older token. The leader steps down by itself once it could not renew in time.
+    """
+
+    def __init__(self, redis_client: Redis, config: LeaderElectionConfig):
+        self._redis_client = redis_client
+        self._key = config.key
+        self._fencing_key = f"{config.key}:fencing_token"
+        self._lease_ms = int(config.lease_seconds * 1000)
+        self._renew_interval_seconds = config.renew_interval_seconds
+        self._instance_id = str(uuid4())
+        self._fencing_token: int | None = None
+        # monotonic time the lease expires at, as far as we know
+        self._lease_expires_at = 0.0
+        self._task: asyncio.Task | None = None
+        _elections.add(self)
+
+    @property
+    def is_leader(self) -> bool:
+        return (
+            self._fencing_token is not None
+            and time.monotonic() < self._lease_expires_at
+        )
+
+    @property
+    def fencing_token(self) -> int | None:
+        """Token of the lease we hold, None when we are not the leader."""
+        return self._fencing_token if self.is_leader else None
+
+    async def start(self) -> None:
+        if not self._task:
+            # a first attempt right away, so jobs scheduled to run at startup find a leader
+            await self._campaign()
+            self._task = asyncio.create_task(self._run())
+            log.info("leader election started, instance {}", self._instance_id)
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._fencing_token is not None:
+            # lets another replica take over right away instead of waiting for the lease to run out
+            try:
+                await self._redis_client.eval(  # type: ignore
+                    _RELEASE, 1, self._key, self._lease_value()
+                )
+            except Exception as e:
+                log.error("failed to release the scheduler lease: {}", e)
+            self._step_down()
+        log.info("leader election stopped")
+
+    def _lease_value(self) -> str:
+        return f"{self._fencing_token}:{self._instance_id}"
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._renew_interval_seconds)
+            await self._campaign()
+
+    async def _campaign(self) -> None:
+        # taken before the call, the lease can only expire later than this on the Redis side
+        lease_expires_at = time.monotonic() + self._lease_ms / 1000
+        try:
+            if self._fencing_token is not None:
+                renewed = await self._redis_client.eval(  # type: ignore
+                    _RENEW, 1, self._key, self._lease_value(), str(self._lease_ms)
+                )
+                if renewed:
+                    self._lease_expires_at = lease_expires_at
+                else:
+                    log.warning("lost the scheduler lease")
+                    self._step_down()
+                return
+            token = await self._redis_client.eval(  # type: ignore
+                _ACQUIRE,
+                2,
+                self._key,
+                self._fencing_key,
+                self._instance_id,
+                str(self._lease_ms),
+            )
+            if token:
+                self._fencing_token = int(token)
+                self._lease_expires_at = lease_expires_at
+                log.info("became scheduler leader, fencing token {}", token)
+        except Exception as e:
+            log.error("scheduler leader election failed: {}", e)
+            if self._fencing_token is not None and not self.is_leader:
+                log.warning("scheduler lease expired before it could be renewed")
+                self._step_down()
+
+    def _step_down(self) -> None:
+        self._fencing_token = None
+        self._lease_expires_at = 0.0
@@ -0,0 +1,29 @@
+from opentelemetry import metrics
+from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+
+from informed.config import Config
+from informed.logger.logger import create_otel_resource
+
+
+def setup_metrics(config: Config) -> None:
+    """
+    Exports metrics over OTLP when OpenTelemetry is enabled.
+
+    Instruments can be created before this runs, until a provider is set they record nothing.
+    """
+    telemetry_config = config.telemetry_config
+    if not (telemetry_config.enabled and telemetry_config.opentelemetry_config.enabled):
+        return
+    reader = PeriodicExportingMetricReader(
+        OTLPMetricExporter(insecure=True),
+        export_interval_millis=telemetry_config.metrics_export_interval_ms,
+    )
+    metrics.set_meter_provider(
+        MeterProvider(resource=create_otel_resource(config), metric_readers=[reader])
+    )
+
+
+def get_meter(name: str) -> metrics.Meter:
+    return metrics.get_meter(name)
@@ -0,0 +1,161 @@
+import asyncio
+import contextlib
+import json
+from abc import ABC, abstractmethod
+from uuid import uuid4
+
+from loguru import logger as log
+from redis.asyncio import Redis
+
+from informed.config import NotifierBackend, NotifierConfig
+
+
+class Notifier(ABC):
+    """
+    Wakes up tasks waiting on a named channel.
+
+    Notifications are only kept for channels subscribed to in this process. A subscribed channel behaves
+    like an asyncio.Event: a notification published before anyone waits is kept until the next wait,
+    and waiting clears it. The payload of the latest notification is returned to the waiter.
+    """
+
+    def __init__(self) -> None:
+        self._events: dict[str, asyncio.Event] = {}
+        self._payloads: dict[str, str] = {}
+
+    def _get_event(self, channel: str) -> asyncio.Event:
+        if channel not in self._events:
+            self._events[channel] = asyncio.Event()
+        return self._events[channel]
+
+    def _deliver(self, channel: str, payload: str) -> None:
+        if channel not in self._events:
+            return
+        self._payloads[channel] = payload
+        self._events[channel].set()
+
+    @abstractmethod
+    async def publish(self, channel: str, payload: str = "") -> None:
+        pass
+
+    def subscribe(self, channel: str) -> None:
+        """Starts keeping notifications for the channel, so none are missed before the first wait."""
+        self._get_event(channel)
+
+    def unsubscribe(self, channel: str) -> None:
+        self._events.pop(channel, None)
+        self._payloads.pop(channel, None)
+
+    async def wait(self, channel: str, timeout: float | None = None) -> str:
+        """
+        Waits for the next notification on the channel, subscribing to it if needed.
+
+        Raises TimeoutError if none arrives in time.
+        """
+        event = self._get_event(channel)
+        await asyncio.wait_for(event.wait(), timeout=timeout)
+        event.clear()
+        return self._payloads.get(channel, "")
+
+    @abstractmethod
+    async def start(self) -> None:
+        pass
+
+    @abstractmethod
+    async def stop(self) -> None:
+        pass
+
+
+class InMemoryNotifier(Notifier):
+    async def publish(self, channel: str, payload: str = "") -> None:
+        self._deliver(channel, payload)
+
+    async def start(self) -> None:
+        # nothing to connect to, notifications never leave the process
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class RedisNotifier(Notifier):
+    """
+    Fans notifications out to every replica through Redis pub/sub.
+
+    Notifications are delivered to local subscribers immediately, and a single pattern subscription per process
+    delivers notifications published by other replicas to the subscribers in this one.
+    """
+
+    def __init__(self, redis_client: Redis, config: NotifierConfig):
+        super().__init__()
+        self._redis_client = redis_client
+        self._channel_prefix = config.channel_prefix
+        self._reconnect_delay_seconds = config.reconnect_delay_seconds
+        self._origin = str(uuid4())
+        self._listen_task: asyncio.Task | None = None
+
+    async def publish(self, channel: str, payload: str = "") -> None:
+        self._deliver(channel, payload)
+        message = json.dumps({"origin": self._origin, "payload": payload})
+        try:
+            await self._redis_client.publish(self._channel_prefix + channel, message)
+        except Exception as e:
+            log.error("failed to publish notification on {}: {}", channel, e)
+
+    async def start(self) -> None:
+        if not self._listen_task:
+            self._listen_task = asyncio.create_task(self._listen())
+            log.info("redis notifier started")
+
+    async def stop(self) -> None:
+        if self._listen_task:
+            self._listen_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._listen_task
+            self._listen_task = None
+            log.info("redis notifier stopped")
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis_client.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{self._channel_prefix}*")
+                    # anything published while we were disconnected is lost, wake everyone up to re-check their state
+                    for channel in list(self._events):
+                        self._deliver(channel, "")
+                    while True:
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=1.0
+                        )
+                        if message is not None:
+                            self._handle_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error("redis notifier subscription failed, reconnecting: {}", e)
+                await asyncio.sleep(self._reconnect_delay_seconds)
+
+    def _handle_message(self, message: dict) -> None:
+        channel, data = message["channel"], message["data"]
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        if isinstance(data, bytes):
+            data = data.decode()
+        try:
+            notification = json.loads(data)
+        except (json.JSONDecodeError, TypeError):
+            log.warning("ignoring malformed notification on {}", channel)
+            return
+
+        # our own notifications were already delivered locally on publish
+        if notification.get("origin") == self._origin:
+            return
+        self._deliver(
+            channel.removeprefix(self._channel_prefix), notification.get("payload", "")
+        )
+
+
+def init_notifier(notifier_config: NotifierConfig, redis_client: Redis) -> Notifier:
+    if notifier_config.backend == NotifierBackend.REDIS:
+        return RedisNotifier(redis_client, notifier_config)
+    return InMemoryNotifier()
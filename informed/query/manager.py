@@ -1,22 +1,28 @@
-import asyncio
-from asyncio import Event
-from datetime import datetime, timedelta
+import json
+from datetime import UTC, datetime
 from typing import cast
 from uuid import UUID
 
-from sqlalchemy.sql import ColumnElement, select
+from sqlalchemy.sql import ColumnElement, select, update
 
 from informed.api.schema import QueryResponse, UpdateQueryRequest
 from informed.db import session_maker
-from informed.db_models.query import Query
+from informed.db_models.query import Query, QueryState
+from informed.notifier import Notifier
+
+
+class StaleQueryError(Exception):
+    """Raised when a query was modified by someone else since it was read."""
 
 
 class QueryManager:
-    def __init__(self) -> None:
-        self._query_updates: dict[UUID, Event] = {}
-        self._last_updates: dict[UUID, datetime] = {}
+    def __init__(self, notifier: Notifier) -> None:
+        self._notifier = notifier
         # self.queries: dict[UUID, Query] = {}
-        pass
+
+    @staticmethod
+    def _update_channel(query_id: UUID) -> str:
+        return f"query:{query_id}"
 
     async def create_query(self, user_id: UUID, query: str) -> QueryResponse:
         created_query = Query(user_id=user_id, query=query)
@@ -26,42 +32,75 @@ class QueryManager:
         return QueryResponse.from_db(created_query)
 
     async def persist_query(self, query: Query) -> None:
+        """
+        Persists the state transition of a query read earlier.
+
+        The update only applies if the row is still at the version the caller read, otherwise
+        StaleQueryError is raised. On success the version of the passed query is bumped.
+        """
+        updated_at = datetime.now(UTC)
         async with session_maker() as session:
-            session.add(query)
+            result = await session.execute(
+                update(Query)
+                .where(
+                    cast(ColumnElement[bool], Query.query_id == query.query_id),
+                    cast(ColumnElement[bool], Query.version == query.version),
+                )
+                .values(
+                    state=query.state,
+                    answer=query.answer,
+                    sources=query.sources,
+                    updated_at=updated_at,
+                    version=query.version + 1,
+                )
+                .returning(Query.version)  # type: ignore
+            )
+            version = result.scalar_one_or_none()
             await session.commit()
+        if version is None:
+            raise StaleQueryError(
+                f"Query {query.query_id} was modified since version {query.version}"
+            )
+        query.version = version
+        query.updated_at = updated_at
 
-        # Signal that a query has been updated
-        if query.query_id in self._query_updates:
-            self._last_updates[query.query_id] = datetime.now()
-            self._query_updates[query.query_id].set()
+        # Push the new state to subscribers, they may live in another replica
+        await self._notifier.publish(
+            self._update_channel(query.query_id), query.model_dump_json()
+        )
 
     async def get_query(self, query_id: UUID) -> Query:
         async with session_maker() as session:
             query = await session.execute(
-                select(Query)
-                .filter(cast(ColumnElement[bool], Query.query_id == query_id))
-                .with_for_update()
+                select(Query).filter(
+                    cast(ColumnElement[bool], Query.query_id == query_id)
+                )
             )
             result = query.scalar_one_or_none()
             if result is None:
                 raise ValueError(f"Query {query_id} not found")
             return result
 
+    async def terminate_query(self, query_id: UUID, state: QueryState) -> Query:
+        """
+        Moves a query to a terminal state unless it terminated already and returns it as it ends up.
+        Whoever persists a state first wins, a concurrent write keeps its state.
+        """
+        query = await self.get_query(query_id)
+        if query.state.is_terminated():
+            return query
+        query.state = state
+        try:
+            await self.persist_query(query)
+        except StaleQueryError:
+            query = await self.get_query(query_id)
+        return query
+
     async def update_query(self, request: UpdateQueryRequest) -> QueryResponse:
-        async with session_maker() as session:
-            statement = (
-                select(Query)
-                .filter(cast(ColumnElement[bool], Query.query_id == request.query_id))
-                .with_for_update()
-            )
-            result = await session.execute(statement)
-            db_query = result.scalar_one_or_none()
-            if db_query is None:
-                raise ValueError(f"Query {request.query_id} not found")
-            db_query.state = request.state
-            session.add(db_query)
-            await session.commit()
-            return QueryResponse.from_db(db_query)
+        query = await self.get_query(request.query_id)
+        query.state = request.state
+        await self.persist_query(query)
+        return QueryResponse.from_db(query)
 
     async def get_recent_query_for_user(self, user_id: UUID) -> Query | None:
         async with session_maker() as session:
@@ -73,25 +112,27 @@ class QueryManager:
             )
             return query.scalar_one_or_none()
 
-    async def get_updated_query(
+    def subscribe_to_query_updates(self, query_id: UUID) -> None:
+        """Subscribe before the query can change state, so that no update is missed."""
+        self._notifier.subscribe(self._update_channel(query_id))
+
+    def unsubscribe_from_query_updates(self, query_id: UUID) -> None:
+        self._notifier.unsubscribe(self._update_channel(query_id))
+
+    async def wait_for_query_update(
         self, query_id: UUID, timeout: float | None = None
     ) -> Query:
-        # Create event if it doesn't exist
-        if query_id not in self._query_updates:
-            self._query_updates[query_id] = Event()
-            self._last_updates[query_id] = datetime.now()
-
-        # Wait for the update event
-        try:
-            await asyncio.wait_for(
-                self._query_updates[query_id].wait(), timeout=timeout
-            )
-            self._query_updates[query_id].clear()
-            return await self.get_query(query_id)
-        except TimeoutError:
-            return await self.get_query(query_id)
-        finally:
-            # Cleanup if no updates for a while
-            if datetime.now() - self._last_updates[query_id] > timedelta(minutes=30):
-                self._query_updates.pop(query_id, None)
-                self._last_updates.pop(query_id, None)
+        """
+        Waits for the next state persisted for a query, using the state pushed by the writer instead of
+        reading the row back. Subscriptions are dropped once the query terminates.
+        """
+        payload = await self._notifier.wait(self._update_channel(query_id), timeout)
+        # an empty payload means the notifier lost track of updates (e.g. a reconnect), fall back to the db
+        query = (
+            Query.model_validate(json.loads(payload))
+            if payload
+            else await self.get_query(query_id)
+        )
+        if query.state.is_terminated():
+            self.unsubscribe_from_query_updates(query_id)
+        return query
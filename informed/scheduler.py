@@ -1,65 +1,178 @@
-from collections.abc import Callable
-from datetime import datetime, timedelta
+import time
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime, timedelta
 from typing import Any
 
+from apscheduler.events import (
+    EVENT_JOB_MAX_INSTANCES,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_SUBMITTED,
+    JobEvent,
+    JobSubmissionEvent,
+)
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.util import undefined
 from loguru import logger as log
+from redis.asyncio import Redis
+
+from informed.config import SchedulerConfig
+from informed.leader import LeaderElection
+from informed.metrics import get_meter
+
+# the get_next_fire_time(previous_fire_time, now) of a trigger
+_NextFireTime = Callable[[datetime | None, datetime], datetime | None]
+# when a job should have last run, given now and when it did last run, None when it is not due
+_DueSince = Callable[[datetime, datetime | None], datetime | None]
+
+_meter = get_meter(__name__)
+_job_runs = _meter.create_counter(
+    "scheduler.job.runs",
+    description="Job runs, by job and outcome",
+)
+_job_duration = _meter.create_histogram(
+    "scheduler.job.duration",
+    unit="s",
+    description="Time a job run took",
+)
+_job_lag = _meter.create_histogram(
+    "scheduler.job.lag",
+    unit="s",
+    description="Time between when a job run was scheduled and when it was submitted",
+)
+_job_misfires = _meter.create_counter(
+    "scheduler.job.misfires",
+    description="Job runs that did not happen, missed or with the previous run still going",
+)
 
 
 class JobScheduler:
-    def __init__(self) -> None:
-        self.scheduler = AsyncIOScheduler()
-        self.job_names: set[str] = set()
+    """
+    Runs the periodic jobs of the app.
 
-    def add_job(
+    A callable can be scheduled under any number of triggers, each becomes a job of its own named
+    after the callable and the trigger. With a leader election every replica schedules the jobs but
+    only the leader runs them. With a Redis client the start of every cron and interval run is
+    recorded there, a run that nobody made, because of a restart or while leadership moved, is
+    caught up once: a cron run if it is still within the misfire grace time, an interval run as
+    soon as it is overdue.
+    """
+
+    def __init__(
         self,
-        job: Callable,
-        interval_seconds: int | None = None,
-        args: list[Any] | None = None,
-        run_immediately: bool = True,
+        config: SchedulerConfig | None = None,
+        redis_client: Redis | None = None,
+        leader_election: LeaderElection | None = None,
     ) -> None:
+        config = config or SchedulerConfig()
+        self.scheduler = AsyncIOScheduler(
+            job_defaults={
+                "coalesce": True,
+                "misfire_grace_time": config.misfire_grace_seconds,
+            }
+        )
+        self.job_names: set[str] = set()
+        # ids of the jobs of every callable
+        self._job_ids: dict[str, list[str]] = {}
+        # the jobs whose runs are recorded and caught up, with when each is due
+        self._recorded_jobs: dict[str, _DueSince] = {}
+        # jobs of this replica running right now, never caught up while they run
+        self._running: set[str] = set()
+        self._redis_client = redis_client
+        self._runs_key = config.runs_key
+        self._misfire_grace = timedelta(seconds=config.misfire_grace_seconds)
+        self._catch_up_interval_seconds = config.catch_up_interval_seconds
+        self._leader_election = leader_election
+        self.scheduler.add_listener(self._on_submitted, EVENT_JOB_SUBMITTED)
+        self.scheduler.add_listener(
+            self._on_misfire, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES
+        )
+        if redis_client:
+            # there from the start, so it also covers the jobs added once the scheduler runs
+            self.scheduler.add_job(
+                self._catch_up_missed_runs,
+                trigger=IntervalTrigger(seconds=self._catch_up_interval_seconds),
+                next_run_time=datetime.now(UTC),
+                id="catch_up_missed_runs",
+            )
+
+    def _is_leader(self) -> bool:
+        return self._leader_election is None or self._leader_election.is_leader
+
+    def _wrap(
+        self, job: Callable, job_id: str, args: list[Any] | None
+    ) -> Callable[[], Awaitable[Any]]:
         async def wrapped() -> Any:
+            if not self._is_leader():
+                log.debug("not the scheduler leader, skipping {}", job_id)
+                _job_runs.add(1, {"job": job_id, "outcome": "skipped"})
+                return None
+            self._running.add(job_id)
+            start = time.perf_counter()
+            outcome = "succeeded"
             try:
+                await self._record_run(job_id)
                 return await job(*args or [])
             except Exception as e:
-                log.error(
-                    "exception in background task {}, exception: {}", job.__name__, e
-                )
+                outcome = "failed"
+                log.error("exception in background task {}, exception: {}", job_id, e)
+            finally:
+                self._running.discard(job_id)
+                _job_duration.record(time.perf_counter() - start, {"job": job_id})
+                _job_runs.add(1, {"job": job_id, "outcome": outcome})
+
+        return wrapped
 
+    def _register(self, job: Callable, job_id: str) -> None:
+        if job_id in self._job_ids.get(job.__name__, []):
+            raise ValueError(f"job {job_id} is already scheduled")
         self.job_names.add(job.__name__)
+        self._job_ids.setdefault(job.__name__, []).append(job_id)
 
+    def add_job(
+        self,
+        job: Callable,
+        interval_seconds: int | None = None,
+        args: list[Any] | None = None,
+        run_immediately: bool = True,
+    ) -> None:
         if interval_seconds is not None:
+            job_id = f"{job.__name__}@every {interval_seconds}s"
+            self._register(job, job_id)
+            interval = timedelta(seconds=interval_seconds)
+            self._recorded_jobs[job_id] = lambda now, last_run: (
+                last_run + interval if last_run else None
+            )
+            # the first run right away is part of the same job, so it cannot overlap the next
             self.scheduler.add_job(
-                wrapped,
+                self._wrap(job, job_id, args),
                 trigger=IntervalTrigger(seconds=interval_seconds),
-                id=job.__name__,
+                next_run_time=datetime.now(UTC) if run_immediately else undefined,
+                id=job_id,
                 name=job.__name__,
             )
-        if run_immediately:
+        elif run_immediately:
+            job_id = f"{job.__name__}@start"
+            self._register(job, job_id)
             self.scheduler.add_job(
-                wrapped,
+                self._wrap(job, job_id, args),
                 misfire_grace_time=None,
-                id=f"{job.__name__}_immediate",
+                id=job_id,
                 name=job.__name__,
             )
 
     def add_one_time_job(
         self, job: Callable, delay_seconds: int = 0, args: list[Any] | None = None
     ) -> None:
-        async def wrapped() -> Any:
-            try:
-                return await job(*args or [])
-            except Exception as e:
-                log.error(
-                    "exception in background task {}, exception: {}", job.__name__, e
-                )
-
+        # left out of the callable's jobs, it is gone once it ran
         run_time = datetime.now() + timedelta(seconds=delay_seconds)
-        self.job_names.add(job.__name__)
-        self.scheduler.add_job(wrapped, trigger=DateTrigger(run_date=run_time))
+        self.scheduler.add_job(
+            self._wrap(job, f"{job.__name__}@once", args),
+            trigger=DateTrigger(run_date=run_time),
+            name=job.__name__,
+        )
 
     def add_cron_job(
         self,
@@ -69,20 +182,17 @@ class JobScheduler:
         timezone: str = "UTC",
         args: list[Any] | None = None,
     ) -> None:
-        async def wrapped() -> Any:
-            try:
-                return await job(*args or [])
-            except Exception as e:
-                log.error(
-                    "exception in background task {}, exception: {}", job.__name__, e
-                )
-
-        self.job_names.add(job.__name__)
-        # Schedule the job based on the cron trigger with timezone
+        job_id = f"{job.__name__}@{hour:02d}:{minute:02d} {timezone}"
+        self._register(job, job_id)
+        trigger = CronTrigger(hour=hour, minute=minute, timezone=timezone)
+        self._recorded_jobs[job_id] = lambda now, last_run: self._latest_fire_time(
+            trigger.get_next_fire_time, now
+        )
         self.scheduler.add_job(
-            wrapped,
-            trigger=CronTrigger(hour=hour, minute=minute, timezone=timezone),
-            id=job.__name__,
+            self._wrap(job, job_id, args),
+            trigger=trigger,
+            id=job_id,
+            name=job.__name__,
         )
 
     def start(self) -> None:
@@ -96,7 +206,81 @@ class JobScheduler:
         log.debug("job scheduler stopped")
 
     def list_jobs(self) -> None:
-        log.debug("Currently scheduled jobs: {}", ", ".join(self.job_names))
+        log.debug(
+            "Currently scheduled jobs: {}",
+            ", ".join(job_id for ids in self._job_ids.values() for job_id in ids),
+        )
 
     def remove_job(self, job: Callable) -> None:
-        self.scheduler.remove_job(job.__name__)
+        """Removes the callable's jobs of every trigger."""
+        for job_id in self._job_ids.pop(job.__name__, []):
+            self._recorded_jobs.pop(job_id, None)
+            self.scheduler.remove_job(job_id)
+        self.job_names.discard(job.__name__)
+
+    def _on_submitted(self, event: JobSubmissionEvent) -> None:  # type: ignore[no-any-unimported]
+        if event.scheduled_run_times:
+            lag = datetime.now(UTC) - event.scheduled_run_times[-1]
+            _job_lag.record(max(0.0, lag.total_seconds()), {"job": event.job_id})
+
+    def _on_misfire(self, event: JobEvent) -> None:  # type: ignore[no-any-unimported]
+        reason = "missed" if event.code == EVENT_JOB_MISSED else "still_running"
+        log.warning("job {} did not run: {}", event.job_id, reason)
+        _job_misfires.add(1, {"job": event.job_id, "reason": reason})
+
+    async def _record_run(self, job_id: str) -> None:
+        if not self._redis_client or job_id not in self._recorded_jobs:
+            return
+        try:
+            await self._redis_client.hset(  # type: ignore
+                self._runs_key, job_id, str(time.time())
+            )
+        except Exception as e:
+            log.error("failed to record the run of job {}: {}", job_id, e)
+
+    async def _catch_up_missed_runs(self) -> None:
+        if not self._redis_client or not self._is_leader():
+            return
+        try:
+            last_runs = {
+                (key.decode() if isinstance(key, bytes) else key): float(value)
+                for key, value in (
+                    await self._redis_client.hgetall(self._runs_key)  # type: ignore
+                ).items()
+            }
+        except Exception as e:
+            log.error("failed to read the last job runs: {}", e)
+            return
+        now = datetime.now(UTC)
+        # runs due this last catch up interval may be starting right now, they are left to the
+        # trigger
+        until = now - timedelta(seconds=self._catch_up_interval_seconds)
+        for job_id, due_since in list(self._recorded_jobs.items()):
+            if job_id in self._running:
+                continue
+            last_run = (
+                datetime.fromtimestamp(last_runs[job_id], UTC)
+                if job_id in last_runs
+                else None
+            )
+            missed = due_since(now, last_run)
+            if missed is None or missed > until or (last_run and last_run >= missed):
+                continue
+            log.warning("catching up job {}, missed its run at {}", job_id, missed)
+            _job_misfires.add(1, {"job": job_id, "reason": "caught_up"})
+            # the job itself is brought forward, it still runs one at a time and then goes on
+            # with its trigger
+            self.scheduler.modify_job(job_id, next_run_time=now)
+
+    def _latest_fire_time(
+        self, next_fire_time: _NextFireTime, now: datetime
+    ) -> datetime | None:
+        """
+        Latest time the trigger fired within the misfire grace time, None when it did not.
+        """
+        latest = None
+        fire_time = next_fire_time(None, now - self._misfire_grace)
+        while fire_time is not None and fire_time <= now:
+            latest = fire_time
+            fire_time = next_fire_time(fire_time, fire_time + timedelta(microseconds=1))
+        return latest
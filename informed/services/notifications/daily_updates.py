@@ -0,0 +1,235 @@
+import asyncio
+import contextlib
+import hashlib
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from datetime import UTC, date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from loguru import logger as log
+from pydantic import BaseModel
+
+from informed.config import DailyUpdatesConfig
+from informed.metrics import get_meter
+from informed.services.notifications.manager import DailyUpdateRecipient
+
+_meter = get_meter(__name__)
+_updates = _meter.create_counter(
+    "daily_updates.updates",
+    description="Daily updates sent, by outcome",
+)
+_pending_updates = _meter.create_up_down_counter(
+    "daily_updates.pending",
+    description="Daily updates of the current run not sent yet",
+)
+_update_duration = _meter.create_histogram(
+    "daily_updates.update.duration",
+    unit="s",
+    description="Time to send one daily update, from thread creation to answer",
+)
+_context_build_duration = _meter.create_histogram(
+    "daily_updates.context.duration",
+    unit="s",
+    description="Time to build the weather context of a zip code",
+)
+
+
+class DailyUpdateProgress(BaseModel):
+    total: int
+    sent: int = 0
+    failed: int = 0
+    # zip codes whose context was built, the rest of their users reused it
+    contexts_built: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed
+
+    @property
+    def updates_per_second(self) -> float:
+        return self.done / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+class DailyUpdateSchedule:
+    """
+    When each daily update is generated, instead of everybody's at once.
+
+    An update is generated at some point of the window before the user's local delivery time, picked
+    by hashing the day, zip code and prompt. The point is the same on every run and every replica,
+    and users of a zip asking the same thing are generated together so they still share the zip's
+    weather context and cohort answers.
+    """
+
+    def __init__(self, config: DailyUpdatesConfig):
+        self._window = timedelta(seconds=config.generation_window_seconds)
+        self._spread_seconds = max(
+            0, config.generation_window_seconds - config.generation_lead_seconds
+        )
+
+    def generation_time(self, recipient: DailyUpdateRecipient, day: date) -> datetime:
+        delivery = datetime.combine(
+            day, recipient.delivery_time, tzinfo=ZoneInfo(recipient.timezone)
+        )
+        key = f"{day.isoformat()}:{recipient.zip_code}:{recipient.prompt}"
+        jitter = int.from_bytes(hashlib.sha256(key.encode()).digest()[:8]) / 2**64
+        return (
+            delivery - self._window + timedelta(seconds=jitter * self._spread_seconds)
+        ).astimezone(UTC)
+
+    def due(
+        self, recipients: list[DailyUpdateRecipient], since: datetime, until: datetime
+    ) -> list[DailyUpdateRecipient]:
+        """Recipients whose update is to be generated in (since, until], with its delivery date."""
+        due = []
+        for recipient in recipients:
+            today = until.astimezone(ZoneInfo(recipient.timezone)).date()
+            # the window of tomorrow's update may start before midnight, or yesterday's end after
+            for day in [today - timedelta(days=1), today, today + timedelta(days=1)]:
+                if since < self.generation_time(recipient, day) <= until:
+                    due.append(recipient.model_copy(update={"delivery_date": day}))
+        return due
+
+
+class DailyUpdateFanOut:
+    """
+    Sends the daily updates of a run on a fixed number of workers.
+
+    A worker takes one user at a time through the whole update, so no more than workers updates are
+    in flight. Users are queued grouped by zip code: the weather context of a zip is built once, by
+    the first worker to get to it, shared with every user in the zip and dropped after the last one.
+    """
+
+    def __init__(
+        self,
+        config: DailyUpdatesConfig,
+        build_context: Callable[[str], Awaitable[str]],
+        send_update: Callable[[DailyUpdateRecipient, str | None], Awaitable[None]],
+        on_progress: Callable[[DailyUpdateProgress], Awaitable[None]] | None = None,
+    ):
+        self._num_workers = config.workers
+        self._progress_interval_seconds = config.progress_interval_seconds
+        self._build_context = build_context
+        self._send_update = send_update
+        self._on_progress = on_progress
+
+    async def run(self, recipients: list[DailyUpdateRecipient]) -> DailyUpdateProgress:
+        progress = DailyUpdateProgress(total=len(recipients))
+        queue: asyncio.Queue[DailyUpdateRecipient] = asyncio.Queue()
+        # users of a zip with the same prompt are sent back to back, their prompts share the longest
+        # prefix and most of them are answered from the first one when their profiles match too
+        for recipient in sorted(recipients, key=lambda r: (r.zip_code or "", r.prompt)):
+            queue.put_nowait(recipient)
+        # users of each zip still to be sent, its context is dropped once none are left
+        remaining = Counter(r.zip_code for r in recipients if r.zip_code)
+        contexts: dict[str, asyncio.Task[str | None]] = {}
+
+        started_at = time.monotonic()
+        _pending_updates.add(len(recipients))
+        reporter = asyncio.create_task(self._report_progress(progress, started_at))
+        workers = [
+            asyncio.create_task(self._work(queue, contexts, remaining, progress))
+            for _ in range(min(self._num_workers, len(recipients)))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in [*workers, *contexts.values(), reporter]:
+                task.cancel()
+            for task in [*workers, *contexts.values(), reporter]:
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await task
+            _pending_updates.add(-queue.qsize())
+            progress.elapsed_seconds = time.monotonic() - started_at
+
+        log.info(
+            "daily updates done: {} sent, {} failed, {} contexts built in {:.1f}s ({:.2f}/s)",
+            progress.sent,
+            progress.failed,
+            progress.contexts_built,
+            progress.elapsed_seconds,
+            progress.updates_per_second,
+        )
+        return progress
+
+    async def _work(
+        self,
+        queue: asyncio.Queue[DailyUpdateRecipient],
+        contexts: dict[str, asyncio.Task[str | None]],
+        remaining: Counter[str],
+        progress: DailyUpdateProgress,
+    ) -> None:
+        while not queue.empty():
+            recipient = queue.get_nowait()
+            start = time.perf_counter()
+            outcome = "sent"
+            try:
+                context = None
+                if recipient.zip_code:
+                    context = await self._get_context(
+                        recipient.zip_code, contexts, progress
+                    )
+                await self._send_update(recipient, context)
+                progress.sent += 1
+            except Exception as e:
+                outcome = "failed"
+                progress.failed += 1
+                log.error(
+                    "failed to send daily update to user {}: {}", recipient.user_id, e
+                )
+            finally:
+                _update_duration.record(time.perf_counter() - start)
+                _updates.add(1, {"outcome": outcome})
+                _pending_updates.add(-1)
+                if recipient.zip_code:
+                    remaining[recipient.zip_code] -= 1
+                    if remaining[recipient.zip_code] == 0:
+                        contexts.pop(recipient.zip_code, None)
+
+    async def _get_context(
+        self,
+        zip_code: str,
+        contexts: dict[str, asyncio.Task[str | None]],
+        progress: DailyUpdateProgress,
+    ) -> str | None:
+        if zip_code not in contexts:
+            contexts[zip_code] = asyncio.create_task(
+                self._build_zip_context(zip_code, progress)
+            )
+        # shielded, a worker being cancelled must not cancel the build other workers wait on
+        return await asyncio.shield(contexts[zip_code])
+
+    async def _build_zip_context(
+        self, zip_code: str, progress: DailyUpdateProgress
+    ) -> str | None:
+        start = time.perf_counter()
+        try:
+            context = await self._build_context(zip_code)
+            progress.contexts_built += 1
+            return context
+        except Exception as e:
+            # the queries of the zip fall back to building the context themselves
+            log.error("failed to build weather context for {}: {}", zip_code, e)
+            return None
+        finally:
+            _context_build_duration.record(time.perf_counter() - start)
+
+    async def _report_progress(
+        self, progress: DailyUpdateProgress, started_at: float
+    ) -> None:
+        while True:
+            await asyncio.sleep(self._progress_interval_seconds)
+            progress.elapsed_seconds = time.monotonic() - started_at
+            log.info(
+                "daily updates progress: {}/{} done, {} failed, {:.2f}/s",
+                progress.done,
+                progress.total,
+                progress.failed,
+                progress.updates_per_second,
+            )
+            if self._on_progress:
+                try:
+                    await self._on_progress(progress)
+                except Exception as e:
+                    log.error("failed to record daily update progress: {}", e)
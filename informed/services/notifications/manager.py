@@ -1,72 +1,140 @@
+import time
+from datetime import date
+from datetime import time as time_of_day
 from typing import cast
 from uuid import UUID
 
-from sqlalchemy import ColumnElement, select, update
+from pydantic import BaseModel
+from sqlalchemy import (
+    ColumnElement,
+    any_,
+    bindparam,
+    literal,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.types import Uuid as SQLAlchemyUuid
+from sqlmodel import col
 
-from informed.db import session_maker
+from informed.api.schema import NotificationCursor
+from informed.db import session_maker, transaction
 from informed.db_models.chat import AssistantMessage
 from informed.db_models.notification import Notification, NotificationStatus
 from informed.db_models.query import QueryState
-from informed.db_models.users import Settings, User
+from informed.db_models.shared_types import EnumAsString
+from informed.db_models.users import Settings, UserDetails
+
+# what users get to see, inlined so the planner can match the partial inbox index
+_VISIBLE = cast(
+    ColumnElement[bool],
+    Notification.status.not_in(  # type: ignore
+        [
+            literal(status, EnumAsString(NotificationStatus), literal_execute=True)
+            for status in [NotificationStatus.FAILED, NotificationStatus.PROCESSING]
+        ]
+    ),
+)
+_UNREAD_STATUSES = [NotificationStatus.READY, NotificationStatus.DELIVERED]
+
+
+class DailyUpdateRecipient(BaseModel):
+    user_id: UUID
+    prompt: str
+    zip_code: str | None = None
+    # local time the update should be in by, in the user's timezone
+    delivery_time: time_of_day
+    timezone: str
+    # set once the update is scheduled, the local date it is delivered for
+    delivery_date: date | None = None
+    # thread of an update that was started before, it is resumed there
+    chat_thread_id: UUID | None = None
 
 
 class NotificationsManager:
-    async def get_users_with_daily_updates(self) -> list[tuple[UUID, str]]:
-        """Get all users who have opted in for daily updates and their prompts."""
-        async with session_maker() as session:
+    async def get_users_with_daily_updates(self) -> list[DailyUpdateRecipient]:
+        """Get all users who have opted in for daily updates, their prompts and zip codes."""
+        async with session_maker(readonly=True) as session:
             #  Added the ignore because we are using JSONBFromPydantic to store configurations. It is stored as a JSONB but we are accessing it as a pydantic model which confuses mypy.
             stmt = (
-                select(User, Settings)
-                .join(Settings)
+                select(Settings, col(UserDetails.zip_code))
+                .outerjoin(
+                    UserDetails,
+                    cast(ColumnElement[bool], UserDetails.user_id == Settings.user_id),
+                )
                 .filter(
                     cast(
                         ColumnElement[bool],
-                        Settings.configurations["daily_updates"].as_boolean(),  # type: ignore
+                        # the key is inlined so the planner can match ix_settings_daily_updates
+                        Settings.configurations[  # type: ignore
+                            literal("daily_updates", literal_execute=True)
+                        ].as_boolean(),
                     )
                 )
             )
             result = await session.execute(stmt)
-            users_and_settings = result.unique().all()
 
             return [
-                (user.user_id, settings.configurations.daily_update_prompt)
-                for user, settings in users_and_settings
+                DailyUpdateRecipient(
+                    user_id=settings.user_id,
+                    prompt=settings.configurations.daily_update_prompt,
+                    zip_code=zip_code,
+                    delivery_time=settings.configurations.daily_update_time,
+                    timezone=settings.configurations.daily_update_timezone,
+                )
+                for settings, zip_code in result.all()
                 if settings.configurations.daily_update_prompt
             ]
 
     async def get_notifications_for_user(
-        self, user_id: UUID, limit: int = 10
+        self,
+        user_id: UUID,
+        limit: int = 10,
+        before: NotificationCursor | None = None,
+        session: AsyncSession | None = None,
     ) -> list[Notification]:
-        async with session_maker() as session:
-            result = await session.execute(
-                select(Notification)
-                .filter(
-                    cast(
-                        ColumnElement[bool],
-                        Notification.user_id == user_id
-                        and Notification.status
-                        not in [
-                            NotificationStatus.FAILED,
-                            NotificationStatus.PROCESSING,
-                        ],
-                    )
+        """The newest visible notifications of the user, older than before if given."""
+        stmt = select(Notification).filter(
+            cast(ColumnElement[bool], Notification.user_id == user_id),
+            _VISIBLE,
+        )
+        if before:
+            position = tuple_(Notification.created_at, Notification.notification_id)  # type: ignore
+            stmt = stmt.filter(
+                cast(
+                    ColumnElement[bool],
+                    position < (before.created_at, before.notification_id),
                 )
-                .order_by(Notification.created_at.desc())  # type: ignore
-                .limit(limit)
             )
+        stmt = stmt.order_by(
+            Notification.created_at.desc(),  # type: ignore
+            Notification.notification_id.desc(),  # type: ignore
+        ).limit(limit)
+        async with session_maker(session, readonly=True) as session:
+            result = await session.execute(stmt)
             return list(result.scalars().all())
 
-    async def mark_notifications_as_read(self, user_id: UUID) -> None:
-        async with session_maker() as session:
-            await session.execute(
-                update(Notification).where(
+    async def mark_notifications_as_read(
+        self, user_id: UUID, session: AsyncSession | None = None
+    ) -> list[UUID]:
+        """Marks every unread notification of the user as viewed in one statement, returns their ids."""
+        async with transaction(session) as session:
+            result = await session.execute(
+                update(Notification)
+                .where(
+                    cast(ColumnElement[bool], Notification.user_id == user_id),
                     cast(
                         ColumnElement[bool],
-                        Notification.user_id == user_id
-                        and Notification.status == NotificationStatus.READY,
-                    )
+                        Notification.status.in_(_UNREAD_STATUSES),  # type: ignore
+                    ),
                 )
+                .values(status=NotificationStatus.VIEWED, updated_at=time.time())
+                .returning(Notification.notification_id)  # type: ignore
             )
+            notification_ids = list(result.scalars().all())
+        return notification_ids
 
     async def create_notification(
         self, user_id: UUID, chat_thread_id: UUID, title: str, content: str
@@ -99,20 +167,39 @@ class NotificationsManager:
             await session.commit()
 
     async def bulk_update_notification_status(
-        self, notification_ids: list[UUID], status: NotificationStatus
-    ) -> None:
-        async with session_maker() as session:
-            await session.execute(
+        self,
+        user_id: UUID,
+        notification_ids: list[UUID],
+        status: NotificationStatus,
+        session: AsyncSession | None = None,
+    ) -> list[Notification]:
+        """
+        Moves the given notifications of the user to status in one statement, ids of other users'
+        notifications are ignored. Returns the updated notifications.
+        """
+        async with transaction(session) as session:
+            result = await session.execute(
                 update(Notification)
                 .where(
                     cast(
                         ColumnElement[bool],
-                        Notification.notification_id in notification_ids,
-                    )
+                        Notification.notification_id
+                        == any_(
+                            bindparam(
+                                "notification_ids",
+                                notification_ids,
+                                type_=ARRAY(SQLAlchemyUuid()),
+                            )
+                        ),
+                    ),
+                    cast(ColumnElement[bool], Notification.user_id == user_id),
                 )
-                .values(status=status)
+                .values(status=status, updated_at=time.time())
+                .returning(Notification)
+                .execution_options(populate_existing=True)
             )
-            await session.commit()
+            notifications = list(result.scalars().all())
+        return notifications
 
     async def update_notification_from_chat_thread(
         self,
@@ -120,23 +207,26 @@ class NotificationsManager:
         message: AssistantMessage,
         query_state: QueryState,
     ) -> None:
+        if query_state == QueryState.COMPLETED:
+            values = {
+                "status": NotificationStatus.READY,
+                "content": message.content,
+                "title": "Daily Update",
+            }
+        elif query_state.is_failed():
+            values = {"status": NotificationStatus.FAILED}
+        else:
+            return
+
         async with session_maker() as session:
-            result = await session.execute(
-                select(Notification).filter(
+            await session.execute(
+                update(Notification)
+                .where(
                     cast(
                         ColumnElement[bool],
                         Notification.chat_thread_id == chat_thread_id,
                     )
                 )
+                .values(**values, updated_at=time.time())
             )
-            notification = result.scalar_one_or_none()
-
-            if notification:
-                if query_state == QueryState.COMPLETED:
-                    notification.status = NotificationStatus.READY
-                    notification.content = message.content
-                    notification.title = "Daily Update"
-                elif query_state.is_failed():
-                    notification.status = NotificationStatus.FAILED
-
-                await session.commit()
+            await session.commit()
@@ -0,0 +1,233 @@
+import time
+from datetime import UTC, datetime, timedelta
+from typing import cast
+from uuid import UUID
+
+from loguru import logger as log
+from sqlalchemy import ColumnElement, and_, func, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col
+
+from informed.config import DailyUpdatesConfig
+from informed.db import session_maker
+from informed.db_models.daily_update import (
+    DailyUpdateDelivery,
+    DailyUpdateDeliveryStatus,
+    DailyUpdateRun,
+    DailyUpdateRunStatus,
+)
+from informed.services.notifications.daily_updates import DailyUpdateProgress
+from informed.services.notifications.manager import DailyUpdateRecipient
+
+# any constant works as long as nothing else takes the same advisory lock
+_RUN_START_LOCK_KEY = 4_210_049
+
+
+class DailyUpdateRunManager:
+    """
+    Records daily update runs and what they delivered, so that sending survives restarts.
+
+    Every delivery is keyed by (user, local delivery date): a user due twice, by overlapping or
+    repeated runs, is only claimed once. A run that stops heartbeating was interrupted, the next run
+    takes over its unsent deliveries and resumes them from their checkpoint, failed deliveries are
+    retried a few times the same way.
+    """
+
+    def __init__(self, config: DailyUpdatesConfig):
+        self._max_attempts = config.max_attempts
+        self._stale_run_seconds = config.stale_run_seconds
+
+    async def start_run(
+        self,
+        recipients: list[DailyUpdateRecipient],
+        due: list[DailyUpdateRecipient],
+        fencing_token: int | None = None,
+    ) -> tuple[UUID, list[DailyUpdateRecipient]] | None:
+        """
+        Starts a run with the due recipients not claimed by an earlier run and the deliveries left
+        over by interrupted or failed ones, the latter looked up in recipients. Returns None, and
+        records nothing, when there is nothing to send or a newer scheduler leader started runs.
+        """
+        now = time.time()
+        run = DailyUpdateRun(fencing_token=fencing_token)
+        async with session_maker() as session:
+            if fencing_token is not None and not await self._check_fencing_token(
+                session, fencing_token
+            ):
+                return None
+            session.add(run)
+            await session.flush()
+
+            interrupted = await session.execute(
+                update(DailyUpdateRun)
+                .where(
+                    col(DailyUpdateRun.status) == DailyUpdateRunStatus.RUNNING,
+                    col(DailyUpdateRun.heartbeat_at) < now - self._stale_run_seconds,
+                )
+                .values(status=DailyUpdateRunStatus.INTERRUPTED, finished_at=now)
+                .returning(col(DailyUpdateRun.run_id))
+            )
+            interrupted_run_ids = list(interrupted.scalars().all())
+            if interrupted_run_ids:
+                log.warning(
+                    "taking over daily update runs {}",
+                    ", ".join(map(str, interrupted_run_ids)),
+                )
+
+            # older deliveries are too late to be of any use
+            oldest_date = (datetime.now(UTC) - timedelta(days=1)).date()
+            by_user = {recipient.user_id: recipient for recipient in recipients}
+            taken_over = await session.execute(
+                update(DailyUpdateDelivery)
+                .where(
+                    col(DailyUpdateDelivery.delivery_date) >= oldest_date,
+                    # users that opted out since stay with the run they were left by, this one
+                    # would never send them anything
+                    col(DailyUpdateDelivery.user_id).in_(list(by_user)),
+                    col(DailyUpdateDelivery.attempts) < self._max_attempts,
+                    or_(
+                        and_(
+                            col(DailyUpdateDelivery.status)
+                            == DailyUpdateDeliveryStatus.PENDING,
+                            col(DailyUpdateDelivery.run_id).in_(interrupted_run_ids),
+                        ),
+                        col(DailyUpdateDelivery.status)
+                        == DailyUpdateDeliveryStatus.FAILED,
+                    ),
+                )
+                .values(
+                    run_id=run.run_id,
+                    status=DailyUpdateDeliveryStatus.PENDING,
+                    updated_at=now,
+                )
+                .returning(
+                    col(DailyUpdateDelivery.user_id),
+                    col(DailyUpdateDelivery.delivery_date),
+                    col(DailyUpdateDelivery.chat_thread_id),
+                )
+            )
+            resumed = [
+                by_user[user_id].model_copy(
+                    update={
+                        "delivery_date": delivery_date,
+                        "chat_thread_id": chat_thread_id,
+                    }
+                )
+                for user_id, delivery_date, chat_thread_id in taken_over.all()
+            ]
+
+            claimed: list[DailyUpdateRecipient] = []
+            if due:
+                result = await session.execute(
+                    insert(DailyUpdateDelivery)
+                    .values(
+                        [
+                            {
+                                "user_id": recipient.user_id,
+                                "delivery_date": recipient.delivery_date,
+                                "run_id": run.run_id,
+                                "status": DailyUpdateDeliveryStatus.PENDING,
+                                "attempts": 0,
+                                "created_at": now,
+                                "updated_at": now,
+                            }
+                            for recipient in due
+                        ]
+                    )
+                    .on_conflict_do_nothing()
+                    .returning(col(DailyUpdateDelivery.user_id))
+                )
+                claimed_user_ids = set(result.scalars().all())
+                claimed = [r for r in due if r.user_id in claimed_user_ids]
+
+            if not resumed and not claimed:
+                await session.rollback()
+                return None
+            run.total = len(resumed) + len(claimed)
+            await session.commit()
+        log.info(
+            "started daily update run {}: {} due, {} resumed",
+            run.run_id,
+            len(claimed),
+            len(resumed),
+        )
+        return run.run_id, resumed + claimed
+
+    async def _check_fencing_token(
+        self, session: AsyncSession, fencing_token: int
+    ) -> bool:
+        # serializes run starts, a deposed leader can not slip one in next to the new leader's
+        await session.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": _RUN_START_LOCK_KEY}
+        )
+        newest = await session.scalar(select(func.max(DailyUpdateRun.fencing_token)))
+        if newest is not None and newest > fencing_token:
+            log.warning(
+                "not starting a daily update run, fencing token {} is older than {}",
+                fencing_token,
+                newest,
+            )
+            return False
+        return True
+
+    async def checkpoint(
+        self, recipient: DailyUpdateRecipient, chat_thread_id: UUID
+    ) -> None:
+        """Records the thread the update is answered in, a retry answers it there."""
+        await self._update_delivery(recipient, chat_thread_id=chat_thread_id)
+
+    async def finish_delivery(
+        self, recipient: DailyUpdateRecipient, error: str | None = None
+    ) -> None:
+        await self._update_delivery(
+            recipient,
+            status=(
+                DailyUpdateDeliveryStatus.FAILED
+                if error
+                else DailyUpdateDeliveryStatus.SENT
+            ),
+            attempts=col(DailyUpdateDelivery.attempts) + 1,
+            error=error,
+        )
+
+    async def heartbeat(self, run_id: UUID, progress: DailyUpdateProgress) -> None:
+        await self._update_run(run_id, sent=progress.sent, failed=progress.failed)
+
+    async def finish_run(self, run_id: UUID, progress: DailyUpdateProgress) -> None:
+        await self._update_run(
+            run_id,
+            status=DailyUpdateRunStatus.COMPLETED,
+            finished_at=time.time(),
+            sent=progress.sent,
+            failed=progress.failed,
+        )
+
+    async def _update_delivery(
+        self, recipient: DailyUpdateRecipient, **values: object
+    ) -> None:
+        async with session_maker() as session:
+            await session.execute(
+                update(DailyUpdateDelivery)
+                .where(
+                    cast(
+                        ColumnElement[bool],
+                        DailyUpdateDelivery.user_id == recipient.user_id,
+                    ),
+                    cast(
+                        ColumnElement[bool],
+                        DailyUpdateDelivery.delivery_date == recipient.delivery_date,
+                    ),
+                )
+                .values(**values, updated_at=time.time())
+            )
+            await session.commit()
+
+    async def _update_run(self, run_id: UUID, **values: object) -> None:
+        async with session_maker() as session:
+            await session.execute(
+                update(DailyUpdateRun)
+                .where(cast(ColumnElement[bool], DailyUpdateRun.run_id == run_id))
+                .values(**values, heartbeat_at=time.time())
+            )
+            await session.commit()
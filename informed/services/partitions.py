@@ -0,0 +1,209 @@
+import re
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+
+from loguru import logger as log
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from informed.config import RetentionConfig
+from informed.db import DatabaseEngine
+
+# any constant works as long as nothing else takes the same advisory lock
+_MAINTENANCE_LOCK_KEY = 4_210_042
+
+
+@dataclass(frozen=True)
+class PartitionedTable:
+    name: str
+    # created_at holds epoch seconds rather than a timestamp
+    epoch_seconds: bool
+
+    @property
+    def default_partition(self) -> str:
+        return f"{self.name}_default"
+
+    def partition_name(self, month: datetime) -> str:
+        return f"{self.name}_p{month:%Y_%m}"
+
+    def parse_partition_month(self, partition_name: str) -> datetime | None:
+        match = re.fullmatch(rf"{self.name}_p(\d{{4}})_(\d{{2}})", partition_name)
+        if match is None:
+            return None
+        return datetime(int(match[1]), int(match[2]), 1, tzinfo=UTC)
+
+    def bound(self, month: datetime) -> str:
+        if self.epoch_seconds:
+            return repr(month.timestamp())
+        # spelled out in UTC, a bare timestamp would be read in the session's time zone
+        return f"'{month:%Y-%m-%d %H:%M:%S}+00'"
+
+
+PARTITIONED_TABLES = [
+    PartitionedTable("message", epoch_seconds=True),
+    PartitionedTable("queries", epoch_seconds=False),
+    PartitionedTable("notification", epoch_seconds=True),
+]
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+class PartitionMaintenance:
+    """
+    Keeps the monthly partitions of the tables that grow with every daily update.
+
+    Partitions are created a few months ahead. With a retention period configured, those entirely
+    past it are detached and then dropped or moved to the archive schema, so the tables hold a
+    constant number of months. Each step commits on its own, a step that fails or can not get its locks in time is
+    retried on the next run. Replicas take turns through an advisory lock.
+    """
+
+    def __init__(self, config: RetentionConfig):
+        self._retention_days = config.retention_days
+        self._archive_schema = config.archive_schema
+        self._premake_months = config.premake_months
+        self._lock_timeout_ms = int(config.lock_timeout_seconds * 1000)
+
+    async def maintain_partitions(self) -> None:
+        async with DatabaseEngine.get().connect() as conn:
+            locked = await conn.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"),
+                {"key": _MAINTENANCE_LOCK_KEY},
+            )
+            await conn.commit()
+            if not locked:
+                log.debug("partition maintenance is running elsewhere, skipping")
+                return
+            try:
+                now = datetime.now(UTC)
+                for table in PARTITIONED_TABLES:
+                    await self._create_partitions(conn, table, now)
+                    if self._retention_days is not None:
+                        await self._expire_partitions(
+                            conn, table, now - timedelta(days=self._retention_days)
+                        )
+            finally:
+                await conn.rollback()
+                await conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"),
+                    {"key": _MAINTENANCE_LOCK_KEY},
+                )
+                await conn.commit()
+
+    async def _set_lock_timeout(self, conn: AsyncConnection) -> None:
+        # only for the current transaction, the connection goes back to the pool afterwards
+        await conn.execute(text(f"SET LOCAL lock_timeout = {self._lock_timeout_ms}"))
+
+    async def _partition_names(
+        self, conn: AsyncConnection, table: PartitionedTable
+    ) -> set[str]:
+        result = await conn.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i"
+                " JOIN pg_class c ON c.oid = i.inhrelid"
+                " WHERE i.inhparent = CAST(:table AS regclass)"
+            ),
+            {"table": table.name},
+        )
+        return set(result.scalars())
+
+    async def _create_partitions(
+        self, conn: AsyncConnection, table: PartitionedTable, now: datetime
+    ) -> None:
+        existing = await self._partition_names(conn, table)
+        current = month_start(now)
+        for offset in range(self._premake_months + 1):
+            month = add_months(current, offset)
+            name = table.partition_name(month)
+            if name in existing:
+                continue
+            try:
+                await self._set_lock_timeout(conn)
+                await self._create_partition(conn, table, month)
+                await conn.commit()
+                log.info("created partition {}", name)
+            except Exception as e:
+                await conn.rollback()
+                log.error("failed to create partition {}: {}", name, e)
+
+    async def _create_partition(
+        self, conn: AsyncConnection, table: PartitionedTable, month: datetime
+    ) -> None:
+        name = table.partition_name(month)
+        lower, upper = table.bound(month), table.bound(add_months(month, 1))
+        in_range = f"created_at >= {lower} AND created_at < {upper}"
+        strays = await conn.scalar(
+            text(
+                f"SELECT EXISTS (SELECT 1 FROM {table.default_partition} WHERE {in_range})"  # noqa: S608
+            )
+        )
+        if not strays:
+            await conn.execute(
+                text(
+                    f"CREATE TABLE {name} PARTITION OF {table.name}"
+                    f" FOR VALUES FROM ({lower}) TO ({upper})"
+                )
+            )
+            return
+        # rows written while the partition was missing went to the default partition, attaching
+        # fails while they are there so they are moved over first
+        log.warning("moving rows of {} out of the default partition", name)
+        await conn.execute(
+            text(f"CREATE TABLE {name} (LIKE {table.name} INCLUDING DEFAULTS)")
+        )
+        await conn.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {table.default_partition} WHERE {in_range}"  # noqa: S608
+                f" RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+            )
+        )
+        await conn.execute(
+            text(
+                f"ALTER TABLE {table.name} ATTACH PARTITION {name}"
+                f" FOR VALUES FROM ({lower}) TO ({upper})"
+            )
+        )
+
+    async def _expire_partitions(
+        self, conn: AsyncConnection, table: PartitionedTable, cutoff: datetime
+    ) -> None:
+        for name in sorted(await self._partition_names(conn, table)):
+            month = table.parse_partition_month(name)
+            if month is None or add_months(month, 1) > cutoff:
+                continue
+            try:
+                await self._set_lock_timeout(conn)
+                # with a default partition around detaching can not be done concurrently, the
+                # lock timeout keeps us from stalling writes behind a long running transaction
+                await conn.execute(
+                    text(f"ALTER TABLE {table.name} DETACH PARTITION {name}")
+                )
+                if self._archive_schema:
+                    await conn.execute(
+                        text(f"CREATE SCHEMA IF NOT EXISTS {self._archive_schema}")
+                    )
+                    await conn.execute(
+                        text(f"ALTER TABLE {name} SET SCHEMA {self._archive_schema}")
+                    )
+                else:
+                    await conn.execute(text(f"DROP TABLE {name}"))
+                await conn.commit()
+                log.info(
+                    "expired partition {}, {}",
+                    name,
+                    (
+                        f"archived to {self._archive_schema}"
+                        if self._archive_schema
+                        else "dropped"
+                    ),
+                )
+            except Exception as e:
+                await conn.rollback()
+                log.error("failed to expire partition {}: {}", name, e)
@@ -0,0 +1,252 @@
+import asyncio
+import contextlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any
+from uuid import UUID, uuid4
+
+from loguru import logger as log
+from pydantic import BaseModel
+from redis.asyncio import Redis
+
+from informed.config import UserCacheConfig
+from informed.db_models.users import (
+    Settings,
+    User,
+    UserAllergies,
+    UserDetails,
+    UserHealthConditions,
+    UserMedicalDetails,
+    UserMedications,
+    WeatherSensitivities,
+)
+
+# caches the user unless the entry is at a newer profile version already
+_SET = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'profile_version'))
+if current and current > tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'profile_version', ARGV[1], 'data', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+# replaces the entry with the version alone, older versions can not be cached anymore
+_INVALIDATE = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'profile_version'))
+if current and current > tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], 'profile_version', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+class UserSnapshot(BaseModel):
+    """A fully loaded user, serialized as plain data so it can be kept outside of a session."""
+
+    user: dict[str, Any]
+    details: dict[str, Any] | None = None
+    settings: dict[str, Any] | None = None
+    medical_details: dict[str, Any] | None = None
+    health_conditions: list[dict[str, Any]] = []
+    medications: list[dict[str, Any]] = []
+    allergies: list[dict[str, Any]] = []
+    weather_sensitivities: list[dict[str, Any]] = []
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        """The user must have been loaded with the FULL profile."""
+        snapshot = cls(user=user.model_dump(mode="json"))
+        if user.details:
+            snapshot.details = user.details.model_dump(mode="json")
+        if user.settings:
+            snapshot.settings = user.settings.model_dump(mode="json")
+        medical_details = user.medical_details
+        if medical_details:
+            snapshot.medical_details = medical_details.model_dump(mode="json")
+            snapshot.health_conditions = [
+                c.model_dump(mode="json") for c in medical_details.health_conditions
+            ]
+            snapshot.medications = [
+                m.model_dump(mode="json") for m in medical_details.medications
+            ]
+            snapshot.allergies = [
+                a.model_dump(mode="json") for a in medical_details.allergies
+            ]
+            snapshot.weather_sensitivities = [
+                s.model_dump(mode="json") for s in medical_details.weather_sensitivities
+            ]
+        return snapshot
+
+    def to_user(self) -> User:
+        """Builds a new user graph that is not attached to any session, so it must not be written back."""
+        user = User.model_validate(self.user)
+        if self.details is not None:
+            user.details = UserDetails.model_validate(self.details)
+        if self.settings is not None:
+            user.settings = Settings.model_validate(self.settings)
+        if self.medical_details is not None:
+            medical_details = UserMedicalDetails.model_validate(self.medical_details)
+            medical_details.health_conditions = [
+                UserHealthConditions.model_validate(c) for c in self.health_conditions
+            ]
+            medical_details.medications = [
+                UserMedications.model_validate(m) for m in self.medications
+            ]
+            medical_details.allergies = [
+                UserAllergies.model_validate(a) for a in self.allergies
+            ]
+            medical_details.weather_sensitivities = [
+                WeatherSensitivities.model_validate(s)
+                for s in self.weather_sensitivities
+            ]
+            user.medical_details = medical_details
+        return user
+
+
+class UserCache:
+    """
+    Users cached in two tiers: a small in-process LRU in front of Redis.
+
+    Entries are kept by user id. Both tiers hold the serialized snapshot and a new user graph is built
+    on every hit, so callers can not change what is cached. Invalidations drop the user from Redis and
+    are broadcast over pub/sub to the in-process tier of every replica.
+
+    Redis entries hold the profile version of the snapshot, an invalidation leaves the new version
+    behind. A user loaded before a change committed is then not cached over it.
+    """
+
+    def __init__(self, redis_client: Redis, config: UserCacheConfig):
+        self._redis_client = redis_client
+        self._key_prefix = config.key_prefix
+        self._invalidation_channel = config.invalidation_channel
+        self._ttl_seconds = config.ttl_seconds
+        self._local_max_size = config.local_max_size
+        self._local_ttl_seconds = config.local_ttl_seconds
+        self._reconnect_delay_seconds = config.reconnect_delay_seconds
+        self._origin = str(uuid4())
+        # cache key -> (expires at, serialized snapshot)
+        self._local: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._listen_task: asyncio.Task | None = None
+
+    async def get_by_id(self, user_id: UUID) -> User | None:
+        return await self._get(self._id_key(user_id))
+
+    async def set(self, user: User) -> None:
+        """Caches a user loaded with the FULL profile, unless a newer version was cached since."""
+        data = UserSnapshot.from_user(user).model_dump_json()
+        key = self._id_key(user.user_id)
+        try:
+            cached = await self._redis_client.eval(  # type: ignore
+                _SET, 1, key, str(user.profile_version), data, str(self._ttl_seconds)
+            )
+        except Exception as e:
+            log.error("failed to cache user {}: {}", user.user_id, e)
+            return
+        if cached:
+            self._set_local(key, data)
+
+    async def invalidate(self, user: User) -> None:
+        """Called with the user at the profile version of the change."""
+        key = self._id_key(user.user_id)
+        keys = [key]
+        self._drop_local(keys)
+        try:
+            await self._redis_client.eval(  # type: ignore
+                _INVALIDATE, 1, key, str(user.profile_version), str(self._ttl_seconds)
+            )
+            await self._redis_client.publish(
+                self._invalidation_channel,
+                json.dumps({"origin": self._origin, "keys": keys}),
+            )
+        except Exception as e:
+            log.error("failed to invalidate cached user {}: {}", user.user_id, e)
+
+    async def start(self) -> None:
+        if not self._listen_task:
+            self._listen_task = asyncio.create_task(self._listen())
+            log.info("user cache invalidation listener started")
+
+    async def stop(self) -> None:
+        if self._listen_task:
+            self._listen_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._listen_task
+            self._listen_task = None
+            log.info("user cache invalidation listener stopped")
+
+    def _id_key(self, user_id: UUID) -> str:
+        return f"{self._key_prefix}profile:{user_id}"
+
+    async def _get(self, key: str) -> User | None:
+        data = self._get_local(key)
+        if data is None:
+            try:
+                value = await self._redis_client.hget(key, "data")  # type: ignore
+            except Exception as e:
+                log.error("failed to read cached user: {}", e)
+                return None
+            # missing, or only the version left by an invalidation
+            if value is None:
+                return None
+            data = value.decode() if isinstance(value, bytes) else str(value)
+            self._set_local(key, data)
+        return UserSnapshot.model_validate_json(data).to_user()
+
+    def _get_local(self, key: str) -> str | None:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return data
+
+    def _set_local(self, key: str, data: str) -> None:
+        self._local[key] = (time.monotonic() + self._local_ttl_seconds, data)
+        self._local.move_to_end(key)
+        while len(self._local) > self._local_max_size:
+            self._local.popitem(last=False)
+
+    def _drop_local(self, keys: list[str]) -> None:
+        for key in keys:
+            self._local.pop(key, None)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(self._invalidation_channel)
+                    # invalidations sent while we were disconnected are lost, start over
+                    self._local.clear()
+                    while True:
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=1.0
+                        )
+                        if message is not None:
+                            self._handle_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error("user cache subscription failed, reconnecting: {}", e)
+                await asyncio.sleep(self._reconnect_delay_seconds)
+
+    def _handle_message(self, message: dict) -> None:
+        data = message["data"]
+        if isinstance(data, bytes):
+            data = data.decode()
+        try:
+            invalidation = json.loads(data)
+        except (json.JSONDecodeError, TypeError):
+            log.warning("ignoring malformed user cache invalidation")
+            return
+        # our own invalidations were already applied locally
+        if invalidation.get("origin") == self._origin:
+            return
+        self._drop_local(invalidation.get("keys", []))
@@ -0,0 +1,50 @@
+from enum import Enum
+
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+from sqlalchemy.sql.base import ExecutableOption
+
+from informed.db_models.users import User, UserMedicalDetails
+
+
+class UserLoadProfile(str, Enum):
+    """
+    What gets loaded along with a user. Relationships of the user models are not loaded by default,
+    every query for a user picks the profile its call site needs.
+    """
+
+    # the user row only, enough to authenticate and authorize a request
+    AUTH = "auth"
+    # what the assistant prompts are built from
+    PROMPT = "prompt"
+    # everything, for the profile endpoints
+    FULL = "full"
+
+
+def user_load_options(profile: UserLoadProfile) -> list[ExecutableOption]:
+    """
+    Loader options for the profile. One-to-one relationships are joined since they add no rows,
+    collections are loaded with a separate query each so they never multiply the joined rows.
+    """
+    if profile == UserLoadProfile.AUTH:
+        return [raiseload("*")]
+
+    if profile == UserLoadProfile.PROMPT:
+        return [
+            joinedload(User.details),  # type: ignore
+            joinedload(User.medical_details).options(  # type: ignore
+                selectinload(UserMedicalDetails.health_conditions),  # type: ignore
+                selectinload(UserMedicalDetails.weather_sensitivities),  # type: ignore
+            ),
+            raiseload("*"),
+        ]
+
+    return [
+        joinedload(User.details),  # type: ignore
+        joinedload(User.settings, innerjoin=True),
+        joinedload(User.medical_details).options(  # type: ignore
+            selectinload(UserMedicalDetails.health_conditions),  # type: ignore
+            selectinload(UserMedicalDetails.medications),  # type: ignore
+            selectinload(UserMedicalDetails.allergies),  # type: ignore
+            selectinload(UserMedicalDetails.weather_sensitivities),  # type: ignore
+        ),
+    ]
@@ -2,25 +2,47 @@ from typing import cast
 from uuid import UUID
 
 from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import ColumnElement, select
 
 from informed.config import Config
 from informed.db import session_maker
 from informed.db_models.users import User
+from informed.users.cache import UserCache
+from informed.users.loaders import UserLoadProfile, user_load_options
 
 
 class UserManager:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, user_cache: UserCache | None = None):
         self.config = config
+        self.user_cache = user_cache
 
-    async def get_user(self, user_id: UUID) -> User:
-        async with session_maker() as session:
+    async def get_user(
+        self,
+        user_id: UUID,
+        profile: UserLoadProfile = UserLoadProfile.AUTH,
+        session: AsyncSession | None = None,
+    ) -> User:
+        # cached users are not attached to a session, callers passing their own session get theirs
+        user_cache = self.user_cache if session is None else None
+        if user_cache:
+            cached_user = await user_cache.get_by_id(user_id)
+            if cached_user:
+                return cached_user
+            # the cache serves every profile, so fill it with everything
+            profile = UserLoadProfile.FULL
+
+        async with session_maker(session) as session:
             result = await session.execute(
-                select(User).filter(cast(ColumnElement[bool], User.user_id == user_id))
+                select(User)
+                .filter(cast(ColumnElement[bool], User.user_id == user_id))
+                .options(*user_load_options(profile))
             )
             user = result.unique().scalar_one_or_none()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
             )
+        if user_cache:
+            await user_cache.set(user)
         return user
@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+import secrets
+from uuid import UUID
+
+from loguru import logger as log
+from pydantic import BaseModel, ValidationError
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from informed.config import SessionConfig
+
+
+class UserSession(BaseModel):
+    user_id: UUID
+    profile_version: int
+
+
+class SessionStore:
+    """
+    Login sessions kept as Redis hashes of the user id and the profile version the session last saw.
+
+    Sessions expire after ttl_seconds without a request. Instead of an EXPIRE per request, the tokens
+    used in the meantime are collected and their expiry is pushed back in one pipeline every
+    refresh_interval_seconds.
+    """
+
+    def __init__(self, redis_client: Redis, config: SessionConfig):
+        self._redis_client = redis_client
+        self._key_prefix = config.key_prefix
+        self._ttl_seconds = config.ttl_seconds
+        self._refresh_interval_seconds = config.refresh_interval_seconds
+        self._used_tokens: set[str] = set()
+        self._refresh_task: asyncio.Task | None = None
+
+    async def create(self, user_id: UUID, profile_version: int) -> str:
+        session_token = secrets.token_urlsafe()
+        key = self._key(session_token)
+        async with self._redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(
+                key,
+                mapping={
+                    "user_id": str(user_id),
+                    "profile_version": profile_version,
+                },
+            )
+            pipe.expire(key, self._ttl_seconds)
+            await pipe.execute()
+        return session_token
+
+    async def get(self, session_token: str) -> UserSession | None:
+        key = self._key(session_token)
+        try:
+            fields = await self._redis_client.hgetall(key)  # type: ignore
+        except ResponseError as e:
+            # not a session hash
+            log.warning("ignoring malformed session: {}", e)
+            return None
+        if not fields:
+            return None
+        fields = {
+            (k.decode() if isinstance(k, bytes) else k): (
+                v.decode() if isinstance(v, bytes) else v
+            )
+            for k, v in fields.items()
+        }
+        try:
+            user_session = UserSession.model_validate(fields)
+        except ValidationError as e:
+            # e.g. left over from an older layout, the user has to log in again
+            log.warning("deleting malformed session: {}", e)
+            await self.delete(session_token)
+            return None
+        self._used_tokens.add(session_token)
+        return user_session
+
+    async def set_profile_version(
+        self, session_token: str, profile_version: int
+    ) -> None:
+        key = self._key(session_token)
+        # HSET would bring a session deleted in the meantime back without a user or an expiry
+        if await self._redis_client.exists(key):
+            await self._redis_client.hset(  # type: ignore
+                key, "profile_version", str(profile_version)
+            )
+
+    async def delete(self, session_token: str) -> bool:
+        self._used_tokens.discard(session_token)
+        return bool(await self._redis_client.delete(self._key(session_token)))
+
+    async def start(self) -> None:
+        if not self._refresh_task:
+            self._refresh_task = asyncio.create_task(self._refresh_expiry())
+            log.info("session expiry refresh started")
+
+    async def stop(self) -> None:
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._refresh_task
+            self._refresh_task = None
+            await self._flush_used_tokens()
+            log.info("session expiry refresh stopped")
+
+    def _key(self, session_token: str) -> str:
+        return self._key_prefix + session_token
+
+    async def _refresh_expiry(self) -> None:
+        while True:
+            await asyncio.sleep(self._refresh_interval_seconds)
+            await self._flush_used_tokens()
+
+    async def _flush_used_tokens(self) -> None:
+        if not self._used_tokens:
+            return
+        tokens, self._used_tokens = self._used_tokens, set()
+        try:
+            async with self._redis_client.pipeline(transaction=False) as pipe:
+                for session_token in tokens:
+                    pipe.expire(self._key(session_token), self._ttl_seconds)
+                await pipe.execute()
+        except Exception as e:
+            log.error("failed to refresh expiry of {} sessions: {}", len(tokens), e)
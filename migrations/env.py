@@ -1,5 +1,6 @@
 import asyncio
 import os
+import re
 from logging.config import fileConfig
 
 from alembic import context
@@ -14,6 +15,14 @@ if config.config_file_name is not None:
 
 target_metadata = SQLModel.metadata
 
+# monthly partitions are created and dropped by the partition maintenance job, only their parent
+# tables are part of the metadata
+PARTITION_NAME = re.compile(r".+_(p\d{4}_\d{2}|default)")
+
+
+def include_name(name, type_, parent_names) -> bool:
+    return not (type_ == "table" and PARTITION_NAME.fullmatch(name))
+
 
 def do_run_migrations(connection) -> None:
     # Need to hack the "vector" type into postgres dialect schema types.
@@ -21,7 +30,11 @@ def do_run_migrations(connection) -> None:
     # Context: https://github.com/sqlalchemy/alembic/discussions/1324
     connection.dialect.ischema_names["vector"] = Vector
 
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
@@ -0,0 +1,29 @@
+"""add_query_version
+
+Revision ID: 5c1e7b9d2f40
+Revises: a836a1102523
+Create Date: 2026-10-19 10:12:41.502113+00:00
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5c1e7b9d2f40"
+down_revision: str | None = "a836a1102523"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "queries",
+        sa.Column("version", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("queries", "version")
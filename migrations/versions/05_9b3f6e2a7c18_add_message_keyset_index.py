@@ -0,0 +1,41 @@
+"""add_message_keyset_index
+
+Revision ID: 9b3f6e2a7c18
+Revises: 5c1e7b9d2f40
+Create Date: 2026-10-19 16:24:08.317512+00:00
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9b3f6e2a7c18"
+down_revision: str | None = "5c1e7b9d2f40"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY does not block writes but can not run inside a transaction.
+    # A build that fails leaves an invalid index behind, drop it before running this again.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_message_chat_thread_id_created_at_message_id",
+            "message",
+            ["chat_thread_id", "created_at", "message_id"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_message_chat_thread_id_created_at_message_id",
+            table_name="message",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,29 @@
+"""add_user_profile_version
+
+Revision ID: 3d8a5f1c9e27
+Revises: 9b3f6e2a7c18
+Create Date: 2026-10-19 16:40:12.118034+00:00
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3d8a5f1c9e27"
+down_revision: str | None = "9b3f6e2a7c18"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("profile_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "profile_version")
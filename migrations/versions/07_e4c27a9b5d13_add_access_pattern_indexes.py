@@ -0,0 +1,64 @@
+"""add_access_pattern_indexes
+
+Revision ID: e4c27a9b5d13
+Revises: 3d8a5f1c9e27
+Create Date: 2026-10-19 17:52:36.604219+00:00
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e4c27a9b5d13"
+down_revision: str | None = "3d8a5f1c9e27"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY does not block writes but can not run inside a transaction.
+    # A build that fails leaves an invalid index behind, drop it before running this again.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_queries_user_id_created_at",
+            "queries",
+            ["user_id", "created_at"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_message_pending",
+            "message",
+            ["chat_thread_id", "created_at"],
+            postgresql_where=sa.text("source = 'webapp' AND NOT acknowledged"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_settings_daily_updates",
+            "settings",
+            ["user_id"],
+            postgresql_where=sa.text(
+                "CAST(configurations ->> 'daily_updates' AS BOOLEAN)"
+            ),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index_name, table_name in [
+            ("ix_settings_daily_updates", "settings"),
+            ("ix_message_pending", "message"),
+            ("ix_queries_user_id_created_at", "queries"),
+        ]:
+            op.drop_index(
+                index_name,
+                table_name=table_name,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
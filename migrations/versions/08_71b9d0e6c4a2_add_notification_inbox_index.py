@@ -0,0 +1,43 @@
+"""add_notification_inbox_index
+
+Revision ID: 71b9d0e6c4a2
+Revises: e4c27a9b5d13
+Create Date: 2026-10-19 18:31:05.772940+00:00
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "71b9d0e6c4a2"
+down_revision: str | None = "e4c27a9b5d13"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+VISIBLE = "status NOT IN ('FAILED', 'PROCESSING')"
+
+
+def upgrade() -> None:
+    # the inbox is paged by (created_at, notification_id), the id makes the index serve the whole order
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_notification_inbox",
+            "notification",
+            ["user_id", "created_at", "notification_id"],
+            postgresql_where=sa.text(VISIBLE),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_notification_inbox",
+            table_name="notification",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
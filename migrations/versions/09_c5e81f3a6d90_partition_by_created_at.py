@@ -0,0 +1,316 @@
+"""partition_by_created_at
+
+Revision ID: c5e81f3a6d90
+Revises: 71b9d0e6c4a2
+Create Date: 2026-10-19 19:12:44.318506+00:00
+
+"""
+
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c5e81f3a6d90"
+down_revision: str | None = "71b9d0e6c4a2"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# months created ahead of time, later months are created by the partition maintenance job
+PREMAKE_MONTHS = 2
+# rows copied per transaction, writes to a batch being copied wait for it
+BATCH_SIZE = 5000
+# the swap waits this long at most for the table, a migration that times out can be run again
+SWAP_LOCK_TIMEOUT = "10s"
+
+
+@dataclass
+class Index:
+    name: str
+    columns: list[str]
+    where: str | None = None
+
+
+@dataclass
+class ForeignKey:
+    column: str
+    references: str
+    ondelete: str | None = None
+
+
+@dataclass
+class Table:
+    name: str
+    id_column: str
+    # created_at holds epoch seconds rather than a timestamp
+    epoch_seconds: bool
+    foreign_keys: list[ForeignKey] = field(default_factory=list)
+    indexes: list[Index] = field(default_factory=list)
+    # naive timestamps, in UTC, that become timestamptz with the partitioning
+    utc_columns: list[str] = field(default_factory=list)
+
+
+TABLES = [
+    Table(
+        "message",
+        "message_id",
+        epoch_seconds=True,
+        foreign_keys=[
+            ForeignKey("chat_thread_id", "chat_thread.chat_thread_id", "CASCADE")
+        ],
+        indexes=[
+            Index("ix_message_chat_thread_id", ["chat_thread_id"]),
+            Index(
+                "ix_message_chat_thread_id_created_at_message_id",
+                ["chat_thread_id", "created_at", "message_id"],
+            ),
+            Index(
+                "ix_message_pending",
+                ["chat_thread_id", "created_at"],
+                "source = 'webapp' AND NOT acknowledged",
+            ),
+        ],
+    ),
+    Table(
+        "queries",
+        "query_id",
+        epoch_seconds=False,
+        foreign_keys=[ForeignKey("user_id", "users.user_id")],
+        indexes=[Index("ix_queries_user_id_created_at", ["user_id", "created_at"])],
+        utc_columns=["created_at", "updated_at"],
+    ),
+    Table(
+        "notification",
+        "notification_id",
+        epoch_seconds=True,
+        foreign_keys=[
+            ForeignKey("user_id", "users.user_id"),
+            ForeignKey("chat_thread_id", "chat_thread.chat_thread_id", "CASCADE"),
+        ],
+        indexes=[
+            Index("ix_notification_chat_thread_id", ["chat_thread_id"]),
+            Index(
+                "ix_notification_inbox",
+                ["user_id", "created_at", "notification_id"],
+                "status NOT IN ('FAILED', 'PROCESSING')",
+            ),
+        ],
+    ),
+]
+
+
+def create_monthly_partitions(table: Table, parent: str) -> None:
+    """One partition per month from the oldest row up to a few months from now."""
+    if table.epoch_seconds:
+        oldest = "to_timestamp(min(created_at)) AT TIME ZONE 'UTC'"
+        bound = "extract(epoch FROM {} AT TIME ZONE 'UTC')"
+    else:
+        oldest = "min(created_at)"
+        bound = "{} AT TIME ZONE 'UTC'"
+    op.execute(
+        f"""
+        DO $$
+        DECLARE
+            month timestamp;
+        BEGIN
+            SELECT date_trunc('month', coalesce({oldest}, now() AT TIME ZONE 'UTC'))
+            INTO month FROM {table.name};
+            WHILE month <= date_trunc('month', now() AT TIME ZONE 'UTC')
+                    + interval '{PREMAKE_MONTHS} months' LOOP
+                EXECUTE 'CREATE TABLE '
+                    || quote_ident('{table.name}_p' || to_char(month, 'YYYY_MM'))
+                    || ' PARTITION OF {parent} FOR VALUES FROM ('
+                    || quote_literal({bound.format("month")})
+                    || ') TO ('
+                    || quote_literal({bound.format("(month + interval '1 month')")})
+                    || ')';
+                month := month + interval '1 month';
+            END LOOP;
+        END $$;
+        """
+    )
+
+
+def create_shadow(table: Table, shadow: str, partitioned: bool) -> None:
+    """
+    Creates the empty table the rows are copied to, with its keys, so that those are not built
+    over the copied rows while holding a lock.
+    """
+    # the type of a partition key can not be changed, it is set on a template the shadow copies
+    template = f"{shadow}_template"
+    op.execute(f"CREATE TABLE {template} (LIKE {table.name} INCLUDING DEFAULTS)")
+    for column in table.utc_columns:
+        op.execute(
+            f"ALTER TABLE {template} ALTER COLUMN {column}"
+            f" TYPE {'timestamptz' if partitioned else 'timestamp'}"
+        )
+    op.execute(
+        f"CREATE TABLE {shadow} (LIKE {template} INCLUDING DEFAULTS)"
+        + (" PARTITION BY RANGE (created_at)" if partitioned else "")
+    )
+    op.drop_table(template)
+    if partitioned:
+        # catches rows of months without a partition until the maintenance job moves them
+        op.execute(f"CREATE TABLE {table.name}_default PARTITION OF {shadow} DEFAULT")
+        create_monthly_partitions(table, shadow)
+    # the primary key of a partitioned table has to contain the partition key
+    op.create_primary_key(
+        f"{shadow}_pkey",
+        shadow,
+        [table.id_column, "created_at"] if partitioned else [table.id_column],
+    )
+    for foreign_key in table.foreign_keys:
+        referent_table, referent_column = foreign_key.references.split(".")
+        op.create_foreign_key(
+            f"{shadow}_{foreign_key.column}_fkey",
+            shadow,
+            referent_table,
+            [foreign_key.column],
+            [referent_column],
+            ondelete=foreign_key.ondelete,
+        )
+
+
+def sync_to_shadow(table: Table, shadow: str) -> None:
+    """Applies every write to the table to the shadow too, while the rows are copied."""
+    # in UTC, as the naive timestamps are, whatever the time zone of the writing session
+    op.execute(
+        f"""
+        CREATE FUNCTION {shadow}_sync() RETURNS trigger LANGUAGE plpgsql
+        SET timezone = 'UTC' AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                DELETE FROM {shadow} WHERE {table.id_column} = OLD.{table.id_column};
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                INSERT INTO {shadow} VALUES (NEW.*);
+            END IF;
+            RETURN NULL;
+        END $$
+        """
+    )
+    op.execute(
+        f"CREATE TRIGGER {shadow}_sync AFTER INSERT OR UPDATE OR DELETE ON {table.name}"
+        f" FOR EACH ROW EXECUTE FUNCTION {shadow}_sync()"
+    )
+
+
+def copy_rows(table: Table, shadow: str) -> None:
+    """
+    Copies the rows in batches of their own transaction. A batch is locked while it is copied, so a
+    write to one of its rows waits and is then applied to the shadow by the trigger. Rows the
+    trigger got to first are skipped.
+    """
+    bind = op.get_bind()
+    last_id: str | None = "00000000-0000-0000-0000-000000000000"
+    while last_id is not None:
+        last_id = bind.scalar(
+            sa.text(
+                f"""
+                WITH batch AS (
+                    SELECT * FROM {table.name}
+                    WHERE {table.id_column} > CAST(:last_id AS uuid)
+                    ORDER BY {table.id_column}
+                    LIMIT {BATCH_SIZE}
+                    FOR SHARE
+                ), copied AS (
+                    INSERT INTO {shadow} SELECT * FROM batch ON CONFLICT DO NOTHING
+                )
+                SELECT CAST({table.id_column} AS text) FROM batch
+                ORDER BY {table.id_column} DESC LIMIT 1
+                """  # noqa: S608
+            ),
+            {"last_id": last_id},
+        )
+
+
+def build_indexes(table: Table, shadow: str, partitioned: bool) -> None:
+    """
+    Builds the indexes without blocking writes, under a temporary name until the swap. Concurrent
+    builds are not possible on a partitioned table, each partition's index is built on its own and
+    then attached to the parent's.
+    """
+    bind = op.get_bind()
+    partitions = (
+        bind.execute(
+            sa.text(
+                "SELECT c.relname FROM pg_inherits i"
+                " JOIN pg_class c ON c.oid = i.inhrelid"
+                " WHERE i.inhparent = CAST(:table AS regclass)"
+            ),
+            {"table": shadow},
+        )
+        .scalars()
+        .all()
+        if partitioned
+        else []
+    )
+    for index in table.indexes:
+        definition = f"({', '.join(index.columns)})" + (
+            f" WHERE {index.where}" if index.where else ""
+        )
+        if not partitioned:
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY {index.name}_new ON {shadow} {definition}"
+            )
+            continue
+        op.execute(f"CREATE INDEX {index.name}_new ON ONLY {shadow} {definition}")
+        for partition in partitions:
+            partition_index = f"{index.name}_{partition.removeprefix(f'{table.name}_')}"
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY {partition_index} ON {partition} {definition}"
+            )
+            op.execute(
+                f"ALTER INDEX {index.name}_new ATTACH PARTITION {partition_index}"
+            )
+
+
+def swap(table: Table, shadow: str) -> None:
+    """Replaces the table with its shadow, the only step that blocks the table, briefly."""
+    op.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+    op.execute(f"LOCK TABLE {table.name} IN ACCESS EXCLUSIVE MODE")
+    op.drop_table(table.name)
+    op.execute(f"DROP FUNCTION {shadow}_sync()")
+    op.rename_table(shadow, table.name)
+    op.execute(
+        f"ALTER TABLE {table.name} RENAME CONSTRAINT {shadow}_pkey TO {table.name}_pkey"
+    )
+    for foreign_key in table.foreign_keys:
+        op.execute(
+            f"ALTER TABLE {table.name} RENAME CONSTRAINT {shadow}_{foreign_key.column}_fkey"
+            f" TO {table.name}_{foreign_key.column}_fkey"
+        )
+    for index in table.indexes:
+        op.execute(f"ALTER INDEX {index.name}_new RENAME TO {index.name}")
+
+
+def rebuild(table: Table, shadow: str, partitioned: bool) -> None:
+    """
+    Rebuilds the table online: a shadow table is kept in sync by a trigger while the rows are
+    copied over in batches and its indexes are built concurrently, then the two are swapped.
+    """
+    create_shadow(table, shadow, partitioned)
+    sync_to_shadow(table, shadow)
+    # commits the shadow and its trigger first, writers apply their writes to both from then on
+    with op.get_context().autocommit_block():
+        copy_rows(table, shadow)
+        build_indexes(table, shadow, partitioned)
+    swap(table, shadow)
+
+
+def upgrade() -> None:
+    # The tables are rebuilt as range partitioned tables without blocking writes, except for the
+    # moment they are swapped. The primary keys include created_at since the key of a partitioned
+    # table has to contain the partition key. Naive timestamps are read as UTC.
+    op.execute("SET timezone = 'UTC'")
+    for table in TABLES:
+        rebuild(table, f"{table.name}_partitioned", partitioned=True)
+
+
+def downgrade() -> None:
+    # partitions moved to an archive schema are left where they are
+    op.execute("SET timezone = 'UTC'")
+    for table in TABLES:
+        rebuild(table, f"{table.name}_unpartitioned", partitioned=False)
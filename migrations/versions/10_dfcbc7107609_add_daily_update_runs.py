@@ -0,0 +1,68 @@
+"""add_daily_update_runs
+
+Revision ID: dfcbc7107609
+Revises: c5e81f3a6d90
+Create Date: 2026-10-19 21:07:39.512204+00:00
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel
+import sqlmodel.sql.sqltypes
+from alembic import op
+
+from informed.db_models import DailyUpdateDeliveryStatus, DailyUpdateRunStatus
+from informed.db_models.shared_types import EnumAsString
+
+# revision identifiers, used by Alembic.
+revision: str = "dfcbc7107609"
+down_revision: str | None = "c5e81f3a6d90"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "daily_update_run",
+        sa.Column("run_id", sa.Uuid(), nullable=False),
+        sa.Column("status", EnumAsString(DailyUpdateRunStatus), nullable=False),
+        sa.Column("started_at", sa.Float(), nullable=False),
+        sa.Column("heartbeat_at", sa.Float(), nullable=False),
+        sa.Column("finished_at", sa.Float(), nullable=True),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("sent", sa.Integer(), nullable=False),
+        sa.Column("failed", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("run_id"),
+    )
+    op.create_table(
+        "daily_update_delivery",
+        sa.Column("user_id", sa.Uuid(), nullable=False),
+        sa.Column("delivery_date", sa.Date(), nullable=False),
+        sa.Column("run_id", sa.Uuid(), nullable=False),
+        sa.Column("status", EnumAsString(DailyUpdateDeliveryStatus), nullable=False),
+        sa.Column("chat_thread_id", sa.Uuid(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("error", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column("created_at", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["chat_thread_id"], ["chat_thread.chat_thread_id"], ondelete="SET NULL"
+        ),
+        sa.ForeignKeyConstraint(["run_id"], ["daily_update_run.run_id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.user_id"]),
+        sa.PrimaryKeyConstraint("user_id", "delivery_date"),
+    )
+    op.create_index(
+        "ix_daily_update_delivery_unsent",
+        "daily_update_delivery",
+        ["run_id"],
+        postgresql_where=sa.text("status != 'SENT'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_daily_update_delivery_unsent", table_name="daily_update_delivery")
+    op.drop_table("daily_update_delivery")
+    op.drop_table("daily_update_run")
@@ -0,0 +1,37 @@
+"""add_daily_update_run_fencing_token
+
+Revision ID: 2e1aa0a17094
+Revises: dfcbc7107609
+Create Date: 2026-10-19 22:14:52.803117+00:00
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2e1aa0a17094"
+down_revision: str | None = "dfcbc7107609"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "daily_update_run", sa.Column("fencing_token", sa.Integer(), nullable=True)
+    )
+    op.create_index(
+        op.f("ix_daily_update_run_fencing_token"),
+        "daily_update_run",
+        ["fencing_token"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_daily_update_run_fencing_token"), table_name="daily_update_run"
+    )
+    op.drop_column("daily_update_run", "fencing_token")
@@ -0,0 +1,70 @@
+"""add_message_change_xid
+
+Revision ID: 8f4d2b6e1a57
+Revises: 2e1aa0a17094
+Create Date: 2026-10-19 23:41:08.562914+00:00
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8f4d2b6e1a57"
+down_revision: str | None = "2e1aa0a17094"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+INDEX = "ix_message_chat_thread_id_change_xid_message_id"
+INDEX_COLUMNS = "(chat_thread_id, change_xid, message_id)"
+
+
+def upgrade() -> None:
+    # Existing rows are left without one, they are older than any cursor handed out. A row gets one
+    # again whenever it is written, so changed rows come after the cursors too.
+    op.add_column("message", sa.Column("change_xid", sa.BigInteger(), nullable=True))
+    op.execute(
+        """
+        CREATE FUNCTION message_change_xid() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.change_xid := pg_current_xact_id()::text::bigint;
+            RETURN NEW;
+        END $$
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER message_change_xid BEFORE INSERT OR UPDATE ON message"
+        " FOR EACH ROW EXECUTE FUNCTION message_change_xid()"
+    )
+
+    # concurrent builds are not possible on a partitioned table, each partition's index is built on
+    # its own and then attached to the parent's
+    bind = op.get_bind()
+    op.execute(f"CREATE INDEX {INDEX} ON ONLY message {INDEX_COLUMNS}")
+    partitions = (
+        bind.execute(
+            sa.text(
+                "SELECT c.relname FROM pg_inherits i"
+                " JOIN pg_class c ON c.oid = i.inhrelid"
+                " WHERE i.inhparent = CAST('message' AS regclass)"
+            )
+        )
+        .scalars()
+        .all()
+    )
+    with op.get_context().autocommit_block():
+        for partition in partitions:
+            partition_index = f"{INDEX}_{partition.removeprefix('message_')}"
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY {partition_index} ON {partition} {INDEX_COLUMNS}"
+            )
+            op.execute(f"ALTER INDEX {INDEX} ATTACH PARTITION {partition_index}")
+
+
+def downgrade() -> None:
+    op.execute(f"DROP INDEX {INDEX}")
+    op.execute("DROP TRIGGER message_change_xid ON message")
+    op.execute("DROP FUNCTION message_change_xid()")
+    op.drop_column("message", "change_xid")
@@ -0,0 +1,101 @@
+"""
+Compares what the hot statements cost per execution with and without SQLAlchemy's compiled cache.
+
+Without a cache key the engine compiles the statement on every execution, with one it only builds the
+key and looks up the SQL compiled the first time. Statements using a type with cache_ok = False get no
+cache key at all, so both columns come out the same for them.
+
+    python misc/scripts/benchmark_statement_cache.py --iterations 2000
+"""
+
+import argparse
+import timeit
+from datetime import datetime
+from uuid import uuid4
+
+from sqlalchemy import Executable, select, tuple_, update
+from sqlalchemy.dialects.postgresql.psycopg import PGDialect_psycopg
+from sqlalchemy.util import LRUCache
+from sqlmodel import col
+
+from informed.db_models.chat import Message
+from informed.db_models.notification import Notification, NotificationStatus
+from informed.db_models.query import Query, QueryState
+from informed.db_models.users import Settings, UserDetails
+
+
+def hot_statements() -> dict[str, Executable]:
+    query_id, user_id, chat_thread_id = uuid4(), uuid4(), uuid4()
+    return {
+        "get query": select(Query).filter(col(Query.query_id) == query_id),
+        "persist query": update(Query)
+        .where(col(Query.query_id) == query_id, col(Query.version) == 3)
+        .values(state=QueryState.COMPLETED, updated_at=datetime.now(), version=4)
+        .returning(col(Query.version)),
+        "chat messages page": select(Message)
+        .filter(
+            col(Message.chat_thread_id) == chat_thread_id,
+            tuple_(col(Message.created_at), col(Message.message_id))
+            < (datetime.now().timestamp(), uuid4()),
+        )
+        .order_by(col(Message.created_at).desc(), col(Message.message_id).desc())
+        .limit(51),
+        "user notifications": select(Notification)
+        .filter(
+            col(Notification.user_id) == user_id,
+            col(Notification.status).not_in(
+                [NotificationStatus.FAILED, NotificationStatus.PROCESSING]
+            ),
+        )
+        .order_by(col(Notification.created_at).desc())
+        .limit(10),
+        "daily update users": select(Settings, col(UserDetails.zip_code))
+        .outerjoin(UserDetails, UserDetails.user_id == Settings.user_id)  # type: ignore
+        .filter(Settings.configurations["daily_updates"].as_boolean()),  # type: ignore
+    }
+
+
+def execution_cost(
+    statement: Executable,
+    dialect: PGDialect_psycopg,
+    compiled_cache: LRUCache | None,
+    iterations: int,
+) -> float:
+    """Seconds per execution spent getting the statement's SQL, the way the engine gets it."""
+    return (
+        timeit.timeit(
+            lambda: statement._compile_w_cache(  # type: ignore
+                dialect,
+                compiled_cache=compiled_cache,
+                column_keys=[],
+                for_executemany=False,
+                schema_translate_map=None,
+            ),
+            number=iterations,
+        )
+        / iterations
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    dialect = PGDialect_psycopg()
+    print(
+        f"{'statement':<20} {'cached':<7} {'no cache µs':>12} {'cache µs':>9} {'speedup':>8}"
+    )
+    for name, statement in hot_statements().items():
+        compiled_cache: LRUCache = LRUCache(100)
+        execution_cost(statement, dialect, compiled_cache, 1)
+        uncached = execution_cost(statement, dialect, None, args.iterations)
+        cached = execution_cost(statement, dialect, compiled_cache, args.iterations)
+        print(
+            f"{name:<20} {len(compiled_cache) > 0!s:<7} {uncached * 1e6:>12.1f}"
+            f" {cached * 1e6:>9.1f} {uncached / cached:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Checks that the planner uses the indexes added for our access patterns.
+
+Runs EXPLAIN for each statement against the configured database and fails if the expected index is
+missing from the plan. Sequential scans are disabled for the check, on a near empty dev database the
+planner would rightly prefer them, what matters here is that the index can serve the statement.
+Partitioned tables are scanned through the indexes of their partitions, these are reported by the
+index of the parent table they belong to.
+
+    python misc/scripts/check_query_plans.py
+"""
+
+import json
+import sys
+import time
+from collections.abc import Iterator
+from typing import Any
+from uuid import uuid4
+
+from sqlalchemy import Executable, literal, select, text, tuple_
+from sqlalchemy.orm import Session
+from sqlmodel import col
+
+from informed.config import get_config
+from informed.db import init_db, sync_session_maker
+from informed.db_models.chat import Message, MessageSource
+from informed.db_models.notification import Notification, NotificationStatus
+from informed.db_models.query import Query
+from informed.db_models.shared_types import EnumAsString
+from informed.db_models.users import Settings, UserDetails
+
+
+def expected_index_usage() -> list[tuple[str, Executable, str]]:
+    """(name, statement as the managers issue it, index it should use)"""
+    user_id, chat_thread_id = uuid4(), uuid4()
+    return [
+        (
+            "recent query for user",
+            select(Query)
+            .filter(col(Query.user_id) == user_id)
+            .order_by(col(Query.created_at).desc())
+            .limit(1),
+            "ix_queries_user_id_created_at",
+        ),
+        (
+            "notification inbox page",
+            select(Notification)
+            .filter(
+                col(Notification.user_id) == user_id,
+                tuple_(col(Notification.created_at), col(Notification.notification_id))
+                < (time.time(), uuid4()),
+                col(Notification.status).not_in(
+                    [
+                        literal(status, EnumAsString(NotificationStatus))
+                        for status in [
+                            NotificationStatus.FAILED,
+                            NotificationStatus.PROCESSING,
+                        ]
+                    ]
+                ),
+            )
+            .order_by(
+                col(Notification.created_at).desc(),
+                col(Notification.notification_id).desc(),
+            )
+            .limit(11),
+            "ix_notification_inbox",
+        ),
+        (
+            "pending user messages",
+            select(Message)
+            .filter(
+                col(Message.chat_thread_id) == chat_thread_id,
+                col(Message.source)
+                == literal(MessageSource.WEBAPP, EnumAsString(MessageSource)),
+                ~col(Message.acknowledged),
+            )
+            .order_by(col(Message.created_at)),
+            "ix_message_pending",
+        ),
+        (
+            "users with daily updates",
+            select(Settings, col(UserDetails.zip_code))
+            .outerjoin(UserDetails, UserDetails.user_id == Settings.user_id)  # type: ignore
+            .filter(Settings.configurations[literal("daily_updates")].as_boolean()),  # type: ignore
+            "ix_settings_daily_updates",
+        ),
+    ]
+
+
+def index_names(plan: dict[str, Any]) -> Iterator[str]:
+    if "Index Name" in plan:
+        yield plan["Index Name"]
+    for child in plan.get("Plans", []):
+        yield from index_names(child)
+
+
+def load_plan(explain_output: Any) -> dict[str, Any]:
+    # psycopg already decodes the json column, other drivers hand back the text
+    if isinstance(explain_output, str):
+        explain_output = json.loads(explain_output)
+    return dict(explain_output[0]["Plan"])
+
+
+def parent_index_name(session: Session, index_name: str) -> str:
+    """Scans of a partitioned table use the indexes of its partitions, which inherit from the parent's."""
+    parent = session.execute(
+        text(
+            "SELECT p.relname FROM pg_inherits i"
+            " JOIN pg_class c ON c.oid = i.inhrelid"
+            " JOIN pg_class p ON p.oid = i.inhparent"
+            " WHERE c.relname = :name"
+        ),
+        {"name": index_name},
+    ).scalar_one_or_none()
+    return parent or index_name
+
+
+def main() -> int:
+    init_db(get_config().database_config)
+    failed = False
+    with sync_session_maker() as session:
+        session.execute(text("SET enable_seqscan = off"))
+        for name, statement, index_name in expected_index_usage():
+            sql = statement.compile(
+                dialect=session.get_bind().dialect,
+                compile_kwargs={"literal_binds": True},
+            )
+            result = session.connection().exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {sql}"
+            )
+            plan = load_plan(result.scalar_one())
+            used = {parent_index_name(session, name) for name in index_names(plan)}
+            ok = index_name in used
+            failed = failed or not ok
+            print(
+                f"{'ok  ' if ok else 'FAIL'} {name}: expected {index_name}, plan uses {sorted(used) or 'no index'}"
+            )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
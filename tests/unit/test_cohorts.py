@@ -0,0 +1,104 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+
+import pytest
+
+from informed.agents.query_agent.cohorts import CohortAnswers, prompt_signature
+
+
+def test_prompt_signature_keeps_parts_apart() -> None:
+    assert prompt_signature("ab", "c") != prompt_signature("a", "bc")
+    assert prompt_signature("a", None) == prompt_signature("a", "")
+    assert prompt_signature("a", "b") == prompt_signature("a", "b")
+
+
+def test_cohort_shares_one_generation() -> None:
+    async def run() -> None:
+        answers = CohortAnswers()
+        calls = 0
+        release = asyncio.Event()
+
+        async def generate() -> str:
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "sunny"
+
+        waiters = [
+            asyncio.create_task(answers.get_or_generate("signature", generate))
+            for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        assert await asyncio.gather(*waiters) == ["sunny"] * 5
+        assert calls == 1
+        # answered from the finished generation from then on
+        assert await answers.get_or_generate("signature", generate) == "sunny"
+        assert calls == 1
+
+    asyncio.run(run())
+
+
+def test_cohorts_of_other_signatures_generate_their_own() -> None:
+    async def run() -> None:
+        answers = CohortAnswers()
+        assert await answers.get_or_generate("a", _returning("sunny")) == "sunny"
+        assert await answers.get_or_generate("b", _returning("rainy")) == "rainy"
+
+    asyncio.run(run())
+
+
+def test_failed_generation_is_generated_again() -> None:
+    async def run() -> None:
+        answers = CohortAnswers()
+        release = asyncio.Event()
+
+        async def fail() -> str:
+            await release.wait()
+            raise RuntimeError("llm unavailable")
+
+        first = asyncio.create_task(answers.get_or_generate("signature", fail))
+        # waits on the first generation, then generates it again once that failed
+        second = asyncio.create_task(
+            answers.get_or_generate("signature", _returning("sunny"))
+        )
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(RuntimeError):
+            await first
+        assert await second == "sunny"
+        assert await answers.get_or_generate("signature", fail) == "sunny"
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_cancel_the_generation() -> None:
+    async def run() -> None:
+        answers = CohortAnswers()
+        release = asyncio.Event()
+        calls = 0
+
+        async def generate() -> str:
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "sunny"
+
+        first = asyncio.create_task(answers.get_or_generate("signature", generate))
+        second = asyncio.create_task(answers.get_or_generate("signature", generate))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        release.set()
+        assert await second == "sunny"
+        assert calls == 1
+
+    asyncio.run(run())
+
+
+def _returning(answer: str) -> Callable[[], Awaitable[str]]:
+    async def generate() -> str:
+        return answer
+
+    return generate
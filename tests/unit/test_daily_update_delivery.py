@@ -0,0 +1,214 @@
+import asyncio
+from datetime import date, time
+from typing import Any
+from uuid import UUID, uuid4
+
+import pytest
+
+from informed.agents.query_agent.cohorts import CohortAnswers
+from informed.db_models.chat import AssistantMessage, ChatThread, Message, MessageSource
+from informed.db_models.query import Query, QueryState
+from informed.informed import InformedManager
+from informed.services.notifications.manager import DailyUpdateRecipient
+
+
+class FakeLeases:
+    def __init__(self, free: bool = True) -> None:
+        self.free = free
+        self.held: set[UUID] = set()
+
+    async def acquire(self, chat_thread_id: UUID, on_lost: Any = None) -> bool:
+        if not self.free or chat_thread_id in self.held:
+            return False
+        self.held.add(chat_thread_id)
+        return True
+
+    async def release(self, chat_thread_id: UUID) -> None:
+        self.held.discard(chat_thread_id)
+
+
+class FakeRuns:
+    def __init__(self) -> None:
+        self.finished: list[str | None] = []
+
+    async def finish_delivery(
+        self, recipient: DailyUpdateRecipient, error: str | None = None
+    ) -> None:
+        self.finished.append(error)
+
+
+class FakeChatAgent:
+    def __init__(self, outcome: QueryState | None | Exception) -> None:
+        self.outcome = outcome
+
+    async def run_once(self) -> QueryState | None:
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return self.outcome
+
+
+class FakeChatManager:
+    async def get_pending_user_messages(self, chat_thread_id: UUID) -> list:
+        return []
+
+
+def make_manager(
+    outcome: QueryState | None | Exception, leases: FakeLeases | None = None
+) -> tuple[InformedManager, FakeRuns, FakeLeases]:
+    manager = InformedManager.__new__(InformedManager)
+    runs, leases = FakeRuns(), leases or FakeLeases()
+    manager.daily_update_runs = runs  # type: ignore[assignment]
+    manager.chat_thread_leases = leases  # type: ignore[assignment]
+    manager.chat_manager = FakeChatManager()  # type: ignore[assignment]
+    manager._chat_dispatcher = None
+
+    async def resume(*_: Any) -> bool:
+        return False
+
+    manager._resume_daily_update = resume  # type: ignore[method-assign,assignment]
+    manager._create_chat_agent = lambda *_, **__: FakeChatAgent(outcome)  # type: ignore[method-assign,assignment]
+    return manager, runs, leases
+
+
+def make_recipient() -> DailyUpdateRecipient:
+    return DailyUpdateRecipient(
+        user_id=uuid4(),
+        prompt="how is the weather",
+        delivery_time=time(18, 0),
+        timezone="UTC",
+        delivery_date=date(2026, 10, 19),
+        # started by an earlier run, so no thread is created
+        chat_thread_id=uuid4(),
+    )
+
+
+async def notification_callback(*_: Any) -> None:
+    pass
+
+
+def send(manager: InformedManager) -> None:
+    asyncio.run(
+        manager._send_daily_update(
+            make_recipient(), None, notification_callback, CohortAnswers()
+        )
+    )
+
+
+def test_completed_update_is_recorded_as_sent() -> None:
+    manager, runs, leases = make_manager(QueryState.COMPLETED)
+    send(manager)
+    assert runs.finished == [None]
+    assert leases.held == set()
+
+
+@pytest.mark.parametrize(
+    "outcome", [QueryState.FAILED, QueryState.CANCELLED, None, RuntimeError("boom")]
+)
+def test_update_without_a_completed_query_is_recorded_as_failed(
+    outcome: QueryState | None | Exception,
+) -> None:
+    manager, runs, leases = make_manager(outcome)
+    with pytest.raises((ValueError, RuntimeError)):
+        send(manager)
+    assert len(runs.finished) == 1
+    assert runs.finished[0]
+    # the lease is given back whatever happened
+    assert leases.held == set()
+
+
+def test_update_of_a_thread_answered_elsewhere_is_recorded_as_failed() -> None:
+    manager, runs, _ = make_manager(QueryState.COMPLETED, FakeLeases(free=False))
+    with pytest.raises(ValueError):
+        send(manager)
+    assert len(runs.finished) == 1
+    assert "another agent" in str(runs.finished[0])
+
+
+class FakeThreadChatManager:
+    def __init__(self, messages: list[Message]) -> None:
+        self.chat_thread = ChatThread(user_id=uuid4())
+        self.chat_thread.messages = messages
+        self.updated: list[Message] = []
+
+    async def get_chat_thread(self, chat_thread_id: UUID) -> ChatThread:
+        return self.chat_thread
+
+    async def update_message(self, message: Message) -> None:
+        self.updated.append(message)
+
+
+class FakeQueryManager:
+    def __init__(self, states: dict[UUID, QueryState]) -> None:
+        self.states = states
+
+    async def get_query(self, query_id: UUID) -> Query:
+        if query_id not in self.states:
+            raise ValueError(f"Query {query_id} not found")
+        return Query(query_id=query_id, query="", state=self.states[query_id])
+
+
+def user_message(acknowledged: bool = True) -> Message:
+    return Message(
+        content="how is the weather",
+        chat_thread_id=uuid4(),
+        source=MessageSource.WEBAPP,
+        acknowledged=acknowledged,
+    )
+
+
+def answer(query_id: UUID | None) -> Message:
+    return Message(
+        content="sunny",
+        chat_thread_id=uuid4(),
+        source=MessageSource.ASSISTANT,
+        query_id=query_id,
+    )
+
+
+def resume(
+    messages: list[Message], states: dict[UUID, QueryState]
+) -> tuple[bool, list[Message], list[AssistantMessage]]:
+    manager = InformedManager.__new__(InformedManager)
+    chat_manager = FakeThreadChatManager(messages)
+    manager.chat_manager = chat_manager  # type: ignore[assignment]
+    manager.query_manager = FakeQueryManager(states)  # type: ignore[assignment]
+    delivered: list[AssistantMessage] = []
+
+    async def callback(_: UUID, message: AssistantMessage, __: QueryState) -> None:
+        delivered.append(message)
+
+    answered = asyncio.run(manager._resume_daily_update(uuid4(), callback))
+    return answered, chat_manager.updated, delivered
+
+
+def test_answered_update_is_delivered_again() -> None:
+    failed, completed = uuid4(), uuid4()
+    messages = [user_message(), answer(failed), answer(completed)]
+    answered, updated, delivered = resume(
+        messages, {failed: QueryState.FAILED, completed: QueryState.COMPLETED}
+    )
+    assert answered
+    assert updated == []
+    assert [message.message_id for message in delivered] == [messages[2].message_id]
+
+
+def test_unanswered_prompt_alone_is_made_pending_again() -> None:
+    failed, missing, reply = uuid4(), uuid4(), uuid4()
+    prompt, later = user_message(), user_message()
+    messages = [prompt, answer(failed), answer(missing), later, answer(reply)]
+    # the answer to the user's later message does not answer the prompt
+    answered, updated, delivered = resume(
+        messages, {failed: QueryState.FAILED, reply: QueryState.COMPLETED}
+    )
+    assert not answered
+    assert delivered == []
+    assert updated == [prompt]
+    assert not prompt.acknowledged
+    assert later.acknowledged
+
+
+def test_pending_prompt_is_left_as_it_is() -> None:
+    prompt = user_message(acknowledged=False)
+    answered, updated, _ = resume([prompt], {})
+    assert not answered
+    assert updated == []
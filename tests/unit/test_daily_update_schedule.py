@@ -0,0 +1,108 @@
+from datetime import UTC, date, datetime, time, timedelta
+from uuid import uuid4
+from zoneinfo import ZoneInfo
+
+from informed.config import DailyUpdatesConfig
+from informed.services.notifications.daily_updates import DailyUpdateSchedule
+from informed.services.notifications.manager import DailyUpdateRecipient
+
+CONFIG = DailyUpdatesConfig(generation_window_seconds=1800, generation_lead_seconds=300)
+
+
+def make_recipient(**values: object) -> DailyUpdateRecipient:
+    defaults: dict[str, object] = {
+        "user_id": uuid4(),
+        "prompt": "how is the weather",
+        "zip_code": "94103",
+        "delivery_time": time(18, 0),
+        "timezone": "America/Los_Angeles",
+    }
+    return DailyUpdateRecipient.model_validate(defaults | values)
+
+
+def test_generation_time_is_within_the_window_before_delivery() -> None:
+    schedule = DailyUpdateSchedule(CONFIG)
+    day = date(2026, 10, 19)
+    delivery = datetime(2026, 10, 19, 18, 0, tzinfo=ZoneInfo("America/Los_Angeles"))
+    for zip_code in ["94103", "10001", "60601", "73301", "98101"]:
+        generated = schedule.generation_time(make_recipient(zip_code=zip_code), day)
+        assert generated.tzinfo == UTC
+        # early enough to be done by the delivery time
+        assert delivery - timedelta(seconds=1800) <= generated
+        assert generated <= delivery - timedelta(seconds=300)
+
+
+def test_generation_time_is_the_same_for_a_zip_and_prompt() -> None:
+    schedule = DailyUpdateSchedule(CONFIG)
+    day = date(2026, 10, 19)
+    first, second = make_recipient(), make_recipient()
+    assert schedule.generation_time(first, day) == schedule.generation_time(second, day)
+    # and on every replica, it only depends on the config
+    assert DailyUpdateSchedule(CONFIG).generation_time(
+        first, day
+    ) == schedule.generation_time(first, day)
+
+
+def test_generation_time_spreads_zips_and_days() -> None:
+    schedule = DailyUpdateSchedule(CONFIG)
+    day = date(2026, 10, 19)
+    times = {
+        schedule.generation_time(make_recipient(zip_code=f"{zip_code:05d}"), day)
+        for zip_code in range(20)
+    }
+    assert len(times) > 1
+    recipient = make_recipient()
+    offsets = {
+        schedule.generation_time(recipient, day + timedelta(days=days)).time()
+        for days in range(5)
+    }
+    assert len(offsets) > 1
+
+
+def test_generation_time_follows_local_time_across_dst() -> None:
+    schedule = DailyUpdateSchedule(
+        DailyUpdatesConfig(generation_window_seconds=0, generation_lead_seconds=0)
+    )
+    recipient = make_recipient()
+    # the US leaves daylight saving time on the 1st of November 2026
+    before = schedule.generation_time(recipient, date(2026, 10, 31))
+    after = schedule.generation_time(recipient, date(2026, 11, 1))
+    assert before == datetime(2026, 11, 1, 1, 0, tzinfo=UTC)
+    assert after == datetime(2026, 11, 2, 2, 0, tzinfo=UTC)
+
+
+def test_due_buckets_by_local_delivery_date() -> None:
+    schedule = DailyUpdateSchedule(CONFIG)
+    # an update delivered at 00:10 local time is generated the evening before
+    recipient = make_recipient(delivery_time=time(0, 10), timezone="Asia/Tokyo")
+    generated = schedule.generation_time(recipient, date(2026, 10, 20))
+    due = schedule.due(
+        [recipient], generated - timedelta(minutes=1), generated + timedelta(minutes=1)
+    )
+    assert [r.delivery_date for r in due] == [date(2026, 10, 20)]
+    assert due[0].user_id == recipient.user_id
+
+
+def test_due_is_empty_outside_of_the_generation_time() -> None:
+    schedule = DailyUpdateSchedule(CONFIG)
+    recipient = make_recipient()
+    generated = schedule.generation_time(recipient, date(2026, 10, 19))
+    assert schedule.due([recipient], generated, generated + timedelta(minutes=1)) == []
+    due = schedule.due([recipient], generated - timedelta(minutes=1), generated)
+    assert [r.delivery_date for r in due] == [date(2026, 10, 19)]
+
+
+def test_due_covers_every_recipient_once_a_day() -> None:
+    schedule = DailyUpdateSchedule(CONFIG)
+    recipients = [
+        make_recipient(zip_code=f"{zip_code:05d}", timezone=timezone)
+        for zip_code in range(10)
+        for timezone in ["America/Los_Angeles", "Europe/Paris", "Asia/Kolkata"]
+    ]
+    start = datetime(2026, 10, 19, tzinfo=UTC)
+    due = []
+    # the way the scheduler calls it, a minute at a time
+    for minute in range(24 * 60):
+        since = start + timedelta(minutes=minute)
+        due.extend(schedule.due(recipients, since, since + timedelta(minutes=1)))
+    assert sorted(r.user_id for r in due) == sorted(r.user_id for r in recipients)
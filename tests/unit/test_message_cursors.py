@@ -0,0 +1,55 @@
+from uuid import uuid4
+
+import pytest
+
+from informed.api.schema import MessageChangeCursor, MessageCursor
+from informed.db_models.chat import Message, MessageSource
+
+
+def make_message(**values: object) -> Message:
+    return Message(
+        content="hi", chat_thread_id=uuid4(), source=MessageSource.WEBAPP, **values
+    )
+
+
+def test_message_cursor_round_trips() -> None:
+    message = make_message(created_at=1729000000.123456789)
+    cursor = MessageCursor.from_message(message)
+    decoded = MessageCursor.decode(cursor.encode())
+    assert decoded == cursor
+    # compared against the stored value, so the float has to come back exactly
+    assert decoded.created_at == message.created_at
+
+
+@pytest.mark.parametrize(
+    "cursor", ["", "1729000000.5", "nope_" + str(uuid4()), "1729000000.5_nope"]
+)
+def test_message_cursor_rejects_malformed(cursor: str) -> None:
+    with pytest.raises(ValueError):
+        MessageCursor.decode(cursor)
+
+
+def test_change_cursor_round_trips() -> None:
+    message = make_message(change_xid=4242)
+    cursor = MessageChangeCursor.from_message(message)
+    assert cursor == MessageChangeCursor(change_xid=4242, message_id=message.message_id)
+    assert MessageChangeCursor.decode(cursor.encode()) == cursor
+
+
+def test_change_cursor_without_message_round_trips() -> None:
+    cursor = MessageChangeCursor(change_xid=4242)
+    assert cursor.encode() == "4242_"
+    assert MessageChangeCursor.decode(cursor.encode()) == cursor
+
+
+def test_change_cursor_needs_a_written_message() -> None:
+    with pytest.raises(ValueError):
+        MessageChangeCursor.from_message(make_message())
+
+
+@pytest.mark.parametrize(
+    "cursor", ["", "_", "1729000000.5_" + str(uuid4()), "4242_nope"]
+)
+def test_change_cursor_rejects_malformed(cursor: str) -> None:
+    with pytest.raises(ValueError):
+        MessageChangeCursor.decode(cursor)
@@ -0,0 +1,131 @@
+import asyncio
+from typing import Any
+from uuid import UUID, uuid4
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import ClauseElement
+
+from informed.api.schema import NotificationCursor
+from informed.db_models.notification import Notification, NotificationStatus
+from informed.services.notifications.manager import NotificationsManager
+
+
+class FakeResult:
+    def __init__(self, rows: list[Any]) -> None:
+        self.rows = rows
+
+    def scalars(self) -> "FakeResult":
+        return self
+
+    def all(self) -> list[Any]:
+        return self.rows
+
+
+class FakeSession:
+    """Records the statements it is given and answers them with rows."""
+
+    def __init__(self, rows: list[Any] | None = None) -> None:
+        self.rows = rows or []
+        self.statements: list[ClauseElement] = []
+        self.flushed = self.committed = False
+
+    async def execute(self, statement: ClauseElement, *_: Any, **__: Any) -> FakeResult:
+        self.statements.append(statement)
+        return FakeResult(self.rows)
+
+    async def flush(self) -> None:
+        self.flushed = True
+
+    async def commit(self) -> None:
+        self.committed = True
+
+    def sql(self) -> str:
+        (statement,) = self.statements
+        compiled = statement.compile(
+            dialect=postgresql.dialect(),
+            compile_kwargs={"render_postcompile": True},
+        )
+        return " ".join(str(compiled).split())
+
+    def params(self) -> dict[str, Any]:
+        (statement,) = self.statements
+        return dict(statement.compile(dialect=postgresql.dialect()).params)
+
+
+def test_inbox_filter_matches_the_partial_index() -> None:
+    session = FakeSession()
+    asyncio.run(
+        NotificationsManager().get_notifications_for_user(uuid4(), session=session)  # type: ignore[arg-type]
+    )
+    # inlined rather than bound, or the planner can not use ix_notification_inbox
+    assert "notification.status NOT IN ('FAILED', 'PROCESSING')" in session.sql()
+    assert session.sql().endswith(
+        "ORDER BY notification.created_at DESC, notification.notification_id DESC "
+        "LIMIT %(param_3)s"
+    )
+
+
+def test_inbox_pages_by_created_at_and_id() -> None:
+    session = FakeSession()
+    cursor = NotificationCursor(created_at=1729000000.5, notification_id=uuid4())
+    asyncio.run(
+        NotificationsManager().get_notifications_for_user(
+            uuid4(), limit=5, before=cursor, session=session  # type: ignore[arg-type]
+        )
+    )
+    sql = session.sql()
+    assert "(notification.created_at, notification.notification_id) < (" in sql
+    assert sql.endswith(
+        "ORDER BY notification.created_at DESC, notification.notification_id DESC "
+        "LIMIT %(param_5)s"
+    )
+    params = session.params()
+    assert params["param_3"] == cursor.created_at
+    assert params["param_4"] == cursor.notification_id
+    assert params["param_5"] == 5
+
+
+def test_mark_as_read_is_one_update_of_the_unread() -> None:
+    read = [uuid4(), uuid4()]
+    session = FakeSession(read)
+    user_id = uuid4()
+    marked = asyncio.run(
+        NotificationsManager().mark_notifications_as_read(user_id, session=session)  # type: ignore[arg-type]
+    )
+    assert marked == read
+    # committed with the rest of the request by whoever opened the session
+    assert session.flushed and not session.committed
+    sql = session.sql()
+    assert sql.startswith("UPDATE notification SET")
+    assert sql.endswith("RETURNING notification.notification_id")
+    params = session.params()
+    assert params["status"] == NotificationStatus.VIEWED
+    assert params["user_id_1"] == user_id
+    assert params["status_1"] == [
+        NotificationStatus.READY,
+        NotificationStatus.DELIVERED,
+    ]
+
+
+def test_bulk_update_binds_the_ids_as_one_array() -> None:
+    user_id = uuid4()
+    notification_ids: list[UUID] = [uuid4() for _ in range(3)]
+    updated = [Notification(notification_id=notification_ids[0], user_id=user_id)]
+    session = FakeSession(updated)
+    result = asyncio.run(
+        NotificationsManager().bulk_update_notification_status(
+            user_id, notification_ids, NotificationStatus.VIEWED, session=session  # type: ignore[arg-type]
+        )
+    )
+    assert result == updated
+    assert session.flushed and not session.committed
+    sql = session.sql()
+    # one statement whatever the number of ids, scoped to the user
+    assert (
+        "WHERE notification.notification_id = ANY (%(notification_ids)s::UUID[]) "
+        "AND notification.user_id = %(user_id_1)s::UUID RETURNING"
+    ) in sql
+    params = session.params()
+    assert params["notification_ids"] == notification_ids
+    assert params["user_id_1"] == user_id
+    assert params["status"] == NotificationStatus.VIEWED
@@ -0,0 +1,64 @@
+from datetime import UTC, datetime
+
+import pytest
+
+from informed.services.partitions import PartitionedTable, add_months, month_start
+
+MESSAGE = PartitionedTable("message", epoch_seconds=True)
+QUERIES = PartitionedTable("queries", epoch_seconds=False)
+
+
+def test_month_start() -> None:
+    assert month_start(datetime(2026, 10, 19, 22, 14, 52, 803117, tzinfo=UTC)) == (
+        datetime(2026, 10, 1, tzinfo=UTC)
+    )
+
+
+@pytest.mark.parametrize(
+    ("month", "months", "expected"),
+    [
+        (datetime(2026, 10, 1, tzinfo=UTC), 0, datetime(2026, 10, 1, tzinfo=UTC)),
+        (datetime(2026, 10, 1, tzinfo=UTC), 2, datetime(2026, 12, 1, tzinfo=UTC)),
+        (datetime(2026, 12, 1, tzinfo=UTC), 1, datetime(2027, 1, 1, tzinfo=UTC)),
+        (datetime(2026, 1, 1, tzinfo=UTC), -1, datetime(2025, 12, 1, tzinfo=UTC)),
+        (datetime(2026, 10, 1, tzinfo=UTC), -22, datetime(2024, 12, 1, tzinfo=UTC)),
+        (datetime(2026, 10, 1, tzinfo=UTC), 27, datetime(2029, 1, 1, tzinfo=UTC)),
+    ],
+)
+def test_add_months(month: datetime, months: int, expected: datetime) -> None:
+    assert add_months(month, months) == expected
+
+
+def test_partition_name_round_trips() -> None:
+    month = datetime(2026, 3, 1, tzinfo=UTC)
+    name = MESSAGE.partition_name(month)
+    assert name == "message_p2026_03"
+    assert MESSAGE.parse_partition_month(name) == month
+
+
+@pytest.mark.parametrize(
+    "name",
+    ["message_default", "message_p2026_3", "queries_p2026_03", "message_p2026_03_old"],
+)
+def test_parse_partition_month_ignores_other_tables(name: str) -> None:
+    assert MESSAGE.parse_partition_month(name) is None
+
+
+def test_epoch_bound() -> None:
+    month = datetime(2026, 10, 1, tzinfo=UTC)
+    assert MESSAGE.bound(month) == "1790812800.0"
+    assert float(MESSAGE.bound(month)) == month.timestamp()
+
+
+def test_timestamp_bound_is_spelled_out_in_utc() -> None:
+    assert (
+        QUERIES.bound(datetime(2026, 10, 1, tzinfo=UTC)) == "'2026-10-01 00:00:00+00'"
+    )
+
+
+def test_bounds_of_consecutive_months_meet() -> None:
+    month = datetime(2026, 12, 1, tzinfo=UTC)
+    for table in [MESSAGE, QUERIES]:
+        upper = table.bound(add_months(month, 1))
+        assert upper == table.bound(datetime(2027, 1, 1, tzinfo=UTC))
+        assert table.bound(month) < upper
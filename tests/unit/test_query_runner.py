@@ -0,0 +1,141 @@
+import asyncio
+from collections.abc import Callable
+from typing import Any
+from uuid import UUID, uuid4
+
+import pytest
+
+from informed.agents.query_agent import query_runner
+from informed.agents.query_agent.query_runner import QueryRunner
+from informed.db_models.query import Query, QueryState
+
+
+class FakeQueryManager:
+    async def create_query(self, query: str, user_id: UUID) -> Query:
+        return Query(query=query, user_id=user_id)
+
+
+class FakeQueryAgent:
+    """Ends its query in the state given by the text of the query."""
+
+    def __init__(self, query_id: UUID, **_: Any) -> None:
+        self.query_id = query_id
+        self.query: Query | None = None
+        self.release = asyncio.Event()
+        agents[query_id] = self
+
+    async def run(self) -> Query:
+        await self.release.wait()
+        outcome = queries[self.query_id]
+        if outcome == "raise":
+            raise RuntimeError("agent failed")
+        self.query = Query(query_id=self.query_id, query="", state=QueryState(outcome))
+        return self.query
+
+
+agents: dict[UUID, FakeQueryAgent] = {}
+queries: dict[UUID, str] = {}
+
+
+@pytest.fixture(autouse=True)
+def fake_query_agent(monkeypatch: pytest.MonkeyPatch) -> None:
+    agents.clear()
+    queries.clear()
+    monkeypatch.setattr(query_runner, "QueryAgent", FakeQueryAgent)
+
+
+def make_runner(
+    updates: list[Query] | None = None,
+    agent_done_callback: Callable[[asyncio.Task, Query], None] | None = None,
+) -> QueryRunner:
+    async def update_callback(query: Query) -> None:
+        if updates is not None:
+            updates.append(query)
+
+    return QueryRunner(
+        query_manager=FakeQueryManager(),  # type: ignore[arg-type]
+        user_manager=None,  # type: ignore[arg-type]
+        llm_client=None,  # type: ignore[arg-type]
+        update_callback=update_callback,
+        weather_sources_config=None,  # type: ignore[arg-type]
+        weather_alert_service=None,  # type: ignore[arg-type]
+        agent_done_callback=agent_done_callback,
+    )
+
+
+async def answer(runner: QueryRunner, outcome: str) -> UUID:
+    query_id = await runner.launch(outcome, uuid4(), uuid4())
+    queries[query_id] = outcome
+    return query_id
+
+
+def test_terminal_query_is_handed_over_without_reading_it_back() -> None:
+    async def run() -> None:
+        updates: list[Query] = []
+        done: list[Query] = []
+        runner = make_runner(updates, lambda _, query: done.append(query))
+        query_id = await answer(runner, QueryState.COMPLETED.value)
+        assert runner.is_running(query_id)
+        agents[query_id].release.set()
+        await runner.wait_on_running_queries()
+        # the done callback runs on the next turn of the loop
+        await asyncio.sleep(0)
+        assert updates == [agents[query_id].query]
+        assert done == [agents[query_id].query]
+        assert not runner.has_running_queries()
+
+    asyncio.run(run())
+
+
+def test_failed_agent_is_not_handed_over() -> None:
+    async def run() -> None:
+        updates: list[Query] = []
+        runner = make_runner(updates)
+        query_id = await answer(runner, "raise")
+        agents[query_id].release.set()
+        await runner.wait_on_running_queries()
+        assert updates == []
+        assert not runner.has_running_queries()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    ("outcome", "expected"),
+    [
+        (QueryState.COMPLETED.value, QueryState.COMPLETED),
+        (QueryState.FAILED.value, QueryState.FAILED),
+        # an agent that raised did not get to persist a state
+        ("raise", QueryState.FAILED),
+    ],
+)
+def test_last_query_state_is_how_the_query_ended(
+    outcome: str, expected: QueryState
+) -> None:
+    async def run() -> None:
+        runner = make_runner()
+        assert runner.last_query_state is None
+        query_id = await answer(runner, outcome)
+        agents[query_id].release.set()
+        # known as soon as the waiters on running queries wake up
+        await runner.wait_on_running_queries()
+        assert runner.last_query_state == expected
+
+    asyncio.run(run())
+
+
+def test_cancelled_query_is_left_out_of_the_last_query_state() -> None:
+    async def run() -> None:
+        runner = make_runner()
+        completed = await answer(runner, QueryState.COMPLETED.value)
+        agents[completed].release.set()
+        await runner.wait_on_running_queries()
+
+        superseded = await answer(runner, QueryState.COMPLETED.value)
+        task = runner._running_queries[superseded]
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await runner.wait_on_running_queries()
+        assert runner.last_query_state == QueryState.COMPLETED
+
+    asyncio.run(run())
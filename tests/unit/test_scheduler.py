@@ -0,0 +1,198 @@
+import asyncio
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import pytest
+from apscheduler.triggers.cron import CronTrigger
+
+from informed.config import SchedulerConfig
+from informed.scheduler import JobScheduler
+
+CONFIG = SchedulerConfig(misfire_grace_seconds=3600, catch_up_interval_seconds=60)
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.hashes: dict[str, dict[bytes, bytes]] = {}
+
+    async def hset(self, key: str, field: str, value: str) -> None:
+        self.hashes.setdefault(key, {})[field.encode()] = value.encode()
+
+    async def hgetall(self, key: str) -> dict[bytes, bytes]:
+        return self.hashes.get(key, {})
+
+
+class FakeLeaderElection:
+    def __init__(self, is_leader: bool) -> None:
+        self.is_leader = is_leader
+
+
+async def interval_job() -> None:
+    pass
+
+
+async def cron_job() -> None:
+    pass
+
+
+def make_scheduler(
+    redis: FakeRedis, is_leader: bool = True
+) -> tuple[JobScheduler, list[str]]:
+    scheduler = JobScheduler(
+        CONFIG,
+        redis_client=redis,  # type: ignore[arg-type]
+        leader_election=FakeLeaderElection(is_leader),  # type: ignore[arg-type]
+    )
+    caught_up: list[str] = []
+
+    def modify_job(job_id: str, **changes: Any) -> None:
+        caught_up.append(job_id)
+
+    scheduler.scheduler.modify_job = modify_job  # type: ignore[method-assign]
+    return scheduler, caught_up
+
+
+async def record_last_run(redis: FakeRedis, job_id: str, seconds_ago: float) -> None:
+    await redis.hset(CONFIG.runs_key, job_id, str(time.time() - seconds_ago))
+
+
+def test_job_ids_name_the_trigger() -> None:
+    scheduler, _ = make_scheduler(FakeRedis())
+    scheduler.add_job(interval_job, interval_seconds=3600)
+    scheduler.add_cron_job(cron_job, hour=6, minute=5, timezone="Europe/Paris")
+    scheduler.add_cron_job(cron_job, hour=18, minute=0)
+    assert {job.id for job in scheduler.scheduler.get_jobs()} >= {
+        "interval_job@every 3600s",
+        "cron_job@06:05 Europe/Paris",
+        "cron_job@18:00 UTC",
+    }
+    with pytest.raises(ValueError):
+        scheduler.add_cron_job(cron_job, hour=18, minute=0)
+
+    scheduler.remove_job(cron_job)
+    assert "cron_job" not in scheduler.job_names
+    assert set(scheduler._recorded_jobs) == {"interval_job@every 3600s"}
+
+
+def test_overdue_interval_job_is_caught_up() -> None:
+    async def run() -> None:
+        redis = FakeRedis()
+        scheduler, caught_up = make_scheduler(redis)
+        scheduler.add_job(interval_job, interval_seconds=3600, run_immediately=False)
+        await record_last_run(redis, "interval_job@every 3600s", 2 * 3600)
+        await scheduler._catch_up_missed_runs()
+        assert caught_up == ["interval_job@every 3600s"]
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "seconds_ago",
+    [
+        # not due yet
+        600,
+        # due only within the last catch up interval, left to the trigger
+        3600 + 30,
+    ],
+)
+def test_interval_job_not_overdue_is_left_alone(seconds_ago: float) -> None:
+    async def run() -> None:
+        redis = FakeRedis()
+        scheduler, caught_up = make_scheduler(redis)
+        scheduler.add_job(interval_job, interval_seconds=3600, run_immediately=False)
+        await record_last_run(redis, "interval_job@every 3600s", seconds_ago)
+        await scheduler._catch_up_missed_runs()
+        assert caught_up == []
+
+    asyncio.run(run())
+
+
+def test_interval_job_that_never_ran_is_left_to_its_trigger() -> None:
+    async def run() -> None:
+        scheduler, caught_up = make_scheduler(FakeRedis())
+        scheduler.add_job(interval_job, interval_seconds=3600, run_immediately=False)
+        await scheduler._catch_up_missed_runs()
+        assert caught_up == []
+
+    asyncio.run(run())
+
+
+def test_missed_cron_run_is_caught_up_once() -> None:
+    async def run() -> None:
+        redis = FakeRedis()
+        scheduler, caught_up = make_scheduler(redis)
+        fired = datetime.now(UTC) - timedelta(minutes=5)
+        scheduler.add_cron_job(cron_job, hour=fired.hour, minute=fired.minute)
+        job_id = f"cron_job@{fired.hour:02d}:{fired.minute:02d} UTC"
+        await record_last_run(redis, job_id, 24 * 3600)
+        await scheduler._catch_up_missed_runs()
+        assert caught_up == [job_id]
+
+        # it ran since
+        await record_last_run(redis, job_id, 0)
+        await scheduler._catch_up_missed_runs()
+        assert caught_up == [job_id]
+
+    asyncio.run(run())
+
+
+def test_running_and_non_leader_jobs_are_not_caught_up() -> None:
+    async def run() -> None:
+        redis = FakeRedis()
+        scheduler, caught_up = make_scheduler(redis)
+        scheduler.add_job(interval_job, interval_seconds=3600, run_immediately=False)
+        await record_last_run(redis, "interval_job@every 3600s", 2 * 3600)
+        scheduler._running.add("interval_job@every 3600s")
+        await scheduler._catch_up_missed_runs()
+        assert caught_up == []
+
+        follower, caught_up = make_scheduler(redis, is_leader=False)
+        follower.add_job(interval_job, interval_seconds=3600, run_immediately=False)
+        await follower._catch_up_missed_runs()
+        assert caught_up == []
+
+    asyncio.run(run())
+
+
+def test_only_recorded_jobs_record_their_runs() -> None:
+    async def run() -> None:
+        redis = FakeRedis()
+        scheduler, _ = make_scheduler(redis)
+        scheduler.add_job(interval_job, interval_seconds=3600)
+        await scheduler._record_run("interval_job@every 3600s")
+        await scheduler._record_run("interval_job@once")
+        assert list(redis.hashes[CONFIG.runs_key]) == [b"interval_job@every 3600s"]
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    ("now", "expected"),
+    [
+        (
+            datetime(2026, 10, 19, 10, 30, tzinfo=UTC),
+            datetime(2026, 10, 19, 10, 0, tzinfo=UTC),
+        ),
+        (
+            datetime(2026, 10, 19, 10, 0, tzinfo=UTC),
+            datetime(2026, 10, 19, 10, 0, tzinfo=UTC),
+        ),
+        # past the misfire grace time
+        (datetime(2026, 10, 19, 11, 30, tzinfo=UTC), None),
+        (datetime(2026, 10, 19, 9, 59, tzinfo=UTC), None),
+    ],
+)
+def test_latest_fire_time(now: datetime, expected: datetime | None) -> None:
+    scheduler, _ = make_scheduler(FakeRedis())
+    trigger = CronTrigger(hour=10, minute=0, timezone="UTC")
+    assert scheduler._latest_fire_time(trigger.get_next_fire_time, now) == expected
+
+
+def test_latest_fire_time_takes_the_last_of_several() -> None:
+    scheduler, _ = make_scheduler(FakeRedis())
+    trigger = CronTrigger(minute="*/10", timezone="UTC")
+    now = datetime(2026, 10, 19, 10, 35, tzinfo=UTC)
+    assert scheduler._latest_fire_time(trigger.get_next_fire_time, now) == datetime(
+        2026, 10, 19, 10, 30, tzinfo=UTC
+    )
@@ -0,0 +1,114 @@
+from datetime import time
+
+from informed.db_models.users import (
+    AccountType,
+    Language,
+    Settings,
+    User,
+    UserAllergies,
+    UserConfigurations,
+    UserDetails,
+    UserHealthConditions,
+    UserMedicalDetails,
+    UserMedications,
+    WeatherSensitivities,
+)
+from informed.users.cache import UserSnapshot
+
+
+def make_user() -> User:
+    user = User(
+        email="someone@example.com",
+        is_active=True,
+        account_type=AccountType.USER,
+        profile_version=7,
+    )
+    user.details = UserDetails(
+        user_id=user.user_id,
+        first_name="Sam",
+        last_name="Doe",
+        zip_code="94103",
+        language=Language.SPANISH,
+    )
+    user.settings = Settings(
+        user_id=user.user_id,
+        configurations=UserConfigurations(
+            daily_updates=True,
+            daily_update_prompt="pollen today?",
+            daily_update_time=time(7, 30),
+            daily_update_timezone="Europe/Paris",
+        ),
+    )
+    medical_details = UserMedicalDetails(user_id=user.user_id, blood_type="O+")
+    medical_details.health_conditions = [
+        UserHealthConditions(
+            user_medical_id=medical_details.id,
+            condition="asthma",
+            severity="mild",
+            description=None,
+        )
+    ]
+    medical_details.medications = [
+        UserMedications(
+            user_medical_id=medical_details.id,
+            name="inhaler",
+            dosage="1 puff",
+            frequency="daily",
+        )
+    ]
+    medical_details.allergies = [
+        UserAllergies(
+            user_medical_id=medical_details.id, allergen="pollen", reaction="sneezing"
+        )
+    ]
+    medical_details.weather_sensitivities = [
+        WeatherSensitivities(
+            user_medical_id=medical_details.id, type="heat", description=None
+        )
+    ]
+    user.medical_details = medical_details
+    return user
+
+
+def test_snapshot_round_trips_the_full_profile() -> None:
+    user = make_user()
+    data = UserSnapshot.from_user(user).model_dump_json()
+    restored = UserSnapshot.model_validate_json(data).to_user()
+
+    assert restored.model_dump() == user.model_dump()
+    assert restored.details is not None and user.details is not None
+    assert restored.details.model_dump() == user.details.model_dump()
+    assert restored.settings.configurations == user.settings.configurations
+    assert restored.medical_details is not None and user.medical_details is not None
+    assert restored.medical_details.model_dump() == user.medical_details.model_dump()
+    for relationship in [
+        "health_conditions",
+        "medications",
+        "allergies",
+        "weather_sensitivities",
+    ]:
+        assert [
+            item.model_dump()
+            for item in getattr(restored.medical_details, relationship)
+        ] == [item.model_dump() for item in getattr(user.medical_details, relationship)]
+
+
+def test_snapshot_of_a_user_without_profile() -> None:
+    user = User(
+        email="someone@example.com", is_active=True, account_type=AccountType.USER
+    )
+    restored = UserSnapshot.model_validate_json(
+        UserSnapshot.from_user(user).model_dump_json()
+    ).to_user()
+    assert restored.model_dump() == user.model_dump()
+    assert restored.details is None
+    assert restored.medical_details is None
+
+
+def test_snapshot_builds_a_new_graph_on_every_hit() -> None:
+    snapshot = UserSnapshot.from_user(make_user())
+    first, second = snapshot.to_user(), snapshot.to_user()
+    assert first is not second
+    assert first.details is not None and second.details is not None
+    first.details.first_name = "changed"
+    assert second.details.first_name == "Sam"
@@ -0,0 +1,58 @@
+import asyncio
+import signal
+
+from loguru import logger as log
+
+from informed.agents.query_agent.query_queue import QueryJobQueue
+from informed.agents.query_agent.query_worker import QueryWorker
+from informed.config import Config, get_config
+from informed.db import DatabaseEngine, init_db
+from informed.llm.client import LLMClient
+from informed.metrics import setup_metrics
+from informed.notifier import init_notifier
+from informed.query.manager import QueryManager
+from informed.redis import init_redis_client
+from informed.services.weather_alert_service import WeatherAlertService
+from informed.users.cache import UserCache
+from informed.users.manager import UserManager
+
+
+async def run_query_worker(config: Config) -> None:
+    setup_metrics(config)
+    init_db(config.database_config)
+    redis_client = init_redis_client(config.redis_config)
+    notifier = init_notifier(config.notifier_config, redis_client)
+    user_cache = None
+    if config.user_cache_config.enabled:
+        user_cache = UserCache(redis_client, config.user_cache_config)
+        await user_cache.start()
+    query_worker = QueryWorker(
+        job_queue=QueryJobQueue(redis_client, config.query_worker_config),
+        query_manager=QueryManager(notifier),
+        user_manager=UserManager(config, user_cache),
+        llm_client=LLMClient(config.llm_config),
+        weather_sources_config=config.weather_sources_config,
+        weather_alert_service=WeatherAlertService(config, redis_client),
+        config=config.query_worker_config,
+    )
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, query_worker.stop)
+
+    try:
+        await query_worker.run()
+    finally:
+        if user_cache:
+            await user_cache.stop()
+        await redis_client.aclose()
+        await DatabaseEngine.delete()
+
+
+if __name__ == "__main__":
+    config = get_config(print_config=True)
+    if not config.query_worker_config.enabled:
+        log.warning(
+            "query workers are not enabled, the API will run query agents itself"
+        )
+    asyncio.run(run_query_worker(config))